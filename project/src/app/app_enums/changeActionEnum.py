@@ -0,0 +1,11 @@
+from enum import Enum
+
+
+class ChangeActionEnum(str, Enum):
+    """
+    Defines the change recorded in the change log
+    """
+    CREATED = "created"
+    UPDATED = "updated"
+    LIKED = "liked"
+    DELETED = "deleted"
@@ -0,0 +1,9 @@
+from enum import Enum
+
+
+class ChangeObjectTypeEnum(str, Enum):
+    """
+    Defines the type of the object changed
+    """
+    POST = "post"
+    TAG = "tag"
@@ -0,0 +1,10 @@
+from enum import Enum
+
+
+class MemoryGroupingEnum(str, Enum):
+    """
+    Defines how the traced allocations are grouped - see tracemalloc.Snapshot.statistics
+    """
+    LINENO = "lineno"
+    FILENAME = "filename"
+    TRACEBACK = "traceback"
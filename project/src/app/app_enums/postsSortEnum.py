@@ -0,0 +1,9 @@
+from enum import Enum
+
+
+class PostsSortEnum(str, Enum):
+    """
+    Defines the order of a list of posts
+    """
+    LATEST = "latest"
+    POPULAR = "popular"
@@ -0,0 +1,10 @@
+from enum import Enum
+
+
+class UploadStatusEnum(str, Enum):
+    """
+    Defines the state of a resumable upload
+    """
+    IN_PROGRESS = "in_progress"
+    FINALIZED = "finalized"
+    CONSUMED = "consumed"
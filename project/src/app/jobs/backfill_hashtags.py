@@ -0,0 +1,99 @@
+"""
+Links the existing posts to the hashtags of their caption \n
+Usage: python -m project.src.app.jobs.backfill_hashtags [--chunk-size 500]
+"""
+import argparse
+import asyncio
+import os
+from collections import defaultdict
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import project.src.app.services.post as _post_service
+import project.src.app.services.tag as _tag_service
+import project.src.config.db.database as _database
+from project.src.app import models as _models
+from project.src.app import schemas as _schemas
+
+load_dotenv()
+BACKFILL_CHUNK_SIZE = int(os.getenv("HASHTAGS_BACKFILL_CHUNK_SIZE", "500"))
+
+
+async def backfill_hashtags(db: _orm.Session, chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+    """
+    Walks through the posts table by chunks - ordered by id, one chunk in memory at a time - and links
+    each post to its caption's hashtags \n
+    :param db: A database session \n
+    :param chunk_size: The number of posts processed - and committed - at once \n
+    :return: The number of posts having hashtags
+    """
+    last_post_id = None
+    posts_with_hashtags = 0
+
+    while True:
+        query = _sql.select(_models.Post.id, _models.Post.caption, _models.Post.created_on, _models.Post.hot_score) \
+            .where(_models.Post.caption.contains("#")) \
+            .order_by(_models.Post.id) \
+            .limit(chunk_size)
+        if last_post_id is not None:
+            query = query.where(_models.Post.id > last_post_id)
+
+        rows = db.execute(query).all()
+        if not rows:
+            break
+        last_post_id = rows[-1].id
+
+        hashtags_by_post = {row.id: _tag_service.extract_hashtags(row.caption) for row in rows}
+        tags = _tag_service.merge_tags(
+            tags=[_schemas.TagCreate(name=name) for hashtags in hashtags_by_post.values() for name in hashtags],
+            caption=None
+        )
+        tags_ids = {
+            db_tag.slug: db_tag.id for db_tag in await _tag_service.create_tag_from_post(db=db, tags=tags)
+        }
+
+        posts_hot_scores = {row.id: row.hot_score for row in rows}
+        links = [
+            {"post_id": post_id, "tag_id": tags_ids[name.lower()], "hot_score": posts_hot_scores[post_id]}
+            for post_id, hashtags in hashtags_by_post.items() for name in hashtags
+        ]
+        if links:
+            created_links = db.execute(
+                _database.dialect_insert(db, _database.post_tag_linker)
+                .values(links)
+                .on_conflict_do_nothing()
+                .returning(_database.post_tag_linker.c.post_id, _database.post_tag_linker.c.tag_id)
+            ).all()
+            created_tags_ids = defaultdict(list)
+            for link in created_links:
+                created_tags_ids[link.post_id].append(link.tag_id)
+            posts_created_on = {row.id: row.created_on for row in rows}
+            for post_id, post_tags_ids in created_tags_ids.items():
+                await _post_service.record_tags_links(db=db, tags_ids=post_tags_ids,
+                                                      created_on=posts_created_on[post_id])
+            posts_with_hashtags += len({link["post_id"] for link in links})
+
+        db.commit()
+        db.expunge_all()
+
+    return posts_with_hashtags
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Links the existing posts to the hashtags of their caption")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE)
+    arguments = parser.parse_args()
+
+    db = _database.SessionLocal()
+    try:
+        count = asyncio.run(backfill_hashtags(db=db, chunk_size=arguments.chunk_size))
+    finally:
+        db.close()
+
+    print(f"{count} posts linked to their hashtags")
+
+
+if __name__ == "__main__":
+    main()
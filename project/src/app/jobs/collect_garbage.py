@@ -0,0 +1,21 @@
+"""
+Purges the expired deleted posts and their images - the orphan images too with --reconcile \n
+Usage: python -m project.src.app.jobs.collect_garbage [--reconcile]
+"""
+import argparse
+
+import project.src.app.services.garbage_collector as _garbage_collector
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Purges the expired deleted posts and their images")
+    parser.add_argument("--reconcile", action="store_true", help="Also removes the images no post references")
+    arguments = parser.parse_args()
+
+    purged, orphans_removed = _garbage_collector.collect_garbage(reconcile=arguments.reconcile)
+
+    print(f"{purged} posts purged, {orphans_removed} orphan images removed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+Compacts the change log - the likes followed by another change of the same post are removed \n
+Usage: python -m project.src.app.jobs.compact_changes
+"""
+import argparse
+
+import project.src.app.services.changes as _changes_service
+
+
+def main():
+    argparse.ArgumentParser(description="Compacts the change log").parse_args()
+
+    compacted = _changes_service.compact_all_changes()
+
+    print(f"{compacted} changes removed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Exports the posts or the tags as NDJSON - one JSON document per line \n
+Usage: python -m project.src.app.jobs.export posts [--updated-since 2023-01-01] [--updated-until 2023-02-01]
+[--output posts.ndjson]
+"""
+import argparse
+import datetime as _datetime
+import sys
+
+import project.src.app.services.export as export_service
+import project.src.config.db.database as _database
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exports the posts or the tags as NDJSON")
+    parser.add_argument("resource", choices=["posts", "tags"], help="The resource to export")
+    parser.add_argument("--updated-since", type=_datetime.datetime.fromisoformat,
+                        help="Only the posts updated since this datetime, e.g. 2023-01-01")
+    parser.add_argument("--updated-until", type=_datetime.datetime.fromisoformat,
+                        help="Only the posts updated before this datetime, e.g. 2023-02-01")
+    parser.add_argument("--output", help="The file to write - the standard output by default")
+    arguments = parser.parse_args()
+
+    if arguments.resource == "tags" and (arguments.updated_since or arguments.updated_until):
+        parser.error("The tags cannot be filtered by update datetime")
+
+    output = open(arguments.output, "wb") if arguments.output else sys.stdout.buffer
+    db = _database.SessionLocal()
+    try:
+        if arguments.resource == "posts":
+            objects = export_service.iter_posts(db=db, updated_since=arguments.updated_since,
+                                                updated_until=arguments.updated_until)
+        else:
+            objects = export_service.iter_tags(db=db)
+        for block in export_service.iter_ndjson(objects):
+            output.write(block)
+    finally:
+        db.close()
+        if output is not sys.stdout.buffer:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Extracts the metadata and the blurhash of the images uploaded before they were extracted at upload \n
+Usage: python -m project.src.app.jobs.extract_images_metadata [--chunk-size 100]
+"""
+import argparse
+import asyncio
+import os
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import project.src.app.services.image_processing as _image_processing_service
+import project.src.config.db.database as _database
+from project.src.app import models as _models
+
+load_dotenv()
+EXTRACTION_CHUNK_SIZE = int(os.getenv("IMAGES_METADATA_EXTRACTION_CHUNK_SIZE", "100"))
+
+
+async def extract_images_metadata(db: _orm.Session, chunk_size: int = EXTRACTION_CHUNK_SIZE) -> int:
+    """
+    Walks through the posts without metadata by chunks - ordered by id - and processes their images in the pool \n
+    :param db: A database session \n
+    :param chunk_size: The number of images processed - and committed - at once \n
+    :return: The number of posts processed
+    """
+    last_post_id = None
+    count = 0
+
+    while True:
+        query = _sql.select(_models.Post.id, _models.Post.image) \
+            .where(_models.Post.byte_size.is_(None), _models.Post.image != "") \
+            .order_by(_models.Post.id) \
+            .limit(chunk_size)
+        if last_post_id is not None:
+            query = query.where(_models.Post.id > last_post_id)
+
+        rows = db.execute(query).all()
+        if not rows:
+            break
+        last_post_id = rows[-1].id
+
+        images_metadata = await asyncio.gather(
+            *(_image_processing_service.extract_image_metadata(path=row.image) for row in rows)
+        )
+        for row, image_metadata in zip(rows, images_metadata):
+            db.execute(_sql.update(_models.Post).where(_models.Post.id == row.id).values(**image_metadata))
+
+        db.commit()
+        count += len(rows)
+
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extracts the metadata and the blurhash of the existing images")
+    parser.add_argument("--chunk-size", type=int, default=EXTRACTION_CHUNK_SIZE)
+    arguments = parser.parse_args()
+
+    db = _database.SessionLocal()
+    try:
+        count = asyncio.run(extract_images_metadata(db=db, chunk_size=arguments.chunk_size))
+    finally:
+        db.close()
+        _image_processing_service.shutdown_pool()
+
+    print(f"{count} images processed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Manages the monthly partitions of the "posts" table - Postgres only, with POSTS_PARTITIONING_ENABLED=true \n
+Usage: python -m project.src.app.jobs.partition_posts [--convert] [--months-ahead 3] [--detach-before 2022-01-01]
+"""
+import argparse
+import datetime as _datetime
+
+import project.src.config.db.database as _database
+import project.src.config.db.partitioning as _partitioning
+from project.src.config.db.init_database import add_tables_to_picshare_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manages the monthly partitions of the posts table")
+    parser.add_argument("--convert", action="store_true",
+                        help="Replaces the existing posts table with a partitioned one - locks the table meanwhile")
+    parser.add_argument("--months-ahead", type=int, default=_partitioning.POSTS_PARTITIONS_MONTHS_AHEAD,
+                        help="The number of months after the current one to create")
+    parser.add_argument("--detach-before", type=_datetime.datetime.fromisoformat,
+                        help="Detaches the partitions of the months ended before this date, e.g. 2022-01-01")
+    arguments = parser.parse_args()
+
+    if not _partitioning.POSTS_PARTITIONED:
+        parser.error("The partitioning needs a Postgres database and POSTS_PARTITIONING_ENABLED=true")
+
+    with _database.engine.begin() as connection:
+        if arguments.convert and not _partitioning.is_posts_table_partitioned(connection):
+            copied = _partitioning.partition_posts_table(connection)
+            print(f"{copied} posts copied to the partitioned table - the former one is posts_unpartitioned")
+
+    # The indexes of the partitioned table
+    add_tables_to_picshare_database()
+
+    with _database.engine.begin() as connection:
+        names = _partitioning.create_posts_partitions(connection, months_ahead=arguments.months_ahead)
+        print(f"Partitions up to {names[-1]}")
+
+        if arguments.detach_before is not None:
+            detached_names = _partitioning.detach_posts_partitions(connection, before=arguments.detach_before)
+            print(f"Detached - to archive then drop: {', '.join(detached_names) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
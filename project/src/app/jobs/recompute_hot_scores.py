@@ -0,0 +1,27 @@
+"""
+Recomputes the popularity score of every post \n
+Usage: python -m project.src.app.jobs.recompute_hot_scores [--chunk-size 1000]
+"""
+import argparse
+import asyncio
+
+import project.src.app.services.popularity as _popularity_service
+import project.src.config.db.database as _database
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recomputes the popularity score of every post")
+    parser.add_argument("--chunk-size", type=int, default=_popularity_service.RECOMPUTE_CHUNK_SIZE)
+    arguments = parser.parse_args()
+
+    db = _database.SessionLocal()
+    try:
+        count = asyncio.run(_popularity_service.recompute_hot_scores(db=db, chunk_size=arguments.chunk_size))
+    finally:
+        db.close()
+
+    print(f"{count} posts scores recomputed")
+
+
+if __name__ == "__main__":
+    main()
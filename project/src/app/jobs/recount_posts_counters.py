@@ -0,0 +1,22 @@
+"""
+Recomputes the posts counters of the tags and of the owners \n
+Usage: python -m project.src.app.jobs.recount_posts_counters
+"""
+import asyncio
+
+import project.src.app.services.counters as _counters_service
+import project.src.config.db.database as _database
+
+
+def main():
+    db = _database.SessionLocal()
+    try:
+        asyncio.run(_counters_service.recount(db=db))
+    finally:
+        db.close()
+
+    print("Posts counters recomputed")
+
+
+if __name__ == "__main__":
+    main()
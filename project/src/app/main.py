@@ -1,11 +1,30 @@
+import asyncio
+import os
+
 from dotenv import load_dotenv
 from fastapi import FastAPI
 
+from project.src.app.middlewares.admission_control import control_admission
+from project.src.app.middlewares.compression import compress_response
+from project.src.app.middlewares.idempotency import make_post_creation_idempotent
+from project.src.app.middlewares.memory_profiling import MEMORY_PROFILING_ENABLED, memory_profiler, profile_memory
+from project.src.app.middlewares.read_your_writes import stick_to_primary_after_writes
+from project.src.app.middlewares.startup_timing import record_first_request
+from project.src.app.routes.changes import changes_router
+from project.src.app.routes.health import health_router
 from project.src.app.routes.posts import posts_router
 from project.src.app.routes.tags import tags_router
+from project.src.app.routes.uploads import uploads_router
+from project.src.app.services.garbage_collector import GC_ENABLED, run_garbage_collector
+from project.src.app.services.image_processing import shutdown_pool as shutdown_image_processing_pool
+from project.src.app.services.live_likes import LIKES_BROKER, relay_change_log_likes
+from project.src.app.services.warmup import register_warmup_hook, run_warmup_hooks
 from project.src.config.db.init_database import add_tables_to_picshare_database
 
 load_dotenv()
+# The production server creates the tables once, before starting the workers - see config.server
+DATABASE_INIT_ON_STARTUP = os.getenv("DATABASE_INIT_ON_STARTUP", "true").lower() == "true"
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
 
 app = FastAPI(
     title="Posts management",
@@ -16,8 +35,48 @@ app = FastAPI(
 
 @app.on_event("startup")
 async def startup_event():
-    add_tables_to_picshare_database()
+    if MEMORY_PROFILING_ENABLED:
+        memory_profiler.start()
+    if DATABASE_INIT_ON_STARTUP:
+        add_tables_to_picshare_database()
+    if GC_ENABLED:
+        app.state.garbage_collector = asyncio.create_task(run_garbage_collector())
+    # The likes of the other workers reach the streams of this one
+    if LIKES_BROKER == "change_log":
+        app.state.likes_relay = asyncio.create_task(relay_change_log_likes())
+    # The worker takes no traffic before the end of the startup
+    if WARMUP_ENABLED:
+        await run_warmup_hooks()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task_name in ("garbage_collector", "likes_relay"):
+        task = getattr(app.state, task_name, None)
+        if task is not None:
+            task.cancel()
+    shutdown_image_processing_pool()
+
+
+@register_warmup_hook("openapi")
+async def build_openapi_schema():
+    """
+    Builds the OpenAPI schema - it is built on the first request to the docs otherwise
+    """
+    app.openapi()
+
 
+# The first one added runs last - only the routes are profiled
+app.middleware("http")(profile_memory)
+app.middleware("http")(make_post_creation_idempotent)
+app.middleware("http")(stick_to_primary_after_writes)
+app.middleware("http")(record_first_request)
+app.middleware("http")(compress_response)
+# The last one added runs first - the shed requests skip the other middlewares
+app.middleware("http")(control_admission)
 
 app.include_router(posts_router)
 app.include_router(tags_router)
+app.include_router(changes_router)
+app.include_router(uploads_router)
+app.include_router(health_router)
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+
+import fastapi as _fastapi
+from dotenv import load_dotenv
+
+from project.src.app.routes.shared_constants_and_methods import (
+    SERVICE_UNAVAILABLE_STATUS_CODE, get_service_overloaded_detail_message)
+from project.src.config.db.pool_metrics import pool_wait_monitor
+
+load_dotenv()
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+# Sent in the "Retry-After" header of the shed requests
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+# The routes never shed - the probes must be answered
+ADMISSION_EXEMPT_PATHS_PREFIXES = ("/health", "/docs", "/redoc", "/openapi.json")
+UPLOAD_PATHS_SUFFIXES = ("/new",)
+# The chunks of the resumable uploads
+UPLOAD_CHUNKS_PATHS_PREFIXES = ("/api/v1/uploads/",)
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+logger = logging.getLogger(__name__)
+
+
+class RouteClass:
+    """
+    The admission limits of a class of routes - per worker \n
+    A request waits in a queue when the class runs max_in_flight requests already. It is shed when the queue is full,
+    when it waited more than max_queue_wait_seconds, or when the database connections were waited for more than
+    max_pool_wait_seconds lately.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, max_queued: int, max_queue_wait_seconds: float,
+                 max_pool_wait_seconds: float):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.max_queue_wait_seconds = max_queue_wait_seconds
+        self.max_pool_wait_seconds = max_pool_wait_seconds
+        self.in_flight = 0
+        self.queued = 0
+        self.shed = 0
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    @classmethod
+    def from_env(cls, name: str, max_in_flight: int, max_queued: int, max_queue_wait_seconds: float,
+                 max_pool_wait_seconds: float) -> "RouteClass":
+        prefix = f"ADMISSION_{name.upper()}"
+        return cls(
+            name=name,
+            max_in_flight=int(os.getenv(f"{prefix}_MAX_IN_FLIGHT", max_in_flight)),
+            max_queued=int(os.getenv(f"{prefix}_MAX_QUEUED", max_queued)),
+            max_queue_wait_seconds=float(os.getenv(f"{prefix}_MAX_QUEUE_WAIT_SECONDS", max_queue_wait_seconds)),
+            max_pool_wait_seconds=float(os.getenv(f"{prefix}_MAX_POOL_WAIT_SECONDS", max_pool_wait_seconds)),
+        )
+
+    async def admit(self) -> bool:
+        """
+        Waits for a slot - the caller must release it \n
+        :return: False if the request must be shed
+        """
+        if pool_wait_monitor.wait_seconds() > self.max_pool_wait_seconds:
+            return False
+        if self._slots.locked() and self.queued >= self.max_queued:
+            return False
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.max_queue_wait_seconds)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def to_dict(self) -> dict:
+        return {"in_flight": self.in_flight, "queued": self.queued, "shed": self.shed}
+
+
+# The cheap reads get more slots and are the last ones shed when the database slows down
+ROUTE_CLASSES = {
+    "read": RouteClass.from_env("read", max_in_flight=32, max_queued=64, max_queue_wait_seconds=2.0,
+                                max_pool_wait_seconds=1.0),
+    "write": RouteClass.from_env("write", max_in_flight=8, max_queued=16, max_queue_wait_seconds=2.0,
+                                 max_pool_wait_seconds=0.5),
+    "upload": RouteClass.from_env("upload", max_in_flight=2, max_queued=4, max_queue_wait_seconds=1.0,
+                                  max_pool_wait_seconds=0.2),
+}
+
+
+def classify_request(request: _fastapi.Request) -> RouteClass | None:
+    """
+    Gets the class of the route of a request \n
+    :param request: The incoming request \n
+    :return: The route class, None for the exempt routes
+    """
+    path = request.url.path
+    if path.startswith(ADMISSION_EXEMPT_PATHS_PREFIXES):
+        return None
+    if request.method not in WRITE_METHODS:
+        return ROUTE_CLASSES["read"]
+    if request.method == "POST" and path.rstrip("/").endswith(UPLOAD_PATHS_SUFFIXES):
+        return ROUTE_CLASSES["upload"]
+    if request.method == "PATCH" and path.startswith(UPLOAD_CHUNKS_PATHS_PREFIXES):
+        return ROUTE_CLASSES["upload"]
+    return ROUTE_CLASSES["write"]
+
+
+async def control_admission(request: _fastapi.Request, call_next):
+    """
+    Sheds the requests exceeding the limits of their route class with a fast 503 - see RouteClass \n
+    :param request: The incoming request \n
+    :param call_next: The next ASGI handler \n
+    :return: The response
+    """
+    route_class = classify_request(request) if ADMISSION_CONTROL_ENABLED else None
+    if route_class is None:
+        return await call_next(request)
+
+    if not await route_class.admit():
+        route_class.shed += 1
+        logger.warning("%s %s shed: %s", request.method, request.url.path, route_class.to_dict())
+        return _fastapi.responses.JSONResponse(
+            status_code=SERVICE_UNAVAILABLE_STATUS_CODE,
+            content={"detail": get_service_overloaded_detail_message()},
+            headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)}
+        )
+
+    try:
+        return await call_next(request)
+    finally:
+        route_class.release()
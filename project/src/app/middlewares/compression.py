@@ -0,0 +1,185 @@
+import os
+import threading
+import zlib
+from typing import AsyncIterator
+
+import fastapi as _fastapi
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:  # The responses are gzipped only
+    brotli = None
+
+load_dotenv()
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# The smaller responses are sent as they are - the compression would not save a round trip
+COMPRESSION_MIN_SIZE_BYTES = int(os.getenv("COMPRESSION_MIN_SIZE_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# The images are compressed already
+COMPRESSIBLE_MEDIA_TYPES = ("application/json", "application/x-ndjson", "text/")
+# The events must reach the clients at once - a compressor would hold them
+UNCOMPRESSIBLE_MEDIA_TYPES = ("text/event-stream",)
+ACCEPT_ENCODING_HEADER_NAME = "Accept-Encoding"
+CONTENT_ENCODING_HEADER_NAME = "Content-Encoding"
+GZIP_ENCODING = "gzip"
+BROTLI_ENCODING = "br"
+
+
+class CompressionMetrics:
+    """
+    The bytes of the compressed responses, before and after their compression - per worker
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int):
+        with self._lock:
+            self.responses[encoding] = self.responses.get(encoding, 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def ratio(self) -> float | None:
+        """
+        :return: The compressed size over the original size - None before the first compressed response
+        """
+        return round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None
+
+    def to_dict(self) -> dict:
+        return {"responses": dict(self.responses), "bytes_in": self.bytes_in, "bytes_out": self.bytes_out,
+                "ratio": self.ratio()}
+
+
+compression_metrics = CompressionMetrics()
+
+
+def get_supported_encodings() -> tuple[str, ...]:
+    """
+    :return: The supported encodings, the preferred first
+    """
+    return (BROTLI_ENCODING, GZIP_ENCODING) if brotli is not None else (GZIP_ENCODING,)
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    Chooses the encoding of a response - the supported encoding with the highest quality value for the client,
+    the preferred one between equals \n
+    :param accept_encoding: The 'Accept-Encoding' header of the request \n
+    :return: The encoding, None to send the response as it is
+    """
+    qualities = {}
+    for item in accept_encoding.lower().split(","):
+        encoding, _, parameters = item.strip().partition(";")
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            name, _, value = parameter.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[encoding.strip()] = quality
+
+    best_encoding, best_quality = None, 0.0
+    for encoding in get_supported_encodings():
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best_encoding, best_quality = encoding, quality
+    return best_encoding
+
+
+def is_compressible(response: _fastapi.Response) -> bool:
+    """
+    Tells whether a response is worth compressing \n
+    :param response: The response \n
+    :return: True if it is a large enough text or JSON response, not encoded yet
+    """
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return False
+    if CONTENT_ENCODING_HEADER_NAME in response.headers:
+        return False
+    content_type = response.headers.get("Content-Type", "")
+    if not content_type.startswith(COMPRESSIBLE_MEDIA_TYPES) or content_type.startswith(UNCOMPRESSIBLE_MEDIA_TYPES):
+        return False
+
+    # A streamed response has no length - it is large
+    content_length = response.headers.get("Content-Length")
+    return content_length is None or int(content_length) >= COMPRESSION_MIN_SIZE_BYTES
+
+
+class BrotliCompressor:
+    """
+    A brotli compressor with the methods of a zlib one
+    """
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+def get_compressor(encoding: str):
+    """
+    Gets a streaming compressor \n
+    :param encoding: The encoding - see get_supported_encodings \n
+    :return: An object with compress(bytes) and flush() methods
+    """
+    if encoding == BROTLI_ENCODING:
+        return BrotliCompressor()
+    # wbits = 16 + 15 - the gzip header and trailer
+    return zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+async def compress_body(body: AsyncIterator[bytes], encoding: str) -> AsyncIterator[bytes]:
+    """
+    Compresses a body chunk by chunk - the large listings are never held twice in memory \n
+    :param body: The chunks of the body \n
+    :param encoding: The encoding \n
+    :return: The compressed chunks
+    """
+    compressor = get_compressor(encoding)
+    bytes_in = bytes_out = 0
+    async for chunk in body:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        bytes_in += len(chunk)
+        compressed_chunk = compressor.compress(chunk)
+        if compressed_chunk:
+            bytes_out += len(compressed_chunk)
+            yield compressed_chunk
+
+    compressed_chunk = compressor.flush()
+    bytes_out += len(compressed_chunk)
+    compression_metrics.record(encoding=encoding, bytes_in=bytes_in, bytes_out=bytes_out)
+    yield compressed_chunk
+
+
+async def compress_response(request: _fastapi.Request, call_next):
+    """
+    Compresses the JSON responses with the encoding negotiated with the client - brotli or gzip \n
+    :param request: The incoming request \n
+    :param call_next: The next ASGI handler \n
+    :return: The response
+    """
+    response = await call_next(request)
+    if not COMPRESSION_ENABLED:
+        return response
+
+    if is_compressible(response):
+        response.headers.append("Vary", ACCEPT_ENCODING_HEADER_NAME)
+        encoding = negotiate_encoding(request.headers.get(ACCEPT_ENCODING_HEADER_NAME, ""))
+        if encoding is not None:
+            del response.headers["Content-Length"]
+            response.headers[CONTENT_ENCODING_HEADER_NAME] = encoding
+            response.body_iterator = compress_body(body=response.body_iterator, encoding=encoding)
+
+    return response
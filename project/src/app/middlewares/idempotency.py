@@ -0,0 +1,100 @@
+import asyncio
+import os
+import time
+
+import fastapi as _fastapi
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+
+import project.src.app.schemas as _schemas
+import project.src.app.services.post as _post_service
+from project.src.app.routes.shared_constants_and_methods import (
+    IDEMPOTENCY_KEY_HEADER_NAME, IDEMPOTENCY_REPLAYED_HEADER_NAME, VALUE_LENGTH_ERROR_STATUS_CODE,
+    CONFLICT_STATUS_CODE, OBJECT_CANNOT_BE_FOUND_STATUS_CODE, get_invalid_idempotency_key_detail_message,
+    get_idempotency_key_in_progress_detail_message, get_object_cannot_be_found_detail_message, ObjectType)
+from project.src.app.services.idempotency import (
+    IDEMPOTENCY_ENABLED, IDEMPOTENCY_KEY_MAX_LENGTH, ClaimStatus, ClaimRenewal, idempotency_store)
+
+load_dotenv()
+# A retry arriving while its first request creates the post waits for it - at most this time
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_POLL_INTERVAL_SECONDS = 0.1
+IDEMPOTENT_PATHS = ("/api/v1/posts/new",)
+
+
+async def make_post_creation_idempotent(request: _fastapi.Request, call_next):
+    """
+    Creates a single post for all the requests with the same "Idempotency-Key" header - the retries of a client get
+    the first request's post, before their upload is read \n
+    The key is renewed while the first request runs: a retry only takes it over once the request died. The keys are
+    read and written off the event loop. \n
+    :param request: The incoming request \n
+    :param call_next: The next ASGI handler \n
+    :return: The response
+    """
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER_NAME)
+    if not IDEMPOTENCY_ENABLED or key is None or request.method != "POST" \
+            or request.url.path.rstrip("/") not in IDEMPOTENT_PATHS:
+        return await call_next(request)
+
+    try:
+        owner_id = int(request.query_params.get("owner_id"))
+    except (TypeError, ValueError):
+        # The route rejects the request
+        return await call_next(request)
+
+    if not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        return _fastapi.responses.JSONResponse(
+            status_code=VALUE_LENGTH_ERROR_STATUS_CODE,
+            content={"detail": get_invalid_idempotency_key_detail_message(IDEMPOTENCY_KEY_MAX_LENGTH)}
+        )
+
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        claim = await asyncio.to_thread(idempotency_store.claim, owner_id=owner_id, key=key)
+        if claim.status != ClaimStatus.IN_PROGRESS:
+            break
+        if time.monotonic() >= deadline:
+            return _fastapi.responses.JSONResponse(
+                status_code=CONFLICT_STATUS_CODE,
+                content={"detail": get_idempotency_key_in_progress_detail_message()},
+                headers={"Retry-After": str(round(IDEMPOTENCY_WAIT_SECONDS))}
+            )
+        await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL_SECONDS)
+
+    if claim.status == ClaimStatus.COMPLETED:
+        return await get_replayed_response(post_id=claim.post_id)
+
+    # The route records its post with the key, in the transaction creating it - if the key is still its own. The key
+    # is renewed while the body is read, until the route stops the renewal - before that transaction.
+    request.state.idempotency_claim = claim
+    claim.renewal = ClaimRenewal(store=idempotency_store, claim=claim)
+    try:
+        response = await call_next(request)
+    except Exception:
+        await claim.stop_renewal()
+        await asyncio.to_thread(idempotency_store.release, claim=claim)
+        raise
+
+    await claim.stop_renewal()
+    if response.status_code >= 400:
+        await asyncio.to_thread(idempotency_store.release, claim=claim)
+    return response
+
+
+async def get_replayed_response(post_id) -> _fastapi.Response:
+    """
+    Gets the response of the request which created a post \n
+    :param post_id: The id of the post \n
+    :return: The post, as when it was created - its current state
+    """
+    with idempotency_store.session_factory() as db:
+        db_post = await _post_service.get_post_by_id(db=db, post_id=post_id)
+        if db_post is None:
+            return _fastapi.responses.JSONResponse(
+                status_code=OBJECT_CANNOT_BE_FOUND_STATUS_CODE,
+                content={"detail": get_object_cannot_be_found_detail_message(post_id, ObjectType.POST)}
+            )
+        content = jsonable_encoder(_schemas.Post.from_orm(db_post))
+
+    return _fastapi.responses.JSONResponse(content=content, headers={IDEMPOTENCY_REPLAYED_HEADER_NAME: "true"})
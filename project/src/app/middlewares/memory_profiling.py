@@ -0,0 +1,141 @@
+import asyncio
+import os
+import threading
+import tracemalloc
+
+import fastapi as _fastapi
+from dotenv import load_dotenv
+from starlette.routing import Match
+
+from project.src.app.app_enums.memoryGroupingEnum import MemoryGroupingEnum
+
+load_dotenv()
+# tracemalloc slows every allocation down - a worker is only profiled on purpose
+MEMORY_PROFILING_ENABLED = os.getenv("MEMORY_PROFILING_ENABLED", "false").lower() == "true"
+# The frames kept per allocation - more frames tell the callers apart, at a higher cost
+MEMORY_PROFILING_TRACEBACK_FRAMES = int(os.getenv("MEMORY_PROFILING_TRACEBACK_FRAMES", "1"))
+MEMORY_PROFILING_TOP_LIMIT_DEFAULT_NUMBER = 20
+MEMORY_PROFILING_TOP_LIMIT_MAX_NUMBER = 200
+
+
+class RouteMemory:
+    """
+    The memory allocated by the requests of a route
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.max_peak_bytes = 0
+        self.last_peak_bytes = 0
+        self.total_peak_bytes = 0
+        self.retained_bytes = 0
+
+    def record(self, peak_bytes: int, retained_bytes: int):
+        self.requests += 1
+        self.max_peak_bytes = max(self.max_peak_bytes, peak_bytes)
+        self.last_peak_bytes = peak_bytes
+        self.total_peak_bytes += peak_bytes
+        self.retained_bytes += retained_bytes
+
+    def to_dict(self) -> dict:
+        return {"requests": self.requests, "max_peak_bytes": self.max_peak_bytes,
+                "last_peak_bytes": self.last_peak_bytes,
+                "mean_peak_bytes": round(self.total_peak_bytes / self.requests) if self.requests else 0,
+                "retained_bytes": self.retained_bytes}
+
+
+class MemoryProfiler:
+    """
+    The peak allocations of the requests, per route - per worker \n
+    The peak of tracemalloc is shared by the whole process: the profiled requests run one at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_lock = asyncio.Lock()
+        self.routes: dict[str, RouteMemory] = {}
+        # Whether the tracing was begun by start - and not e.g. by PYTHONTRACEMALLOC
+        self._started = False
+
+    @property
+    def is_tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, traceback_frames: int = MEMORY_PROFILING_TRACEBACK_FRAMES):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(traceback_frames)
+            self._started = True
+
+    def stop(self):
+        """
+        Stops the tracing begun by start - a tracing begun elsewhere is kept - and forgets the recorded peaks
+        """
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        with self._lock:
+            self.routes = {}
+
+    def record(self, route: str, peak_bytes: int, retained_bytes: int):
+        with self._lock:
+            self.routes.setdefault(route, RouteMemory()).record(peak_bytes=peak_bytes, retained_bytes=retained_bytes)
+
+    def get_top_allocations(self, limit: int = MEMORY_PROFILING_TOP_LIMIT_DEFAULT_NUMBER,
+                            group_by: MemoryGroupingEnum = MemoryGroupingEnum.LINENO) -> list[dict]:
+        """
+        Gets the sites holding the most memory now \n
+        :param limit: The maximum number of sites \n
+        :param group_by: The grouping of the allocations - per line, file or traceback \n
+        :return: The sites, the largest first
+        """
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        return [{"site": [f"{frame.filename}:{frame.lineno}" for frame in statistic.traceback],
+                 "size_bytes": statistic.size, "count": statistic.count}
+                for statistic in snapshot.statistics(group_by.value)[:limit]]
+
+    def to_dict(self) -> dict:
+        traced_bytes, _ = tracemalloc.get_traced_memory()
+        with self._lock:
+            routes = {route: route_memory.to_dict() for route, route_memory in self.routes.items()}
+        return {"tracing": self.is_tracing, "traced_bytes": traced_bytes, "routes": routes}
+
+
+memory_profiler = MemoryProfiler()
+
+
+def get_route_name(request: _fastapi.Request) -> str:
+    """
+    Gets the route of a request - its path template, so the posts share a single entry \n
+    :param request: The request \n
+    :return: The method and the path template
+    """
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return f"{request.method} {route.path}"
+    return f"{request.method} <unmatched>"
+
+
+async def profile_memory(request: _fastapi.Request, call_next):
+    """
+    Records the peak allocation of each request while the memory is traced - see MEMORY_PROFILING_ENABLED \n
+    The bodies of the streamed responses are sent after the measure. \n
+    :param request: The incoming request \n
+    :param call_next: The next ASGI handler \n
+    :return: The response
+    """
+    if not memory_profiler.is_tracing:
+        return await call_next(request)
+
+    async with memory_profiler.request_lock:
+        start_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        response = await call_next(request)
+        end_bytes, peak_bytes = tracemalloc.get_traced_memory()
+
+    memory_profiler.record(route=get_route_name(request), peak_bytes=peak_bytes - start_bytes,
+                           retained_bytes=end_bytes - start_bytes)
+    return response
@@ -0,0 +1,48 @@
+import math
+import time
+
+import fastapi as _fastapi
+
+from project.src.config.db.replicas import DATABASE_REPLICA_MAX_LAG_SECONDS
+
+READ_YOUR_WRITES_COOKIE_NAME = "picshare_last_write"
+READ_YOUR_WRITES_HEADER_NAME = "X-Read-Your-Writes"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+async def stick_to_primary_after_writes(request: _fastapi.Request, call_next):
+    """
+    Marks the client after a successful write so that its next reads, within the replicas lag tolerance,
+    are served by the primary \n
+    :param request: The incoming request \n
+    :param call_next: The next ASGI handler \n
+    :return: The response
+    """
+    response = await call_next(request)
+
+    if request.method in WRITE_METHODS and response.status_code < 400:
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE_NAME,
+            str(time.time()),
+            max_age=math.ceil(DATABASE_REPLICA_MAX_LAG_SECONDS),
+            httponly=True
+        )
+
+    return response
+
+
+def must_read_from_primary(request: _fastapi.Request) -> bool:
+    """
+    Tells whether a read must be served by the primary - the client asked for it or wrote recently \n
+    :param request: The incoming request \n
+    :return: True if the primary must be used
+    """
+    if request.headers.get(READ_YOUR_WRITES_HEADER_NAME, "").lower() in ("1", "true"):
+        return True
+
+    try:
+        last_write = float(request.cookies.get(READ_YOUR_WRITES_COOKIE_NAME))
+    except (TypeError, ValueError):
+        return False
+
+    return time.time() - last_write <= DATABASE_REPLICA_MAX_LAG_SECONDS
@@ -0,0 +1,16 @@
+import fastapi as _fastapi
+
+from project.src.app.services.warmup import startup_timings
+
+
+async def record_first_request(request: _fastapi.Request, call_next):
+    """
+    Records when the worker answered its first request - see the readiness endpoint \n
+    :param request: The incoming request \n
+    :param call_next: The next ASGI handler \n
+    :return: The response
+    """
+    response = await call_next(request)
+    if startup_timings.first_request_on is None and not request.url.path.startswith("/health"):
+        startup_timings.mark_first_request()
+    return response
@@ -1,2 +1,7 @@
 from project.src.app.models.post import Post
 from project.src.app.models.tag import Tag
+from project.src.app.models.tag_usage import TagUsage
+from project.src.app.models.owner_posts_count import OwnerPostsCount
+from project.src.app.models.change import Change
+from project.src.app.models.idempotency_key import IdempotencyKey
+from project.src.app.models.upload import Upload
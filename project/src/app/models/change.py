@@ -0,0 +1,22 @@
+import sqlalchemy as _sql
+
+import project.src.config.db.database as _database
+
+
+class Change(_database.Base):
+    """
+    The database "changes" table model - the change log of the posts and the tags, read by the downstream services
+    """
+    __tablename__ = "changes"
+    __table_args__ = (
+        # The compaction looks for the later changes of an object
+        _sql.Index("ix_changes_object_id_seq", "object_id", "seq"),
+    )
+    # The cursor of the consumers - increasing with each change
+    seq = _sql.Column(_sql.BigInteger().with_variant(_sql.Integer, "sqlite"), primary_key=True, autoincrement=True)
+    object_type = _sql.Column(_sql.String, nullable=False)
+    object_id = _sql.Column(_sql.Uuid, nullable=False)
+    action = _sql.Column(_sql.String, nullable=False)
+    # What the consumers can apply without reading the object - e.g. the likes count of a like
+    payload = _sql.Column(_sql.JSON, nullable=True, default=None)
+    created_on = _sql.Column(_sql.DateTime, nullable=False, index=True)
@@ -0,0 +1,16 @@
+import sqlalchemy as _sql
+
+import project.src.config.db.database as _database
+
+
+class IdempotencyKey(_database.Base):
+    """
+    The database "idempotency_keys" table model - the post created for each "Idempotency-Key" of a client
+    """
+    __tablename__ = "idempotency_keys"
+    owner_id = _sql.Column(_sql.Integer, primary_key=True)
+    key = _sql.Column(_sql.String, primary_key=True)
+    # Unset while the post is being created - the retries wait for it
+    post_id = _sql.Column(_sql.Uuid, nullable=True, default=None)
+    locked_on = _sql.Column(_sql.DateTime, nullable=False)
+    expires_on = _sql.Column(_sql.DateTime, nullable=False, index=True)
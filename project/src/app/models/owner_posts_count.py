@@ -0,0 +1,12 @@
+import sqlalchemy as _sql
+
+import project.src.config.db.database as _database
+
+
+class OwnerPostsCount(_database.Base):
+    """
+    The database "owner_posts_counts" table model - the number of posts of each owner
+    """
+    __tablename__ = "owner_posts_counts"
+    owner_id = _sql.Column(_sql.Integer, primary_key=True)
+    posts_count = _sql.Column(_sql.Integer, nullable=False, default=0, server_default="0")
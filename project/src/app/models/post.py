@@ -4,6 +4,10 @@ import sqlalchemy as _sql
 import sqlalchemy.orm as _orm
 
 import project.src.config.db.database as _database
+from project.src.config.db.partitioning import POSTS_PARTITIONED
+
+# The execution option letting a query see the soft deleted posts - e.g. session.execute(query, execution_options={...})
+INCLUDE_DELETED_POSTS_OPTION = "include_deleted_posts"
 
 
 class Post(_database.Base):
@@ -11,6 +15,14 @@ class Post(_database.Base):
     The database "posts" table model
     """
     __tablename__ = "posts"
+    __table_args__ = (
+        # The popular feed of some owners
+        _sql.Index("ix_posts_owner_id_hot_score", "owner_id", "hot_score"),
+        # Partitioned by month of creation - see config.db.partitioning
+        {"postgresql_partition_by": "RANGE (created_on)"} if POSTS_PARTITIONED else {}
+    )
+    # The primary key of a partitioned table includes the partition key - the posts are still identified by their id
+    __mapper_args__ = {"primary_key": ["id"]}
     id = _sql.Column(
         _sql.Uuid,
         primary_key=True,
@@ -18,11 +30,23 @@ class Post(_database.Base):
         server_default=_sql.func.gen_random_uuid()
     )
     image = _sql.Column(_sql.String, nullable=False)
+    # The image's metadata - extracted at upload, see services.image_processing
+    width = _sql.Column(_sql.Integer, nullable=True, default=None)
+    height = _sql.Column(_sql.Integer, nullable=True, default=None)
+    mime_type = _sql.Column(_sql.String, nullable=True, default=None)
+    byte_size = _sql.Column(_sql.Integer, nullable=True, default=None)
+    # A placeholder the clients paint until the image is downloaded - see https://blurha.sh
+    blurhash = _sql.Column(_sql.String, nullable=True, default=None)
     caption = _sql.Column(_sql.Text, nullable=True, default=None)
     likes = _sql.Column(_sql.Integer, default=0, server_default="0")
+    # The popularity of the post - see services.popularity
+    hot_score = _sql.Column(_sql.Float, nullable=False, index=True, default=0, server_default="0")
     tags = _orm.relationship(
         "Tag",
         secondary=_database.post_tag_linker,
+        # Explicit - the links have no foreign key to a partitioned table
+        primaryjoin="Post.id == foreign(post_tag_linker.c.post_id)",
+        secondaryjoin="Tag.id == foreign(post_tag_linker.c.tag_id)",
         back_populates="posts"
     )
     published = _sql.Column(
@@ -39,11 +63,32 @@ class Post(_database.Base):
     owner_id = _sql.Column(_sql.Integer, nullable=False)
     created_on = _sql.Column(
         _sql.DateTime,
+        primary_key=POSTS_PARTITIONED,
         default=_datetime.datetime.now(),
         server_default=_sql.sql.func.now()
     )
+    # Indexed - the inverted index reads the posts updated since its last sync, see services.inverted_index
     updated_on = _sql.Column(
         _sql.DateTime,
         default=_datetime.datetime.now(),
-        server_default=_sql.sql.func.now()
+        server_default=_sql.sql.func.now(),
+        index=True
+    )
+    # Set when the post is deleted - the row and the image are purged later, see services.garbage_collector
+    deleted_on = _sql.Column(_sql.DateTime, nullable=True, default=None, index=True)
+
+
+@_sql.event.listens_for(_orm.Session, "do_orm_execute")
+def _exclude_deleted_posts(execute_state: _orm.ORMExecuteState):
+    """
+    Hides the soft deleted posts from every ORM query of posts - including the relationships loads \n
+    The posts joined to another entity are not hidden, the join must filter them.
+    """
+    if not execute_state.is_select or execute_state.is_column_load or execute_state.is_relationship_load:
+        return
+    if execute_state.execution_options.get(INCLUDE_DELETED_POSTS_OPTION, False):
+        return
+
+    execute_state.statement = execute_state.statement.options(
+        _orm.with_loader_criteria(Post, lambda cls: cls.deleted_on.is_(None), include_aliases=True)
     )
@@ -20,6 +20,8 @@ class Tag(_database.Base):
     # The name in lowercase
     slug = _sql.Column(_sql.String, index=True, nullable=False, unique=True)
     name = _sql.Column(_sql.String, index=True, nullable=False, unique=True)
+    # The number of posts having the tag - see services.counters
+    posts_count = _sql.Column(_sql.Integer, nullable=False, default=0, server_default="0")
     created_on = _sql.Column(
         _sql.DateTime,
         default=_datetime.datetime.now(),
@@ -28,6 +30,8 @@ class Tag(_database.Base):
     posts = _orm.relationship(
         "Post",
         secondary=_database.post_tag_linker,
+        primaryjoin="Tag.id == foreign(post_tag_linker.c.tag_id)",
+        secondaryjoin="Post.id == foreign(post_tag_linker.c.post_id)",
         back_populates="tags"
     )
 
@@ -0,0 +1,18 @@
+import sqlalchemy as _sql
+
+import project.src.config.db.database as _database
+
+
+class TagUsage(_database.Base):
+    """
+    The database "tag_usages" table model - the number of posts, created in a given hour, using a tag
+    """
+    __tablename__ = "tag_usages"
+    tag_id = _sql.Column(
+        _sql.Uuid,
+        _sql.ForeignKey("tags.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    # The beginning of the hour
+    bucket_start = _sql.Column(_sql.DateTime, primary_key=True, index=True)
+    count = _sql.Column(_sql.Integer, nullable=False, default=0, server_default="0")
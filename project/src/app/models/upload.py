@@ -0,0 +1,26 @@
+import sqlalchemy as _sql
+
+import project.src.config.db.database as _database
+
+
+class Upload(_database.Base):
+    """
+    The database "uploads" table model - an image uploaded by chunks, then used by a new post
+    """
+    __tablename__ = "uploads"
+    id = _sql.Column(
+        _sql.Uuid,
+        primary_key=True,
+        index=True,
+        server_default=_sql.func.gen_random_uuid()
+    )
+    owner_id = _sql.Column(_sql.Integer, nullable=False)
+    filename = _sql.Column(_sql.String, nullable=False)
+    size = _sql.Column(_sql.BigInteger, nullable=False)
+    # The number of bytes received - the next chunk starts there
+    offset = _sql.Column(_sql.BigInteger, nullable=False, default=0, server_default="0")
+    # The expected SHA-256 of the whole file, checked when the upload is finalized
+    sha256 = _sql.Column(_sql.String, nullable=True, default=None)
+    status = _sql.Column(_sql.String, nullable=False, default="in_progress", server_default="in_progress")
+    created_on = _sql.Column(_sql.DateTime, nullable=False)
+    expires_on = _sql.Column(_sql.DateTime, nullable=False, index=True)
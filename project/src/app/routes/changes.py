@@ -0,0 +1,33 @@
+import fastapi as _fastapi
+import sqlalchemy.orm as _orm
+
+import project.src.app.schemas as _schemas
+import project.src.app.services.changes as changes_service
+from project.src.app.routes.shared_constants_and_methods import get_read_db
+
+changes_router = _fastapi.APIRouter(
+    prefix="/api/v1/changes",
+    tags=["changes"],
+)
+
+
+@changes_router.get("/", response_model=_schemas.ChangesPage)
+async def get_changes(
+        after: int = _fastapi.Query(default=0, ge=0),
+        limit: int = _fastapi.Query(default=changes_service.CHANGES_LIMIT_DEFAULT_NUMBER, ge=1,
+                                    le=changes_service.CHANGES_LIMIT_MAX_NUMBER),
+        db: _orm.Session = _fastapi.Depends(get_read_db)
+):
+    """
+    Gets the changes of the posts and the tags - created, updated, liked or deleted - in their order \n
+    A consumer keeps the 'next_after' of each page and asks for the changes after it. \n
+    You can provide: \n
+    - **the cursor - the sequence number of the last change read** \n
+    - **the maximum number of changes** \n
+    \f
+    :param after: Query param 'after' \n
+    :param limit: Query param 'limit' \n
+    :param db: A database session \n
+    :return: The changes and the cursor of the next page
+    """
+    return await changes_service.get_changes(db=db, after=after, limit=limit)
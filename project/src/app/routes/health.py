@@ -0,0 +1,90 @@
+import fastapi as _fastapi
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+
+from project.src.app.app_enums.memoryGroupingEnum import MemoryGroupingEnum
+from project.src.app.middlewares.admission_control import ROUTE_CLASSES
+from project.src.app.middlewares.compression import compression_metrics
+from project.src.app.middlewares.memory_profiling import (
+    MEMORY_PROFILING_TOP_LIMIT_DEFAULT_NUMBER, MEMORY_PROFILING_TOP_LIMIT_MAX_NUMBER, memory_profiler)
+from project.src.app.routes.posts import get_db
+from project.src.app.routes.shared_constants_and_methods import (
+    REQUEST_IS_OK_STATUS_CODE, SERVICE_UNAVAILABLE_STATUS_CODE, OBJECT_CANNOT_BE_FOUND_STATUS_CODE,
+    get_memory_profiling_disabled_detail_message)
+from project.src.app.services.live_likes import likes_broker
+from project.src.app.services.warmup import startup_timings
+
+health_router = _fastapi.APIRouter(
+    prefix="/health",
+    tags=["health"],
+)
+
+
+@health_router.get("/live")
+async def is_alive():
+    """
+    Tells whether the worker runs - it may not be ready yet \n
+    \f
+    :return: The status
+    """
+    return {"status": "alive"}
+
+
+@health_router.get("/ready")
+async def is_ready(response: _fastapi.Response, db: _orm.Session = _fastapi.Depends(get_db)):
+    """
+    Tells whether the worker is warmed up and reaches the database - only a ready worker should get traffic \n
+    \f
+    :param response: The response \n
+    :param db: A database session \n
+    :return: The status and the startup timings
+    """
+    status = "ready"
+    if not startup_timings.is_ready:
+        status = "warming_up"
+    else:
+        try:
+            db.execute(_sql.text("SELECT 1"))
+        except _sql.exc.SQLAlchemyError:
+            status = "database_unavailable"
+
+    response.status_code = REQUEST_IS_OK_STATUS_CODE if status == "ready" else SERVICE_UNAVAILABLE_STATUS_CODE
+    return {"status": status, **startup_timings.to_dict()}
+
+
+@health_router.get("/metrics")
+async def get_metrics():
+    """
+    Gets the metrics of the worker - the admission control of each route class, the compression of the responses and
+    the likes streams \n
+    \f
+    :return: The metrics
+    """
+    return {
+        "admission": {name: route_class.to_dict() for name, route_class in ROUTE_CLASSES.items()},
+        "compression": compression_metrics.to_dict(),
+        "likes_stream": likes_broker.to_dict()
+    }
+
+
+@health_router.get("/memory")
+async def get_memory_profile(
+        limit: int = _fastapi.Query(default=MEMORY_PROFILING_TOP_LIMIT_DEFAULT_NUMBER, ge=1,
+                                    le=MEMORY_PROFILING_TOP_LIMIT_MAX_NUMBER),
+        group_by: MemoryGroupingEnum = MemoryGroupingEnum.LINENO
+):
+    """
+    Gets the memory profile of the worker - the peak allocation of the requests of each route and the sites holding
+    the most memory \n
+    Only while the memory is traced - see MEMORY_PROFILING_ENABLED. \n
+    \f
+    :param limit: Query param 'limit' - the maximum number of allocation sites \n
+    :param group_by: Query param 'group_by' - the allocations are grouped by line, file or traceback \n
+    :return: The memory profile
+    """
+    if not memory_profiler.is_tracing:
+        raise _fastapi.HTTPException(status_code=OBJECT_CANNOT_BE_FOUND_STATUS_CODE,
+                                     detail=get_memory_profiling_disabled_detail_message())
+
+    return {**memory_profiler.to_dict(),
+            "top_allocations": memory_profiler.get_top_allocations(limit=limit, group_by=group_by)}
@@ -1,19 +1,35 @@
+import datetime as _datetime
 import os
-from typing import Union
+from typing import Iterator, Union
 from uuid import UUID
 
 import fastapi as _fastapi
+import pydantic as _pydantic
 import sqlalchemy.orm as _orm
 
 import project.src.app.schemas as _schemas
+import project.src.app.services.counters as counters_service
+import project.src.app.services.export as export_service
+import project.src.app.services.idempotency as idempotency_service
+import project.src.app.services.live_likes as live_likes_service
 import project.src.app.services.post as post_service
+import project.src.app.services.search as search_service
+import project.src.app.services.sparse_fieldsets as sparse_fieldsets_service
+import project.src.app.services.upload as upload_service
 from project.src.app.app_enums.likePostActionEnum import LikePostActionEnum
+from project.src.app.app_enums.postsSortEnum import PostsSortEnum
+from project.src.app.app_enums.uploadStatusEnum import UploadStatusEnum
 from project.src.app.routes.shared_constants_and_methods import (
     SUCCESSFUL_DELETION_MESSAGE_KEY,
     SUCCESSFUL_DELETION_MESSAGE_VALUE_FOR_POST, get_forbidden_request_detail_message, FORBIDDEN_REQUEST_STATUS_CODE,
     OBJECT_CANNOT_BE_FOUND_STATUS_CODE, get_object_cannot_be_found_detail_message, ObjectType,
     OBJECT_CANNOT_BE_DELETED_STATUS_CODE, get_object_cannot_be_deleted_detail_message,
-    get_create_post_owner_id_greater_than_zero_error_detail_message, VALUE_LENGTH_ERROR_STATUS_CODE)
+    get_create_post_owner_id_greater_than_zero_error_detail_message, VALUE_LENGTH_ERROR_STATUS_CODE,
+    set_total_count_headers, IF_NONE_MATCH_HEADER_NAME, get_weak_etag, is_not_modified, get_not_modified_response,
+    set_etag_headers, get_unknown_fields_detail_message, get_sparse_fieldset_response, get_streamed_list_response,
+    get_too_many_posts_detail_message, SERVICE_UNAVAILABLE_STATUS_CODE, get_service_overloaded_detail_message,
+    CONFLICT_STATUS_CODE, get_upload_not_usable_detail_message, get_post_file_required_detail_message, get_read_db,
+    POST_ENTITY_BAD_TYPING_ERROR_STATUS_CODE, get_idempotency_key_in_progress_detail_message)
 from project.src.config.db.database import SessionLocal
 
 posts_router = _fastapi.APIRouter(
@@ -21,6 +37,8 @@ posts_router = _fastapi.APIRouter(
     tags=["posts"],
 )
 
+SEARCH_QUERY_MIN_LENGTH = 1
+
 
 # Dependency
 def get_db():
@@ -31,13 +49,74 @@ def get_db():
         db.close()
 
 
+def get_posts_fields(fields: str | None = _fastapi.Query(
+        default=None, description="The comma separated fields of the posts to send - e.g. 'id,image,likes'")):
+    """
+    Parses the 'fields' query param of the posts listings \n
+    :param fields: Query param 'fields' \n
+    :return: The asked fields, None for all the fields
+    """
+    try:
+        return sparse_fieldsets_service.parse_fields(fields=fields,
+                                                     allowed_fields=sparse_fieldsets_service.POST_FIELDS)
+    except ValueError:
+        raise _fastapi.HTTPException(
+            status_code=VALUE_LENGTH_ERROR_STATUS_CODE,
+            detail=get_unknown_fields_detail_message(sparse_fieldsets_service.POST_FIELDS)
+        )
+
+
+def get_posts_response(posts: list, request: _fastapi.Request, response: _fastapi.Response, total: int | None = None,
+                       fields: tuple[str, ...] | None = None):
+    """
+    Gets the response of a list of posts - a 304 when the client's copy is current \n
+    The ETag is computed from the posts' versions, the list is not serialized to be compared. \n
+    :param posts: The posts \n
+    :param request: The incoming request \n
+    :param response: The response \n
+    :param total: The total number of posts, if sent \n
+    :param fields: If set, only these fields of the posts are sent - the ETag is computed from them \n
+    :return: The posts, or a 304 response
+    """
+    if fields is None:
+        etag = get_weak_etag("posts", total, *(post_service.get_post_version(post) for post in posts))
+    else:
+        posts = [sparse_fieldsets_service.serialize_post(post=post, fields=fields) for post in posts]
+        etag = get_weak_etag("posts", total, fields, *(tuple(post.values()) for post in posts))
+    if is_not_modified(request=request, etag=etag):
+        return get_not_modified_response(etag=etag)
+
+    set_etag_headers(response=response, etag=etag)
+    return posts if fields is None else get_sparse_fieldset_response(rows=posts, response=response)
+
+
+def get_streamed_posts_response(posts: Iterator, response: _fastapi.Response,
+                                fields: tuple[str, ...] | None = None) -> _fastapi.responses.StreamingResponse:
+    """
+    Gets the response of a page of posts, each post serialized and sent as it is read - see post_service.iter_posts \n
+    :param posts: The posts \n
+    :param response: The response \n
+    :param fields: If set, only these fields of the posts are sent \n
+    :return: The streamed posts
+    """
+    rows = (_schemas.Post.from_orm(post).dict() if fields is None
+            else sparse_fieldsets_service.serialize_post(post=post, fields=fields) for post in posts)
+    return get_streamed_list_response(blocks=export_service.iter_json_array(rows), response=response)
+
+
 @posts_router.get("/", response_model=list[_schemas.Post])
 async def fetch_posts(
+        request: _fastapi.Request,
+        response: _fastapi.Response,
         owners_ids: Union[list[int], None] = _fastapi.Query(default=None, alias="owners"),
         tags_slug: Union[list[str], None] = _fastapi.Query(default=None, alias="tags"),
         skip: int = post_service.SKIP_DEFAULT_NUMBER,
         limit: int = post_service.LIMIT_DEFAULT_NUMBER,
-        db: _orm.Session = _fastapi.Depends(get_db)
+        sort: Union[PostsSortEnum, None] = None,
+        include_total: bool = False,
+        stream: bool = False,
+        fields: tuple[str, ...] | None = _fastapi.Depends(get_posts_fields),
+        db: _orm.Session = _fastapi.Depends(get_read_db)
 ):
     """
     Fetches all the posts \n
@@ -46,31 +125,62 @@ async def fetch_posts(
     - **the tags** \n
     - **the skip value** \n
     - **the limit value** \n
+    - **the order: latest OR popular** \n
+    - **whether to send the total number of posts** \n
+    - **whether to stream the posts** \n
+    - **the fields of the posts to send** \n
     \f
     :param limit: Query param 'limit' \n
     :param skip: Query param 'skip' \n
+    :param include_total: Query param 'include_total' - sends the total number of posts in the 'X-Total-Count' header \n
+    :param stream: Query param 'stream' - sends each post as it is read, the memory stays flat for large pages - the
+    response has no ETag \n
+    :param fields: Query param 'fields' - if set, only these fields of the posts are loaded and sent \n
+    :param request: The request - a current copy of the client, per its 'If-None-Match' header, gets a 304 \n
+    :param response: The response \n
+    :param sort: Query param 'sort' - the latest or the most popular posts first \n
     :param db: A database session \n
     :param owners_ids: If set, fetches all the posts of the users corresponding to the given users ids \n
     :param tags_slug: If set, fetches all the posts with the given tag \n
     :return: All the posts in the database
     """
+    total = None
+    if include_total:
+        total, exact = await counters_service.count_posts(db=db, owners_ids=owners_ids, tags_slug=tags_slug)
+        set_total_count_headers(response=response, total=total, exact=exact)
+
+    if stream:
+        posts = await post_service.iter_posts(db=db, owners_ids=owners_ids, tags_slug=tags_slug, skip=skip,
+                                              limit=limit, latest=sort == PostsSortEnum.LATEST,
+                                              popular=sort == PostsSortEnum.POPULAR, fields=fields)
+        return get_streamed_posts_response(posts=posts, response=response, fields=fields)
+
     posts = await post_service.get_posts(
         db=db,
         owners_ids=owners_ids,
         tags_slug=tags_slug,
         skip=skip,
-        limit=limit
+        limit=limit,
+        latest=sort == PostsSortEnum.LATEST,
+        popular=sort == PostsSortEnum.POPULAR,
+        shared=True,
+        fields=fields
     )
-    return posts
+    return get_posts_response(posts=posts, request=request, response=response, total=total, fields=fields)
 
 
 @posts_router.get("/latest/", response_model=list[_schemas.Post])
 async def fetch_latest_posts(
+        request: _fastapi.Request,
+        response: _fastapi.Response,
         owners_ids: Union[list[int], None] = _fastapi.Query(default=None, alias="owners"),
         tags_slug: Union[list[str], None] = _fastapi.Query(default=None, alias="tags"),
         skip: int = post_service.SKIP_DEFAULT_NUMBER,
         limit: int = post_service.LIMIT_DEFAULT_NUMBER,
-        db: _orm.Session = _fastapi.Depends(get_db)
+        include_total: bool = False,
+        stream: bool = False,
+        fields: tuple[str, ...] | None = _fastapi.Depends(get_posts_fields),
+        db: _orm.Session = _fastapi.Depends(get_read_db)
 ):
     """
     Fetches all the latest posts - post sorted by creation date (desc) \n
@@ -79,27 +189,158 @@ async def fetch_latest_posts(
     - **the tags** \n
     - **the skip value** \n
     - **the limit value** \n
+    - **whether to send the total number of posts** \n
+    - **whether to stream the posts** \n
+    - **the fields of the posts to send** \n
     \f
     :param limit: Query param 'limit' \n
     :param skip: Query param 'skip' \n
+    :param include_total: Query param 'include_total' - sends the total number of posts in the 'X-Total-Count' header \n
+    :param stream: Query param 'stream' - sends each post as it is read, the memory stays flat for large pages - the
+    response has no ETag \n
+    :param fields: Query param 'fields' - if set, only these fields of the posts are loaded and sent \n
+    :param request: The request - a current copy of the client, per its 'If-None-Match' header, gets a 304 \n
+    :param response: The response \n
     :param db: A database session \n
     :param owners_ids: If set, fetches all the posts of the users corresponding to the given users ids \n
     :param tags_slug: If set, fetches all the posts with the given tag \n
     :return: All the posts in the database
     """
+    total = None
+    if include_total:
+        total, exact = await counters_service.count_posts(db=db, owners_ids=owners_ids, tags_slug=tags_slug)
+        set_total_count_headers(response=response, total=total, exact=exact)
+
+    if stream:
+        posts = await post_service.iter_posts(db=db, owners_ids=owners_ids, tags_slug=tags_slug, skip=skip,
+                                              limit=limit, latest=True, fields=fields)
+        return get_streamed_posts_response(posts=posts, response=response, fields=fields)
+
     posts = await post_service.get_posts(
         db=db,
         owners_ids=owners_ids,
         tags_slug=tags_slug,
         skip=skip,
         limit=limit,
-        latest=True
+        latest=True,
+        shared=True,
+        fields=fields
+    )
+    return get_posts_response(posts=posts, request=request, response=response, total=total, fields=fields)
+
+
+@posts_router.get("/search", response_model=list[_schemas.Post])
+async def search_posts(
+        request: _fastapi.Request,
+        response: _fastapi.Response,
+        query: str = _fastapi.Query(default=..., alias="q", min_length=SEARCH_QUERY_MIN_LENGTH),
+        owners_ids: Union[list[int], None] = _fastapi.Query(default=None, alias="owners"),
+        tags_slug: Union[list[str], None] = _fastapi.Query(default=None, alias="tags"),
+        skip: int = search_service.SKIP_DEFAULT_NUMBER,
+        limit: int = search_service.LIMIT_DEFAULT_NUMBER,
+        fields: tuple[str, ...] | None = _fastapi.Depends(get_posts_fields),
+        db: _orm.Session = _fastapi.Depends(get_read_db)
+):
+    """
+    Searches the posts by caption - the best matches first \n
+    You must provide: \n
+    - **the words to search** \n
+    You can provide: \n
+    - **the owners id** \n
+    - **the tags** \n
+    - **the skip value** \n
+    - **the limit value** \n
+    - **the fields of the posts to send** \n
+    \f
+    :param query: Query param 'q' - the words to search in the captions \n
+    :param request: The request - a current copy of the client, per its 'If-None-Match' header, gets a 304 \n
+    :param response: The response \n
+    :param limit: Query param 'limit' \n
+    :param skip: Query param 'skip' \n
+    :param fields: Query param 'fields' - if set, only these fields of the posts are loaded and sent \n
+    :param db: A database session \n
+    :param owners_ids: If set, searches only the posts of the users corresponding to the given users ids \n
+    :param tags_slug: If set, searches only the posts with all the given tags \n
+    :return: The matching posts
+    """
+    posts = await search_service.search_posts(
+        db=db,
+        query=query,
+        owners_ids=owners_ids,
+        tags_slug=tags_slug,
+        skip=skip,
+        limit=limit,
+        fields=fields
+    )
+    return get_posts_response(posts=posts, request=request, response=response, fields=fields)
+
+
+@posts_router.get("/export", response_class=_fastapi.responses.StreamingResponse)
+async def export_posts(
+        updated_since: _datetime.datetime | None = None,
+        updated_until: _datetime.datetime | None = None,
+        db: _orm.Session = _fastapi.Depends(get_read_db)
+):
+    """
+    Exports all the posts - with their tags' slugs - as NDJSON: one post per line \n
+    The posts are streamed from a single scan of the table. \n
+    You can provide: \n
+    - **the update datetime from which to export** \n
+    - **the update datetime until which to export** \n
+    \f
+    :param updated_since: Query param 'updated_since' - only the posts updated since then \n
+    :param updated_until: Query param 'updated_until' - only the posts updated before then \n
+    :param db: A database session - open until the end of the stream \n
+    :return: The posts
+    """
+    posts = export_service.iter_posts(db=db, updated_since=updated_since, updated_until=updated_until)
+    return _fastapi.responses.StreamingResponse(export_service.iter_ndjson(posts),
+                                                media_type=export_service.NDJSON_MEDIA_TYPE)
+
+
+@posts_router.get("/likes/stream", response_class=_fastapi.responses.StreamingResponse)
+async def stream_posts_likes(
+        posts_ids: list[UUID] = _fastapi.Query(alias="ids"),
+        db: _orm.Session = _fastapi.Depends(get_read_db)
+):
+    """
+    Streams the likes counts of some posts as server-sent events - instead of polling them \n
+    The current counts are sent first, then a "likes" event - {"id": ..., "likes": ...} - whenever a count changes,
+    at most once per post per LIKES_STREAM_INTERVAL_SECONDS seconds. \n
+    You must provide: \n
+    - **the posts ids** \n
+    \f
+    :param posts_ids: Query param 'ids' - the followed posts \n
+    :param db: A database session - released before the stream starts \n
+    :return: The events
+    """
+    posts_ids = set(posts_ids)
+    if len(posts_ids) > live_likes_service.LIKES_STREAM_MAX_POSTS:
+        raise _fastapi.HTTPException(
+            status_code=VALUE_LENGTH_ERROR_STATUS_CODE,
+            detail=get_too_many_posts_detail_message(live_likes_service.LIKES_STREAM_MAX_POSTS)
+        )
+
+    if live_likes_service.likes_broker.is_full():
+        raise _fastapi.HTTPException(status_code=SERVICE_UNAVAILABLE_STATUS_CODE,
+                                     detail=get_service_overloaded_detail_message())
+
+    try:
+        initial_likes = await post_service.get_posts_likes(db=db, posts_ids=list(posts_ids))
+    finally:
+        # The session would be kept until the end of the stream otherwise
+        db.close()
+
+    return _fastapi.responses.StreamingResponse(
+        live_likes_service.stream_likes(posts_ids=posts_ids, initial_likes=initial_likes),
+        media_type=live_likes_service.EVENT_STREAM_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    return posts
 
 
 @posts_router.get("/{post_id}", response_model=_schemas.Post)
-async def get_post(post_id: UUID, db: _orm.Session = _fastapi.Depends(get_db)):
+async def get_post(post_id: UUID, request: _fastapi.Request, response: _fastapi.Response,
+                   db: _orm.Session = _fastapi.Depends(get_read_db)):
     """
     Gets a single post by is id \n
     You must provide: \n
@@ -107,9 +348,18 @@ async def get_post(post_id: UUID, db: _orm.Session = _fastapi.Depends(get_db)):
     \f
     :param db: A database session \n
     :param post_id: The post id to get \n
+    :param request: The request - a current copy of the client, per its 'If-None-Match' header, gets a 304 \n
+    :param response: The response \n
     :return: The post with the given id
     """
-    db_post = await post_service.get_post_by_id(db=db, post_id=post_id)
+    if request.headers.get(IF_NONE_MATCH_HEADER_NAME):
+        # Only the version columns are read to check the client's copy
+        version = await post_service.query_post_version(db=db, post_id=post_id)
+        etag = None if version is None else get_weak_etag("post", *version)
+        if etag is not None and is_not_modified(request=request, etag=etag):
+            return get_not_modified_response(etag=etag)
+
+    db_post = await post_service.get_post_by_id(db=db, post_id=post_id, shared=True)
 
     if db_post is None:
         raise _fastapi.HTTPException(
@@ -117,13 +367,16 @@ async def get_post(post_id: UUID, db: _orm.Session = _fastapi.Depends(get_db)):
             detail=get_object_cannot_be_found_detail_message(post_id, ObjectType.POST)
         )
 
+    set_etag_headers(response=response, etag=get_weak_etag("post", *post_service.get_post_version(db_post)))
     return db_post
 
 
 @posts_router.post("/new", response_model=_schemas.Post)
 async def create_post(
-        file: _fastapi.UploadFile,
         owner_id: int,
+        request: _fastapi.Request,
+        file: _fastapi.UploadFile | None = _fastapi.File(default=None),
+        upload_id: UUID | None = None,
         tags: list[str] | None = None,
         caption: str | None = None,
         published: bool = True,
@@ -133,13 +386,16 @@ async def create_post(
     Creates a post \n
     You must provide: \n
     - **the post's information to create** \n
-    - **an image** \n
+    - **an image - or the id of a finalized resumable upload, see /api/v1/uploads** \n
+    The retries of a request can send the same 'Idempotency-Key' header - they get the first request's post. \n
     \f
     :param caption:
     :param tags:
     :param published:
     :param owner_id:
     :param file: \n
+    :param upload_id: Query param 'upload_id' - a finalized upload of the owner, instead of the file \n
+    :param request: The request - its idempotency key, once claimed, is in its state \n
     :param db: A database session \n
     # :param post: The post to create - More precisely, all the attributes needed to create a post \n
     :return: The created post
@@ -153,13 +409,36 @@ async def create_post(
             detail=get_create_post_owner_id_greater_than_zero_error_detail_message()
         )
 
+    if (file is None) == (upload_id is None):
+        raise _fastapi.HTTPException(
+            status_code=VALUE_LENGTH_ERROR_STATUS_CODE,
+            detail=get_post_file_required_detail_message()
+        )
+
+    db_upload = None
+    if upload_id is not None:
+        db_upload = await upload_service.get_upload_by_id(db=db, upload_id=upload_id)
+        if db_upload is None:
+            raise _fastapi.HTTPException(
+                status_code=OBJECT_CANNOT_BE_FOUND_STATUS_CODE,
+                detail=get_object_cannot_be_found_detail_message(upload_id, ObjectType.UPLOAD)
+            )
+        if db_upload.status != UploadStatusEnum.FINALIZED.value or db_upload.owner_id != owner_id:
+            raise _fastapi.HTTPException(
+                status_code=CONFLICT_STATUS_CODE,
+                detail=get_upload_not_usable_detail_message()
+            )
+
     post_tags = []
-    for tag in tags:
-        post_tags.append(
-            _schemas.TagCreate(
-                name=tag
+    try:
+        for tag in tags:
+            post_tags.append(
+                _schemas.TagCreate(
+                    name=tag
+                )
             )
-        )
+    except _pydantic.ValidationError as err:
+        raise _fastapi.HTTPException(status_code=POST_ENTITY_BAD_TYPING_ERROR_STATUS_CODE, detail=err.errors())
 
     post = _schemas.PostCreate(
         caption=caption,
@@ -168,13 +447,26 @@ async def create_post(
         owner_id=owner_id
     )
 
-    db_post = await post_service.create_post(db=db, post=post, file=file)
+    try:
+        db_post = await post_service.create_post(db=db, post=post, file=file,
+                                                 idempotency_claim=getattr(request.state, "idempotency_claim", None),
+                                                 db_upload=db_upload)
+    except idempotency_service.IdempotencyKeyLostError:
+        raise _fastapi.HTTPException(
+            status_code=CONFLICT_STATUS_CODE,
+            detail=get_idempotency_key_in_progress_detail_message()
+        )
+    if db_post is None:
+        raise _fastapi.HTTPException(
+            status_code=CONFLICT_STATUS_CODE,
+            detail=get_upload_not_usable_detail_message()
+        )
     return db_post
 
 
 @posts_router.get("/{post_id}/get-image/")
-async def get_upload_file(post_id: UUID, db: _orm.Session = _fastapi.Depends(get_db)):
-    db_post = await post_service.get_post_by_id(db=db, post_id=post_id)
+async def get_upload_file(post_id: UUID, db: _orm.Session = _fastapi.Depends(get_read_db)):
+    db_post = await post_service.get_post_by_id(db=db, post_id=post_id, shared=True)
 
     if db_post is None:
         raise _fastapi.HTTPException(
@@ -283,7 +575,6 @@ async def delete_post(post_id: UUID, user_id: int, db: _orm.Session = _fastapi.D
             detail=get_forbidden_request_detail_message()
         )
 
-    filepath = db_post.image
     ok = await post_service.delete_post(db=db, post_id=post_id)
 
     if ok is False:
@@ -292,10 +583,6 @@ async def delete_post(post_id: UUID, user_id: int, db: _orm.Session = _fastapi.D
             detail=get_object_cannot_be_deleted_detail_message(post_id, ObjectType.POST)
         )
 
-    # Delete image file
-    if os.path.exists(filepath):
-        os.remove(filepath)
-
     return {
         f"{SUCCESSFUL_DELETION_MESSAGE_KEY}": f"{SUCCESSFUL_DELETION_MESSAGE_VALUE_FOR_POST}"
     }
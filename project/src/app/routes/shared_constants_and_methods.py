@@ -1,22 +1,55 @@
+import hashlib
 from enum import Enum
+from typing import Iterator
+
+import sqlalchemy.orm as _orm
+from fastapi import Depends, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from project.src.app.middlewares.read_your_writes import must_read_from_primary
+from project.src.config.db.database import SessionLocal
+from project.src.config.db.replicas import replica_pool
 
 SUCCESSFUL_DELETION_MESSAGE_KEY = "message"
 SUCCESSFUL_DELETION_MESSAGE_VALUE_FOR_TAG = "The tag has been successfully deleted!"
 SUCCESSFUL_DELETION_MESSAGE_VALUE_FOR_POST = "The post has been successfully deleted!"
 
 REQUEST_IS_OK_STATUS_CODE = 200
+NOT_MODIFIED_STATUS_CODE = 304
+
+TOTAL_COUNT_HEADER_NAME = "X-Total-Count"
+# Set to "true" when the total count is the database's estimate
+TOTAL_COUNT_ESTIMATED_HEADER_NAME = "X-Total-Count-Estimated"
+
+ETAG_HEADER_NAME = "ETag"
+IF_NONE_MATCH_HEADER_NAME = "If-None-Match"
+# The clients may keep the responses but must check them - with "If-None-Match" - before using them
+ETAG_CACHE_CONTROL = "no-cache"
+
+# The retries of a request creating a post send the same key - see middlewares.idempotency
+IDEMPOTENCY_KEY_HEADER_NAME = "Idempotency-Key"
+# Set to "true" when the response is the one of a previous request with the same key
+IDEMPOTENCY_REPLAYED_HEADER_NAME = "Idempotent-Replayed"
+
+# The number of bytes of a resumable upload received - the next chunk starts there
+UPLOAD_OFFSET_HEADER_NAME = "Upload-Offset"
 
 OBJECT_CANNOT_BE_DELETED_STATUS_CODE = 400
 TAG_ALREADY_EXISTS_STATUS_CODE = 400
 FORBIDDEN_REQUEST_STATUS_CODE = 403
 OBJECT_CANNOT_BE_FOUND_STATUS_CODE = 404
+CONFLICT_STATUS_CODE = 409
+PAYLOAD_TOO_LARGE_STATUS_CODE = 413
 POST_ENTITY_BAD_TYPING_ERROR_STATUS_CODE = 422
 VALUE_LENGTH_ERROR_STATUS_CODE = 422
+SERVICE_UNAVAILABLE_STATUS_CODE = 503
 
 
 class ObjectType(int, Enum):
     POST = 0,
-    TAG = 1
+    TAG = 1,
+    UPLOAD = 2
 
 
 def get_object_cannot_be_found_detail_message(value, value_type: ObjectType):
@@ -25,6 +58,8 @@ def get_object_cannot_be_found_detail_message(value, value_type: ObjectType):
             return f"The post with id: {value} cannot be found!"
         case ObjectType.TAG:
             return f"The tag with slug: {value} cannot be found!"
+        case ObjectType.UPLOAD:
+            return f"The upload with id: {value} cannot be found!"
 
 
 def get_tag_already_exists_detail_message(value, value_type: ObjectType):
@@ -65,5 +100,176 @@ def get_forbidden_request_detail_message():
     }
 
 
+def get_service_overloaded_detail_message():
+    return {
+        "type": "Service overloaded",
+        "msg": "The service is overloaded, please retry later!"
+    }
+
+
+def get_unknown_fields_detail_message(allowed_fields: tuple[str, ...]):
+    return {
+        "type": "Unknown fields",
+        "msg": f"The fields must be a comma separated list of: {', '.join(allowed_fields)}"
+    }
+
+
+def get_too_many_posts_detail_message(max_posts: int):
+    return {
+        "type": "Too many posts",
+        "msg": f"At most {max_posts} posts can be followed at once"
+    }
+
+
+def get_invalid_idempotency_key_detail_message(max_length: int):
+    return {
+        "type": "Invalid idempotency key",
+        "msg": f"The {IDEMPOTENCY_KEY_HEADER_NAME} header must have 1 to {max_length} characters"
+    }
+
+
+def get_idempotency_key_in_progress_detail_message():
+    return {
+        "type": "Request in progress",
+        "msg": f"A request with the same {IDEMPOTENCY_KEY_HEADER_NAME} is in progress, please retry later!"
+    }
+
+
+def get_upload_offset_mismatch_detail_message(offset: int):
+    return {
+        "type": "Offset mismatch",
+        "msg": f"The upload continues at offset {offset}"
+    }
+
+
+def get_upload_too_large_detail_message(max_size: int):
+    return {
+        "type": "Too large",
+        "msg": f"The file - or the chunk - exceeds {max_size} bytes"
+    }
+
+
+def get_upload_not_finalizable_detail_message(upload_status: str, offset: int, size: int):
+    return {
+        "type": "Upload not finalizable",
+        "msg": f"The upload is {upload_status} with {offset} bytes of {size} received"
+    }
+
+
+def get_upload_checksum_mismatch_detail_message():
+    return {
+        "type": "Checksum mismatch",
+        "msg": "The file does not match its SHA-256 - it must be uploaded again from the start"
+    }
+
+
+def get_upload_not_usable_detail_message():
+    return {
+        "type": "Upload not usable",
+        "msg": "The upload must be finalized, by the owner of the post, and not used by another post"
+    }
+
+
+def get_post_file_required_detail_message():
+    return {
+        "type": "File required",
+        "msg": "Either a file or the id of a finalized upload is required"
+    }
+
+
+def get_memory_profiling_disabled_detail_message():
+    return {
+        "type": "Memory profiling disabled",
+        "msg": "The memory of the worker is not traced - set MEMORY_PROFILING_ENABLED=true"
+    }
+
+
 def get_create_post_owner_id_greater_than_zero_error_detail_message():
     return {"The owner_id must be greater than 0"}
+
+
+# Dependency
+def get_primary_session_factory() -> _orm.sessionmaker:
+    return SessionLocal
+
+
+def get_read_db(request: Request, session_factory: _orm.sessionmaker = Depends(get_primary_session_factory)):
+    """
+    Gives a session on a healthy replica for read-only routes \n
+    Falls back to the primary when no replica can be used or when the client must read its own writes - the primary
+    session is only opened then.
+    """
+    db = None if must_read_from_primary(request) else replica_pool.session()
+    if db is None:
+        db = session_factory()
+
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def set_total_count_headers(response: Response, total: int, exact: bool):
+    response.headers[TOTAL_COUNT_HEADER_NAME] = str(total)
+    if not exact:
+        response.headers[TOTAL_COUNT_ESTIMATED_HEADER_NAME] = "true"
+
+
+def get_sparse_fieldset_response(rows: list[dict], response: Response) -> JSONResponse:
+    """
+    Gets the response of objects reduced to the asked fields - they do not match the route's response model \n
+    :param rows: The asked fields of each object \n
+    :param response: The response - its headers are kept \n
+    :return: The response
+    """
+    return JSONResponse(content=jsonable_encoder(rows), headers=dict(response.headers))
+
+
+def get_streamed_list_response(blocks: Iterator[bytes], response: Response) -> StreamingResponse:
+    """
+    Gets the response of a list sent as it is serialized - it has no ETag: it would need the whole list first \n
+    :param blocks: The blocks of the JSON array \n
+    :param response: The response - its headers are kept \n
+    :return: The response
+    """
+    return StreamingResponse(blocks, media_type="application/json", headers=dict(response.headers))
+
+
+def get_weak_etag(*version) -> str:
+    """
+    Gets a weak ETag - the responses with the same version are equivalent, not byte for byte identical \n
+    :param version: The version of the response - e.g. the ids and the update datetimes of the objects \n
+    :return: The ETag
+    """
+    return f'W/"{hashlib.blake2b(repr(version).encode(), digest_size=12).hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    Tells whether the client's copy - per its "If-None-Match" header - is current \n
+    :param request: The incoming request \n
+    :param etag: The ETag of the current response \n
+    :return: True if a 304 can be sent
+    """
+    if_none_match = request.headers.get(IF_NONE_MATCH_HEADER_NAME)
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    # The weak comparison: "W/" is ignored
+    def opaque_tag(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return opaque_tag(etag) in {opaque_tag(tag) for tag in if_none_match.split(",")}
+
+
+def get_not_modified_response(etag: str) -> Response:
+    return Response(status_code=NOT_MODIFIED_STATUS_CODE,
+                    headers={ETAG_HEADER_NAME: etag, "Cache-Control": ETAG_CACHE_CONTROL})
+
+
+def set_etag_headers(response: Response, etag: str):
+    response.headers[ETAG_HEADER_NAME] = etag
+    response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
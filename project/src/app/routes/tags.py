@@ -1,14 +1,22 @@
+from typing import Iterator
+
 import fastapi as _fastapi
 import sqlalchemy.orm as _orm
 
 import project.src.app.schemas as _schemas
+import project.src.app.services.counters as counters_service
+import project.src.app.services.export as export_service
+import project.src.app.services.sparse_fieldsets as sparse_fieldsets_service
 import project.src.app.services.tag as tag_service
+import project.src.app.services.trending as trending_service
 from project.src.app.routes.shared_constants_and_methods import (
     SUCCESSFUL_DELETION_MESSAGE_KEY, SUCCESSFUL_DELETION_MESSAGE_VALUE_FOR_TAG,
     get_object_cannot_be_found_detail_message, ObjectType, get_tag_already_exists_detail_message,
     get_object_cannot_be_deleted_detail_message, get_search_characters_length_must_be_greater_than_three,
     VALUE_LENGTH_ERROR_STATUS_CODE, TAG_ALREADY_EXISTS_STATUS_CODE, OBJECT_CANNOT_BE_FOUND_STATUS_CODE,
-    OBJECT_CANNOT_BE_DELETED_STATUS_CODE)
+    OBJECT_CANNOT_BE_DELETED_STATUS_CODE, set_total_count_headers, IF_NONE_MATCH_HEADER_NAME, get_weak_etag,
+    is_not_modified, get_not_modified_response, set_etag_headers, get_unknown_fields_detail_message,
+    get_sparse_fieldset_response, get_streamed_list_response, get_read_db)
 from project.src.config.db.database import SessionLocal
 
 tags_router = _fastapi.APIRouter(
@@ -28,22 +36,98 @@ def get_db():
         db.close()
 
 
+def get_tags_fields(fields: str | None = _fastapi.Query(
+        default=None, description="The comma separated fields of the tags to send - e.g. 'slug,name'")):
+    """
+    Parses the 'fields' query param of the tags listings \n
+    :param fields: Query param 'fields' \n
+    :return: The asked fields, None for all the fields
+    """
+    try:
+        return sparse_fieldsets_service.parse_fields(fields=fields,
+                                                     allowed_fields=sparse_fieldsets_service.TAG_FIELDS)
+    except ValueError:
+        raise _fastapi.HTTPException(
+            status_code=VALUE_LENGTH_ERROR_STATUS_CODE,
+            detail=get_unknown_fields_detail_message(sparse_fieldsets_service.TAG_FIELDS)
+        )
+
+
+def get_tags_response(tags: list, request: _fastapi.Request, response: _fastapi.Response, total: int | None = None,
+                      fields: tuple[str, ...] | None = None):
+    """
+    Gets the response of a list of tags - a 304 when the client's copy is current \n
+    :param tags: The tags \n
+    :param request: The incoming request \n
+    :param response: The response \n
+    :param total: The total number of tags, if sent \n
+    :param fields: If set, only these fields of the tags are sent - the ETag is computed from them \n
+    :return: The tags, or a 304 response
+    """
+    if fields is None:
+        etag = get_weak_etag("tags", total, *(tag_service.get_tag_version(tag) for tag in tags))
+    else:
+        tags = [sparse_fieldsets_service.serialize_tag(tag=tag, fields=fields) for tag in tags]
+        etag = get_weak_etag("tags", total, fields, *(tuple(tag.values()) for tag in tags))
+    if is_not_modified(request=request, etag=etag):
+        return get_not_modified_response(etag=etag)
+
+    set_etag_headers(response=response, etag=etag)
+    return tags if fields is None else get_sparse_fieldset_response(rows=tags, response=response)
+
+
+def get_streamed_tags_response(tags: Iterator, response: _fastapi.Response,
+                               fields: tuple[str, ...] | None = None) -> _fastapi.responses.StreamingResponse:
+    """
+    Gets the response of a page of tags, each tag serialized and sent as it is read - see tag_service.iter_tags \n
+    :param tags: The tags \n
+    :param response: The response \n
+    :param fields: If set, only these fields of the tags are sent \n
+    :return: The streamed tags
+    """
+    rows = (_schemas.Tag.from_orm(tag).dict() if fields is None
+            else sparse_fieldsets_service.serialize_tag(tag=tag, fields=fields) for tag in tags)
+    return get_streamed_list_response(blocks=export_service.iter_json_array(rows), response=response)
+
+
 @tags_router.get("/", response_model=list[_schemas.Tag])
-async def fetch_tags(skip: int = 0, limit: int = 100, db: _orm.Session = _fastapi.Depends(get_db)):
+async def fetch_tags(request: _fastapi.Request, response: _fastapi.Response, skip: int = 0, limit: int = 100,
+                     include_total: bool = False, stream: bool = False,
+                     fields: tuple[str, ...] | None = _fastapi.Depends(get_tags_fields),
+                     db: _orm.Session = _fastapi.Depends(get_read_db)):
     """
     Fetches all the tags \n
     You can provide: \n
     - **the skip value** \n
     - **the limit value** \n
+    - **whether to send the total number of tags** \n
+    - **whether to stream the tags** \n
+    - **the fields of the tags to send** \n
     \f
+    :param include_total: Query param 'include_total' - sends the total number of tags in the 'X-Total-Count' header \n
+    :param stream: Query param 'stream' - sends each tag, with its posts, as it is read - the response has no ETag \n
+    :param fields: Query param 'fields' - if set, only these fields of the tags are loaded and sent \n
+    :param request: The request - a current copy of the client, per its 'If-None-Match' header, gets a 304 \n
     :return: Get all the tags in the database
     """
-    tags = await tag_service.get_tags(db=db, skip=skip, limit=limit)
-    return tags
+    total = None
+    if include_total:
+        total, exact = await counters_service.count_tags(db=db)
+        set_total_count_headers(response=response, total=total, exact=exact)
+
+    if stream:
+        tags = await tag_service.iter_tags(db=db, skip=skip, limit=limit, fields=fields)
+        return get_streamed_tags_response(tags=tags, response=response, fields=fields)
+
+    tags = await tag_service.get_tags(db=db, skip=skip, limit=limit, fields=fields)
+    return get_tags_response(tags=tags, request=request, response=response, total=total, fields=fields)
 
 
 @tags_router.get("/search/{characters}", response_model=list[_schemas.Tag])
-async def search_tags(characters: str, skip: int = 0, limit: int = 100, db: _orm.Session = _fastapi.Depends(get_db)):
+async def search_tags(characters: str, request: _fastapi.Request, response: _fastapi.Response, skip: int = 0,
+                      limit: int = 100, include_total: bool = False,
+                      fields: tuple[str, ...] | None = _fastapi.Depends(get_tags_fields),
+                      db: _orm.Session = _fastapi.Depends(get_read_db)):
     """
     Fetches all the tags with names containing the given characters \n
     You must provide: \n
@@ -51,7 +135,12 @@ async def search_tags(characters: str, skip: int = 0, limit: int = 100, db: _orm
     You can provide: \n
     - **the skip value** \n
     - **the limit value** \n
+    - **whether to send the total number of matching tags** \n
+    - **the fields of the tags to send** \n
     \f
+    :param include_total: Query param 'include_total' - sends the total number of tags in the 'X-Total-Count' header \n
+    :param fields: Query param 'fields' - if set, only these fields of the tags are loaded and sent \n
+    :param request: The request - a current copy of the client, per its 'If-None-Match' header, gets a 304 \n
     :return: Get all the tags in the database with names containing the given characters
     """
     if len(characters) < SEARCH_CHARACTERS_MIN_LENGTH:
@@ -60,8 +149,46 @@ async def search_tags(characters: str, skip: int = 0, limit: int = 100, db: _orm
             detail=get_search_characters_length_must_be_greater_than_three(length=SEARCH_CHARACTERS_MIN_LENGTH)
         )
 
-    tags = await tag_service.search_tags(db=db, characters=characters, skip=skip, limit=limit)
-    return tags
+    tags = await tag_service.search_tags(db=db, characters=characters, skip=skip, limit=limit, fields=fields)
+    total = None
+    if include_total:
+        total, exact = await counters_service.count_tags(db=db, characters=characters)
+        set_total_count_headers(response=response, total=total, exact=exact)
+    return get_tags_response(tags=tags, request=request, response=response, total=total, fields=fields)
+
+
+@tags_router.get("/trending", response_model=list[_schemas.TrendingTag])
+async def fetch_trending_tags(
+        window_hours: int = _fastapi.Query(default=trending_service.TRENDING_WINDOW_HOURS_DEFAULT_NUMBER,
+                                           ge=1, le=trending_service.TRENDING_WINDOW_HOURS_MAX_NUMBER),
+        limit: int = _fastapi.Query(default=trending_service.TRENDING_LIMIT_DEFAULT_NUMBER,
+                                    ge=1, le=trending_service.TRENDING_LIMIT_MAX_NUMBER),
+        db: _orm.Session = _fastapi.Depends(get_read_db)
+):
+    """
+    Fetches the tags used the most by the recent posts - the more recent the use, the higher the score \n
+    You can provide: \n
+    - **the number of hours to look back** \n
+    - **the limit value** \n
+    \f
+    :param window_hours: Query param 'window_hours' \n
+    :param limit: Query param 'limit' \n
+    :param db: A database session \n
+    :return: The trending tags, the hottest first
+    """
+    return await trending_service.get_trending_tags(db=db, window_hours=window_hours, limit=limit)
+
+
+@tags_router.get("/export", response_class=_fastapi.responses.StreamingResponse)
+async def export_tags(db: _orm.Session = _fastapi.Depends(get_read_db)):
+    """
+    Exports all the tags as NDJSON: one tag per line \n
+    \f
+    :param db: A database session - open until the end of the stream \n
+    :return: The tags
+    """
+    return _fastapi.responses.StreamingResponse(export_service.iter_ndjson(export_service.iter_tags(db=db)),
+                                                media_type=export_service.NDJSON_MEDIA_TYPE)
 
 
 @tags_router.post("/new", response_model=_schemas.Tag)
@@ -87,7 +214,8 @@ async def create_tag(tag: _schemas.TagCreate, db: _orm.Session = _fastapi.Depend
 
 
 @tags_router.get("/{tag_slug}", response_model=_schemas.Tag)
-async def get_tag(tag_slug: str, db: _orm.Session = _fastapi.Depends(get_db)):
+async def get_tag(tag_slug: str, request: _fastapi.Request, response: _fastapi.Response,
+                  db: _orm.Session = _fastapi.Depends(get_read_db)):
     """
     Gets a single tag using its slug. \n
     You must provide: \n
@@ -95,16 +223,25 @@ async def get_tag(tag_slug: str, db: _orm.Session = _fastapi.Depends(get_db)):
     \f
     :param db: A database session
     :param tag_slug: A tag slug - a unique slug & name per tag
+    :param request: The request - a current copy of the client, per its 'If-None-Match' header, gets a 304 \n
+    :param response: The response \n
     :return: The tag
     """
+    if request.headers.get(IF_NONE_MATCH_HEADER_NAME):
+        # The version is aggregated in the database - the tag's posts are not loaded
+        version = await tag_service.query_tag_version(db=db, tag_slug=tag_slug)
+        etag = None if version is None else get_weak_etag("tag", *version)
+        if etag is not None and is_not_modified(request=request, etag=etag):
+            return get_not_modified_response(etag=etag)
 
-    db_tag = await tag_service.get_tag_by_slug(db=db, tag_slug=tag_slug)
+    db_tag = await tag_service.get_tag_by_slug(db=db, tag_slug=tag_slug, shared=True)
     if db_tag is None:
         raise _fastapi.HTTPException(
             status_code=OBJECT_CANNOT_BE_FOUND_STATUS_CODE,
             detail=get_object_cannot_be_found_detail_message(tag_slug, ObjectType.TAG)
         )
 
+    set_etag_headers(response=response, etag=get_weak_etag("tag", *tag_service.get_tag_version(db_tag)))
     return db_tag
 
 
@@ -0,0 +1,149 @@
+from uuid import UUID
+
+import fastapi as _fastapi
+import sqlalchemy.orm as _orm
+
+import project.src.app.schemas as _schemas
+import project.src.app.services.upload as upload_service
+from project.src.app.app_enums.uploadStatusEnum import UploadStatusEnum
+from project.src.app.routes.posts import get_db
+from project.src.app.routes.shared_constants_and_methods import (
+    UPLOAD_OFFSET_HEADER_NAME, OBJECT_CANNOT_BE_FOUND_STATUS_CODE, CONFLICT_STATUS_CODE, PAYLOAD_TOO_LARGE_STATUS_CODE,
+    VALUE_LENGTH_ERROR_STATUS_CODE, get_object_cannot_be_found_detail_message, ObjectType,
+    get_upload_offset_mismatch_detail_message, get_upload_too_large_detail_message,
+    get_upload_not_finalizable_detail_message, get_upload_checksum_mismatch_detail_message)
+
+uploads_router = _fastapi.APIRouter(
+    prefix="/api/v1/uploads",
+    tags=["uploads"],
+)
+
+
+async def get_upload_or_404(upload_id: UUID, db: _orm.Session):
+    db_upload = await upload_service.get_upload_by_id(db=db, upload_id=upload_id)
+    if db_upload is None:
+        raise _fastapi.HTTPException(
+            status_code=OBJECT_CANNOT_BE_FOUND_STATUS_CODE,
+            detail=get_object_cannot_be_found_detail_message(upload_id, ObjectType.UPLOAD)
+        )
+    return db_upload
+
+
+@uploads_router.post("/", response_model=_schemas.Upload)
+async def create_upload(upload: _schemas.UploadCreate, response: _fastapi.Response,
+                        db: _orm.Session = _fastapi.Depends(get_db)):
+    """
+    Starts a resumable upload - its chunks are then sent in order, and the upload finalized before creating the post \n
+    You must provide: \n
+    - **the owner of the post** \n
+    - **the file's name and size** \n
+    - **optionally, the file's SHA-256 - checked at the end** \n
+    \f
+    :param upload: The file to upload \n
+    :param response: The response \n
+    :param db: A database session \n
+    :return: The upload
+    """
+    if upload.size > upload_service.UPLOAD_MAX_SIZE_BYTES:
+        raise _fastapi.HTTPException(
+            status_code=PAYLOAD_TOO_LARGE_STATUS_CODE,
+            detail=get_upload_too_large_detail_message(upload_service.UPLOAD_MAX_SIZE_BYTES)
+        )
+
+    db_upload = await upload_service.create_upload(db=db, upload=upload)
+    response.headers[UPLOAD_OFFSET_HEADER_NAME] = str(db_upload.offset)
+    return db_upload
+
+
+@uploads_router.get("/{upload_id}", response_model=_schemas.Upload)
+async def get_upload(upload_id: UUID, response: _fastapi.Response, db: _orm.Session = _fastapi.Depends(get_db)):
+    """
+    Gets a resumable upload - e.g. its offset, to resume it after a dropped connection \n
+    You must provide: \n
+    - **the upload id** \n
+    \f
+    :param upload_id: The upload id \n
+    :param response: The response - with the 'Upload-Offset' header \n
+    :param db: A database session \n
+    :return: The upload
+    """
+    db_upload = await get_upload_or_404(upload_id=upload_id, db=db)
+    response.headers[UPLOAD_OFFSET_HEADER_NAME] = str(db_upload.offset)
+    return db_upload
+
+
+@uploads_router.patch("/{upload_id}", response_model=_schemas.Upload)
+async def append_upload_chunk(upload_id: UUID, request: _fastapi.Request, response: _fastapi.Response,
+                              upload_offset: int = _fastapi.Header(alias=UPLOAD_OFFSET_HEADER_NAME, ge=0),
+                              db: _orm.Session = _fastapi.Depends(get_db)):
+    """
+    Appends a chunk - the raw bytes of the request's body - to a resumable upload \n
+    You must provide: \n
+    - **the upload id** \n
+    - **the offset of the chunk - the upload's offset - in the 'Upload-Offset' header** \n
+    \f
+    :param upload_id: The upload id \n
+    :param request: The request - its body is written as it is received \n
+    :param response: The response - with the new 'Upload-Offset' header \n
+    :param upload_offset: Header 'Upload-Offset' \n
+    :param db: A database session \n
+    :return: The upload
+    """
+    db_upload = await get_upload_or_404(upload_id=upload_id, db=db)
+    if db_upload.status != UploadStatusEnum.IN_PROGRESS.value or upload_offset != db_upload.offset:
+        raise _fastapi.HTTPException(
+            status_code=CONFLICT_STATUS_CODE,
+            detail=get_upload_offset_mismatch_detail_message(db_upload.offset),
+            headers={UPLOAD_OFFSET_HEADER_NAME: str(db_upload.offset)}
+        )
+
+    try:
+        appended = await upload_service.append_chunk(db=db, db_upload=db_upload, offset=upload_offset,
+                                                     chunk=request.stream())
+    except ValueError:
+        raise _fastapi.HTTPException(
+            status_code=PAYLOAD_TOO_LARGE_STATUS_CODE,
+            detail=get_upload_too_large_detail_message(
+                min(upload_service.UPLOAD_CHUNK_MAX_BYTES, db_upload.size - upload_offset)
+            )
+        )
+
+    if not appended:
+        raise _fastapi.HTTPException(
+            status_code=CONFLICT_STATUS_CODE,
+            detail=get_upload_offset_mismatch_detail_message(db_upload.offset),
+            headers={UPLOAD_OFFSET_HEADER_NAME: str(db_upload.offset)}
+        )
+
+    response.headers[UPLOAD_OFFSET_HEADER_NAME] = str(db_upload.offset)
+    return db_upload
+
+
+@uploads_router.post("/{upload_id}/finalize", response_model=_schemas.Upload)
+async def finalize_upload(upload_id: UUID, db: _orm.Session = _fastapi.Depends(get_db)):
+    """
+    Finalizes a resumable upload - all its bytes received - after checking its SHA-256 \n
+    Its id can then be given to the creation of a post. \n
+    You must provide: \n
+    - **the upload id** \n
+    \f
+    :param upload_id: The upload id \n
+    :param db: A database session \n
+    :return: The upload
+    """
+    db_upload = await get_upload_or_404(upload_id=upload_id, db=db)
+    if db_upload.status == UploadStatusEnum.FINALIZED.value:
+        return db_upload
+
+    if db_upload.status != UploadStatusEnum.IN_PROGRESS.value or db_upload.offset != db_upload.size:
+        raise _fastapi.HTTPException(
+            status_code=CONFLICT_STATUS_CODE,
+            detail=get_upload_not_finalizable_detail_message(db_upload.status, db_upload.offset, db_upload.size)
+        )
+
+    if not await upload_service.finalize_upload(db=db, db_upload=db_upload):
+        raise _fastapi.HTTPException(
+            status_code=VALUE_LENGTH_ERROR_STATUS_CODE,
+            detail=get_upload_checksum_mismatch_detail_message()
+        )
+    return db_upload
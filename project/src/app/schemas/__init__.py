@@ -1,3 +1,5 @@
-from project.src.app.schemas.schemas import Post, PostUpdate, PostCreate
-from project.src.app.schemas.schemas import Tag, TagCreate
-from project.src.app.schemas.schemas import DEFAULT_DATETIME, TAG_MIN_LENGTH
+from project.src.app.schemas.schemas import Post, PostBase, PostUpdate, PostCreate
+from project.src.app.schemas.schemas import Tag, TagBase, TagCreate, TrendingTag
+from project.src.app.schemas.schemas import Change, ChangesPage
+from project.src.app.schemas.schemas import Upload, UploadCreate
+from project.src.app.schemas.schemas import DEFAULT_DATETIME, TAG_MIN_LENGTH, RESERVED_TAG_SLUGS
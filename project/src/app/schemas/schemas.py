@@ -3,8 +3,14 @@ import uuid
 
 import pydantic as _pydantic
 
+from project.src.app.app_enums.changeActionEnum import ChangeActionEnum
+from project.src.app.app_enums.changeObjectTypeEnum import ChangeObjectTypeEnum
+from project.src.app.app_enums.uploadStatusEnum import UploadStatusEnum
+
 DEFAULT_DATETIME: _datetime.datetime = _datetime.datetime(1, 1, 1, 0, 0, 0, 0)
 TAG_MIN_LENGTH = 3
+# The paths of the tags routes - "/api/v1/tags/trending" - a tag with one of these slugs could not be read
+RESERVED_TAG_SLUGS = ("trending", "export")
 
 
 class TagBase(_pydantic.BaseModel):
@@ -34,7 +40,12 @@ class TagCreate(TagBase):
     """
     The class used for creation - can contain any additional attribute needed for creation
     """
-    pass
+
+    @_pydantic.validator("name")
+    def name_must_not_be_reserved(cls, name: str):
+        if name.lower() in RESERVED_TAG_SLUGS:
+            raise ValueError(f"'{name.lower()}' is reserved")
+        return name
 
 
 class PostCreate(PostBase):
@@ -60,7 +71,7 @@ class PostUpdate(_pydantic.BaseModel):
     The class used for updating a post
     """
     caption: str | None
-    tags: list[TagBase] | None
+    tags: list[TagCreate] | None
     published: bool | None = True
 
 
@@ -70,7 +81,71 @@ class Post(PostBase):
     """
     id: uuid.UUID
     image: str
+    width: int | None = None
+    height: int | None = None
+    mime_type: str | None = None
+    byte_size: int | None = None
+    blurhash: str | None = None
     likes: int
     published_on: _datetime.datetime
     created_on: _datetime.datetime
     updated_on: _datetime.datetime
+
+
+class TrendingTag(_pydantic.BaseModel):
+    """
+    The class used for reading a trending tag when returned from the api
+    """
+    slug: str
+    name: str
+    score: float
+
+
+class Change(_pydantic.BaseModel):
+    """
+    The class used for reading a change of the change log when returned from the api
+    """
+    seq: int
+    object_type: ChangeObjectTypeEnum
+    object_id: uuid.UUID
+    action: ChangeActionEnum
+    payload: dict | None = None
+    created_on: _datetime.datetime
+
+    class Config:
+        orm_mode = True
+
+
+class ChangesPage(_pydantic.BaseModel):
+    """
+    The class used for reading a page of the change log - 'next_after' is the cursor of the next page
+    """
+    changes: list[Change]
+    next_after: int
+
+
+class UploadCreate(_pydantic.BaseModel):
+    """
+    The class used for starting a resumable upload
+    """
+    owner_id: int = _pydantic.Field(..., gt=0)
+    filename: str = _pydantic.Field(..., min_length=1, max_length=255)
+    size: int = _pydantic.Field(..., gt=0)
+    # The SHA-256 of the whole file, in hexadecimal - checked when the upload is finalized
+    sha256: str | None = _pydantic.Field(default=None, regex=r"^[0-9a-fA-F]{64}$")
+
+
+class Upload(_pydantic.BaseModel):
+    """
+    The class used for reading a resumable upload when returned from the api
+    """
+    id: uuid.UUID
+    owner_id: int
+    filename: str
+    size: int
+    offset: int
+    status: UploadStatusEnum
+    expires_on: _datetime.datetime
+
+    class Config:
+        orm_mode = True
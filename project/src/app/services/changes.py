@@ -0,0 +1,138 @@
+import datetime as _datetime
+import os
+import uuid
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import project.src.config.db.database as _database
+from project.src.app import models as _models
+from project.src.app.app_enums.changeActionEnum import ChangeActionEnum
+from project.src.app.app_enums.changeObjectTypeEnum import ChangeObjectTypeEnum
+
+load_dotenv()
+CHANGES_LIMIT_DEFAULT_NUMBER = 100
+CHANGES_LIMIT_MAX_NUMBER = 1000
+# The changes are inserted by the commits of their transactions, last - their sequence numbers follow the commits.
+# On Postgres, they are still taken just before the commit: the latest changes are only served once it had time to end.
+CHANGES_VISIBILITY_DELAY_SECONDS = float(os.getenv(
+    "CHANGES_VISIBILITY_DELAY_SECONDS",
+    "1" if _sql.engine.make_url(_database.DATABASE_URL).get_backend_name() == "postgresql" else "0"
+))
+CHANGES_COMPACTION_BATCH_SIZE = int(os.getenv("CHANGES_COMPACTION_BATCH_SIZE", "1000"))
+# The key of the changes recorded by a session, not inserted yet - in its info
+PENDING_CHANGES_KEY = "pending_changes"
+
+
+def record_change(db: _orm.Session, object_type: ChangeObjectTypeEnum, object_id: uuid.UUID,
+                  action: ChangeActionEnum, payload: dict | None = None):
+    """
+    Adds a change to the change log \n
+    The change is part of the session's transaction, the caller commits: it is inserted by the commit, see
+    insert_pending_changes. \n
+    :param db: A database session \n
+    :param object_type: The type of the changed object \n
+    :param object_id: The id of the changed object \n
+    :param action: The change \n
+    :param payload: What the consumers can apply without reading the object
+    """
+    db.info.setdefault(PENDING_CHANGES_KEY, []).append(
+        {"object_type": object_type.value, "object_id": object_id, "action": action.value, "payload": payload}
+    )
+
+
+@_sql.event.listens_for(_orm.Session, "before_commit")
+def insert_pending_changes(session: _orm.Session):
+    """
+    Inserts the changes of a transaction when it commits - last, with the commit's datetime: a transaction open for
+    a while does not give its changes a sequence number older than the ones committed meanwhile, which the consumers
+    would already be past \n
+    :param session: The committing session
+    """
+    pending_changes = session.info.pop(PENDING_CHANGES_KEY, None)
+    if pending_changes:
+        created_on = _datetime.datetime.now()
+        session.add_all([_models.Change(**change, created_on=created_on) for change in pending_changes])
+
+
+@_sql.event.listens_for(_orm.Session, "after_transaction_end")
+def discard_pending_changes(session: _orm.Session, transaction: _orm.SessionTransaction):
+    """
+    Forgets the changes of a transaction rolled back - or of a session closed without commit
+    """
+    if transaction.parent is None:
+        session.info.pop(PENDING_CHANGES_KEY, None)
+
+
+async def get_changes(db: _orm.Session, after: int = 0, limit: int = CHANGES_LIMIT_DEFAULT_NUMBER):
+    """
+    Gets a page of the change log, in the order of the changes \n
+    :param db: A database session \n
+    :param after: The cursor - the sequence number of the last change already read \n
+    :param limit: The maximum number of changes \n
+    :return: The changes and the cursor of the next page
+    """
+    return query_changes(db=db, after=after, limit=limit)
+
+
+def query_changes(db: _orm.Session, after: int, limit: int) -> dict:
+    query = db.query(_models.Change).filter(_models.Change.seq > after)
+    if CHANGES_VISIBILITY_DELAY_SECONDS > 0:
+        visible_before = _datetime.datetime.now() - _datetime.timedelta(seconds=CHANGES_VISIBILITY_DELAY_SECONDS)
+        query = query.filter(_models.Change.created_on <= visible_before)
+
+    changes = query.order_by(_models.Change.seq).limit(limit).all()
+    return {"changes": changes, "next_after": changes[-1].seq if changes else after}
+
+
+def get_last_change_seq(db: _orm.Session) -> int:
+    return db.execute(_sql.select(_sql.func.max(_models.Change.seq))).scalar() or 0
+
+
+def compact_changes(db: _orm.Session, batch_size: int = CHANGES_COMPACTION_BATCH_SIZE) -> int:
+    """
+    Deletes a batch of the likes followed by another change of the same post - the consumers read the likes count of
+    the latest one \n
+    A consumer past a deleted change lost nothing: the later change is still ahead of its cursor. \n
+    :param db: A database session \n
+    :param batch_size: The maximum number of changes deleted \n
+    :return: The number of changes deleted
+    """
+    later_change = _orm.aliased(_models.Change)
+    seqs = db.execute(
+        _sql.select(_models.Change.seq)
+        .where(_models.Change.action == ChangeActionEnum.LIKED.value)
+        .where(
+            _sql.select(later_change.seq)
+            .where(later_change.object_id == _models.Change.object_id, later_change.seq > _models.Change.seq)
+            .exists()
+        )
+        .order_by(_models.Change.seq)
+        .limit(batch_size)
+    ).scalars().all()
+
+    if seqs:
+        db.execute(_sql.delete(_models.Change).where(_models.Change.seq.in_(seqs)))
+    db.commit()
+    return len(seqs)
+
+
+def compact_all_changes() -> int:
+    """
+    Compacts the whole change log, batch after batch \n
+    It blocks: the background worker runs it in a thread. \n
+    :return: The number of changes deleted
+    """
+    db = _database.SessionLocal()
+    try:
+        compacted = 0
+        while True:
+            batch_compacted = compact_changes(db=db)
+            compacted += batch_compacted
+            if batch_compacted < CHANGES_COMPACTION_BATCH_SIZE:
+                break
+    finally:
+        db.close()
+
+    return compacted
@@ -0,0 +1,153 @@
+import os
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import project.src.config.db.database as _database
+from project.src.app import models as _models
+
+load_dotenv()
+# Above this number of rows - according to the Postgres planner - an unfiltered table is not counted exactly
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv("COUNT_ESTIMATE_THRESHOLD", "100000"))
+
+POSTGRES_ROWS_ESTIMATE_QUERY = _sql.text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table_name)")
+
+
+async def adjust_owner_posts_count(db: _orm.Session, owner_id: int, delta: int):
+    """
+    Adds - or removes - posts to the counter of an owner \n
+    The changes are part of the session's transaction, the caller commits. \n
+    :param db: A database session \n
+    :param owner_id: The owner id \n
+    :param delta: The number of posts created (> 0) or deleted (< 0)
+    """
+    statement = _database.dialect_insert(db, _models.OwnerPostsCount) \
+        .values(owner_id=owner_id, posts_count=max(delta, 0))
+    new_count = _models.OwnerPostsCount.posts_count + delta
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[_models.OwnerPostsCount.owner_id],
+        set_={"posts_count": _sql.case((new_count < 0, 0), else_=new_count)}
+    ))
+
+
+async def adjust_tags_posts_counts(db: _orm.Session, tags_ids: list[UUID], delta: int):
+    """
+    Adds - or removes - posts to the counters of the tags \n
+    The changes are part of the session's transaction, the caller commits. \n
+    :param db: A database session \n
+    :param tags_ids: The ids of the tags linked to - or unlinked from - a single post \n
+    :param delta: 1 when the tags are added to posts, -1 when they are removed
+    """
+    if not tags_ids:
+        return
+
+    new_count = _models.Tag.posts_count + delta
+    db.execute(
+        _sql.update(_models.Tag).where(_models.Tag.id.in_(set(tags_ids)))
+        .values(posts_count=_sql.case((new_count < 0, 0), else_=new_count))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def recount(db: _orm.Session):
+    """
+    Recomputes all the counters from the posts - for the posts created before the counters existed \n
+    :param db: A database session
+    """
+    linker = _database.post_tag_linker
+    # The links of the deleted posts are kept until the posts are purged
+    tags_counts = _sql.select(_sql.func.count()) \
+        .select_from(linker.join(_models.Post, _models.Post.id == linker.c.post_id)) \
+        .where(linker.c.tag_id == _models.Tag.id, _models.Post.deleted_on.is_(None)) \
+        .scalar_subquery()
+    db.execute(_sql.update(_models.Tag).values(posts_count=tags_counts).execution_options(synchronize_session=False))
+
+    db.execute(_sql.delete(_models.OwnerPostsCount))
+    db.execute(
+        _sql.insert(_models.OwnerPostsCount).from_select(
+            ["owner_id", "posts_count"],
+            _sql.select(_models.Post.owner_id, _sql.func.count())
+            .where(_models.Post.deleted_on.is_(None))
+            .group_by(_models.Post.owner_id)
+        )
+    )
+    db.commit()
+
+
+def _estimate_rows(db: _orm.Session, table_name: str) -> int | None:
+    """
+    Reads the planner's estimate of the number of rows of a table - Postgres only \n
+    :return: The estimate, or None when there is none
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+
+    estimate = db.execute(POSTGRES_ROWS_ESTIMATE_QUERY, {"table_name": table_name}).scalar()
+    # A table never analyzed has no estimate
+    return None if estimate is None or estimate < 0 else int(estimate)
+
+
+def _count_table(db: _orm.Session, model) -> tuple[int, bool]:
+    """
+    Counts the rows of a whole table - estimated when the planner says it is large \n
+    :return: The number of rows and whether it is exact
+    """
+    estimate = _estimate_rows(db=db, table_name=model.__tablename__)
+    if estimate is not None and estimate >= COUNT_ESTIMATE_THRESHOLD:
+        return estimate, False
+
+    return db.query(_sql.func.count()).select_from(model).scalar(), True
+
+
+async def count_posts(db: _orm.Session, owners_ids: list[int] | None, tags_slug: list[str] | None) -> tuple[int, bool]:
+    """
+    Counts the posts matching the filters of a posts listing \n
+    - no filter: exact count, or the planner's estimate for a large table \n
+    - only owners, or only one tag: the maintained counters \n
+    - otherwise: exact count \n
+    :param db: A database session \n
+    :param owners_ids: The [posts] owners ids \n
+    :param tags_slug: The [posts] tags \n
+    :return: The number of posts and whether it is exact
+    """
+    tags_ids = None
+    if tags_slug is not None:
+        # As when listing the posts, the unknown tags are ignored
+        tags_counts = db.query(_models.Tag.id, _models.Tag.posts_count) \
+            .filter(_models.Tag.slug.in_({slug.lower() for slug in tags_slug})).all()
+        if not tags_counts:
+            return 0, True
+        if owners_ids is None and len(tags_counts) == 1:
+            return tags_counts[0].posts_count, True
+        tags_ids = [tag_id for tag_id, _ in tags_counts]
+
+    if owners_ids is not None and tags_ids is None:
+        posts_count = db.query(_sql.func.coalesce(_sql.func.sum(_models.OwnerPostsCount.posts_count), 0)) \
+            .filter(_models.OwnerPostsCount.owner_id.in_(set(owners_ids))).scalar()
+        return int(posts_count), True
+
+    if owners_ids is None and tags_ids is None:
+        return _count_table(db=db, model=_models.Post)
+
+    query = db.query(_sql.func.count(_models.Post.id))
+    if owners_ids is not None:
+        query = query.filter(_models.Post.owner_id.in_(set(owners_ids)))
+    for tag_id in tags_ids:
+        query = query.filter(_models.Post.tags.any(_models.Tag.id == tag_id))
+    return query.scalar(), True
+
+
+async def count_tags(db: _orm.Session, characters: str | None = None) -> tuple[int, bool]:
+    """
+    Counts the tags - all of them, or the ones with names containing the given characters \n
+    :param db: A database session \n
+    :param characters: Characters to search in tag name \n
+    :return: The number of tags and whether it is exact
+    """
+    if characters is None:
+        return _count_table(db=db, model=_models.Tag)
+
+    return db.query(_sql.func.count(_models.Tag.id)) \
+        .filter(_models.Tag.slug.contains(characters.lower())).scalar(), True
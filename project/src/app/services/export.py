@@ -0,0 +1,117 @@
+import datetime as _datetime
+import json
+import os
+import uuid
+from typing import Iterator
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import project.src.config.db.database as _database
+from project.src.app import models as _models
+from project.src.app import schemas as _schemas
+
+load_dotenv()
+# The rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+# The lines are sent by blocks of about this size
+EXPORT_BLOCK_SIZE_BYTES = int(os.getenv("EXPORT_BLOCK_SIZE_BYTES", "65536"))
+# The objects of a streamed list page read per round trip - see the 'stream' query param of the listings
+LIST_STREAM_CHUNK_SIZE = int(os.getenv("LIST_STREAM_CHUNK_SIZE", "100"))
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# The exported columns - those of the responses
+POSTS_EXPORT_COLUMNS = [getattr(_models.Post, field) for field in _schemas.Post.__fields__ if field != "tags"]
+TAGS_EXPORT_COLUMNS = [_models.Tag.id, _models.Tag.slug, _models.Tag.name, _models.Tag.posts_count,
+                       _models.Tag.created_on]
+
+
+def _to_json_value(value):
+    if isinstance(value, _datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+
+def iter_posts(db: _orm.Session, updated_since: _datetime.datetime | None = None,
+               updated_until: _datetime.datetime | None = None) -> Iterator[dict]:
+    """
+    Reads all the posts - with their tags' slugs - in a single scan of a server-side cursor \n
+    The tags of each chunk of posts are read at once. \n
+    :param db: A database session \n
+    :param updated_since: If set, only the posts updated since then \n
+    :param updated_until: If set, only the posts updated before then \n
+    :return: The posts
+    """
+    query = _sql.select(*POSTS_EXPORT_COLUMNS)
+    if updated_since is not None:
+        query = query.where(_models.Post.updated_on >= updated_since)
+    if updated_until is not None:
+        query = query.where(_models.Post.updated_on < updated_until)
+
+    linker = _database.post_tag_linker
+    result = db.execute(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    for rows in result.partitions():
+        tags_slugs = {row.id: [] for row in rows}
+        for post_id, slug in db.execute(
+                _sql.select(linker.c.post_id, _models.Tag.slug)
+                .join(_models.Tag, _models.Tag.id == linker.c.tag_id)
+                .where(linker.c.post_id.in_(tags_slugs))):
+            tags_slugs[post_id].append(slug)
+
+        for row in rows:
+            yield {**row._asdict(), "tags": tags_slugs[row.id]}
+
+
+def iter_tags(db: _orm.Session) -> Iterator[dict]:
+    """
+    Reads all the tags - in a single scan of a server-side cursor \n
+    :param db: A database session \n
+    :return: The tags
+    """
+    result = db.execute(_sql.select(*TAGS_EXPORT_COLUMNS).execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    for row in result:
+        yield row._asdict()
+
+
+def iter_ndjson(objects: Iterator[dict], block_size: int = EXPORT_BLOCK_SIZE_BYTES) -> Iterator[bytes]:
+    """
+    Serializes objects as NDJSON - one JSON document per line - by blocks of lines \n
+    :param objects: The objects \n
+    :param block_size: The approximate size of the blocks in bytes \n
+    :return: The blocks
+    """
+    lines, size = [], 0
+    for obj in objects:
+        line = json.dumps(obj, default=_to_json_value, separators=(",", ":")).encode("utf-8") + b"\n"
+        lines.append(line)
+        size += len(line)
+        if size >= block_size:
+            yield b"".join(lines)
+            lines, size = [], 0
+
+    if lines:
+        yield b"".join(lines)
+
+
+def iter_json_array(objects: Iterator[dict], block_size: int = EXPORT_BLOCK_SIZE_BYTES) -> Iterator[bytes]:
+    """
+    Serializes objects as a JSON array, object after object, by blocks - the array is never held whole in memory \n
+    :param objects: The objects \n
+    :param block_size: The approximate size of the blocks in bytes \n
+    :return: The blocks
+    """
+    items, size, separator = [b"["], 1, b""
+    for obj in objects:
+        item = separator + json.dumps(obj, default=_to_json_value, separators=(",", ":")).encode("utf-8")
+        separator = b","
+        items.append(item)
+        size += len(item)
+        if size >= block_size:
+            yield b"".join(items)
+            items, size = [], 0
+
+    items.append(b"]")
+    yield b"".join(items)
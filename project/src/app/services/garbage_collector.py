@@ -0,0 +1,173 @@
+import asyncio
+import datetime as _datetime
+import logging
+import os
+import time
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import project.src.app.services.changes as _changes_service
+import project.src.app.services.idempotency as _idempotency_service
+import project.src.app.services.upload as _upload_service
+import project.src.config.db.database as _database
+from project.src.app import models as _models
+from project.src.app.models.post import INCLUDE_DELETED_POSTS_OPTION
+
+load_dotenv()
+GC_ENABLED = os.getenv("GC_ENABLED", "true").lower() == "true"
+GC_INTERVAL_SECONDS = float(os.getenv("GC_INTERVAL_SECONDS", "60"))
+GC_BATCH_SIZE = int(os.getenv("GC_BATCH_SIZE", "500"))
+# A deleted post is kept - and can be restored from the database - for a while before being purged
+GC_RETENTION_SECONDS = float(os.getenv("GC_RETENTION_SECONDS", "3600"))
+GC_RECONCILE_INTERVAL_SECONDS = float(os.getenv("GC_RECONCILE_INTERVAL_SECONDS", "21600"))
+# A new file is not referenced by its post until the upload ends - the younger files are never orphans
+GC_ORPHAN_MIN_AGE_SECONDS = float(os.getenv("GC_ORPHAN_MIN_AGE_SECONDS", "3600"))
+
+logger = logging.getLogger(__name__)
+
+
+def remove_images(images: list[str]) -> int:
+    """
+    Removes images files - the missing ones are ignored \n
+    :param images: The images paths \n
+    :return: The number of files removed
+    """
+    removed = 0
+    for image in images:
+        try:
+            os.remove(image)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as err:
+            logger.warning("Cannot remove the image %s: %s", image, err)
+    return removed
+
+
+def purge_deleted_posts(db: _orm.Session, batch_size: int = GC_BATCH_SIZE,
+                        retention_seconds: float = GC_RETENTION_SECONDS) -> int:
+    """
+    Deletes a batch of the posts soft deleted for longer than the retention, then their images \n
+    The rows go first: a crash in between leaks files, which the reconciliation removes. \n
+    :param db: A database session \n
+    :param batch_size: The maximum number of posts purged \n
+    :param retention_seconds: The time a deleted post is kept \n
+    :return: The number of posts purged
+    """
+    deleted_before = _datetime.datetime.now() - _datetime.timedelta(seconds=retention_seconds)
+    # The workers purging at the same time take different batches
+    rows = db.execute(
+        _sql.select(_models.Post.id, _models.Post.image)
+        .where(_models.Post.deleted_on.is_not(None), _models.Post.deleted_on <= deleted_before)
+        .order_by(_models.Post.deleted_on)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True),
+        execution_options={INCLUDE_DELETED_POSTS_OPTION: True}
+    ).all()
+    if not rows:
+        return 0
+
+    posts_ids = [row.id for row in rows]
+    db.execute(_sql.delete(_database.post_tag_linker).where(_database.post_tag_linker.c.post_id.in_(posts_ids)))
+    db.execute(
+        _sql.delete(_models.Post).where(_models.Post.id.in_(posts_ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    remove_images([row.image for row in rows if row.image])
+    return len(rows)
+
+
+def find_orphan_images(db: _orm.Session, directory: str | None = None,
+                       min_age_seconds: float = GC_ORPHAN_MIN_AGE_SECONDS) -> list[str]:
+    """
+    Finds the files of the images directory that no post - deleted or not - references \n
+    :param db: A database session \n
+    :param directory: The images directory - IMAGES_DIRECTORY_NAME by default \n
+    :param min_age_seconds: The files modified more recently are ignored \n
+    :return: The orphan files paths
+    """
+    directory = directory or os.getenv("IMAGES_DIRECTORY_NAME")
+    if not directory or not os.path.isdir(directory):
+        return []
+
+    modified_before = time.time() - min_age_seconds
+    with os.scandir(directory) as entries:
+        candidates = {
+            os.path.abspath(entry.path): entry.path for entry in entries
+            if entry.is_file() and entry.stat().st_mtime <= modified_before
+        }
+    if not candidates:
+        return []
+
+    images = db.execute(
+        _sql.select(_models.Post.image).where(_models.Post.image != ""),
+        execution_options={INCLUDE_DELETED_POSTS_OPTION: True, "yield_per": GC_BATCH_SIZE}
+    ).scalars()
+    for image in images:
+        candidates.pop(os.path.abspath(image), None)
+
+    return sorted(candidates.values())
+
+
+def collect_garbage(reconcile: bool = False) -> tuple[int, int]:
+    """
+    Purges all the expired deleted posts, batch after batch - and removes the orphan images if asked \n
+    It blocks: the background worker runs it in a thread. \n
+    :param reconcile: Whether to look for orphan images \n
+    :return: The number of posts purged and the number of orphan images removed
+    """
+    db = _database.SessionLocal()
+    try:
+        purged = 0
+        while True:
+            batch_purged = purge_deleted_posts(db=db)
+            purged += batch_purged
+            if batch_purged < GC_BATCH_SIZE:
+                break
+
+        orphans_removed = remove_images(find_orphan_images(db=db)) if reconcile else 0
+        # The resumable uploads never used by a post
+        _upload_service.purge_expired_uploads(db=db)
+    finally:
+        db.close()
+
+    return purged, orphans_removed
+
+
+async def run_garbage_collector():
+    """
+    Collects the garbage every GC_INTERVAL_SECONDS seconds - and reconciles the images every
+    GC_RECONCILE_INTERVAL_SECONDS seconds - off the event loop, until cancelled \n
+    The change log is compacted and the expired idempotency keys are purged at the same time, see services.changes
+    and services.idempotency.
+    """
+    last_reconciled_on = None
+    while True:
+        reconcile = last_reconciled_on is None or \
+            time.monotonic() - last_reconciled_on >= GC_RECONCILE_INTERVAL_SECONDS
+        try:
+            purged, orphans_removed = await asyncio.to_thread(collect_garbage, reconcile)
+            if purged or orphans_removed:
+                logger.info("Garbage collected: %d posts purged, %d orphan images removed", purged, orphans_removed)
+            if reconcile:
+                last_reconciled_on = time.monotonic()
+        except Exception:
+            logger.exception("The garbage collection failed")
+
+        try:
+            compacted = await asyncio.to_thread(_changes_service.compact_all_changes)
+            if compacted:
+                logger.info("Change log compacted: %d changes removed", compacted)
+        except Exception:
+            logger.exception("The change log compaction failed")
+
+        try:
+            await asyncio.to_thread(_idempotency_service.idempotency_store.purge_expired)
+        except Exception:
+            logger.exception("The expired idempotency keys could not be purged")
+
+        await asyncio.sleep(GC_INTERVAL_SECONDS)
@@ -0,0 +1,221 @@
+import asyncio
+import datetime as _datetime
+import logging
+import os
+import uuid
+from enum import Enum
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import project.src.config.db.database as _database
+from project.src.app import models as _models
+
+load_dotenv()
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+# The retries of a request within this time get the same post
+IDEMPOTENCY_KEY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", "86400"))
+# A request which stopped renewing its key for this time is considered dead - a retry takes its key over
+IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", "60"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# A claimed key is renewed this many times per lock timeout - a slow upload keeps its key
+IDEMPOTENCY_RENEWALS_PER_LOCK_TIMEOUT = 3
+
+logger = logging.getLogger(__name__)
+
+
+class ClaimStatus(str, Enum):
+    """
+    Defines the state of a key when a request claims it
+    """
+    CLAIMED = "claimed"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+
+
+class IdempotencyClaim:
+    """
+    The state of a key when a request claims it - once claimed, its 'locked_on' tells the request's claim apart from
+    a later claim of the same key
+    """
+
+    def __init__(self, status: ClaimStatus, owner_id: int, key: str, post_id: uuid.UUID | None = None,
+                 locked_on: _datetime.datetime | None = None):
+        self.status = status
+        self.owner_id = owner_id
+        self.key = key
+        self.post_id = post_id
+        self.locked_on = locked_on
+        self.renewal: ClaimRenewal | None = None
+
+    async def stop_renewal(self):
+        """
+        Stops renewing the key - before the transaction recording the post, which locks it
+        """
+        if self.renewal is not None:
+            await self.renewal.stop()
+
+
+class IdempotencyKeyLostError(Exception):
+    """
+    Raised when the key of a request was taken over by a retry - the retry creates the post
+    """
+
+
+class ClaimRenewal:
+    """
+    Renews a claimed key in the background, off the event loop, until stopped - or taken over by a retry \n
+    Stopping waits for the renewal in progress: the claim's 'locked_on' does not change afterwards.
+    """
+
+    def __init__(self, store: "IdempotencyStore", claim: IdempotencyClaim):
+        self._store = store
+        self._claim = claim
+        self._stopped = asyncio.Event()
+        self._task = asyncio.create_task(self._renew())
+
+    async def _renew(self):
+        interval_seconds = self._store.lock_timeout_seconds / IDEMPOTENCY_RENEWALS_PER_LOCK_TIMEOUT
+        while True:
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=interval_seconds)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                if not await asyncio.to_thread(self._store.renew, claim=self._claim):
+                    # Taken over by a retry - the post of this request will not be recorded
+                    return
+            except Exception:
+                logger.exception("The idempotency key %s could not be renewed", self._claim.key)
+
+    async def stop(self):
+        self._stopped.set()
+        await self._task
+
+
+class IdempotencyStore:
+    """
+    The keys of the requests creating the posts, with the post created for each - shared by the workers through the
+    database \n
+    The first request with a key claims it and creates the post, the others wait for its post.
+    """
+
+    def __init__(self, session_factory: _orm.sessionmaker = _database.SessionLocal,
+                 ttl_seconds: float = IDEMPOTENCY_KEY_TTL_SECONDS,
+                 lock_timeout_seconds: float = IDEMPOTENCY_LOCK_TIMEOUT_SECONDS):
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.lock_timeout_seconds = lock_timeout_seconds
+
+    def claim(self, owner_id: int, key: str) -> IdempotencyClaim:
+        """
+        Claims a key - only one request gets it, until it expires or its request dies \n
+        :param owner_id: The owner of the post to create \n
+        :param key: The client's key \n
+        :return: The state of the key and, once completed, the id of the created post
+        """
+        now = _datetime.datetime.now()
+        claimed = IdempotencyClaim(status=ClaimStatus.CLAIMED, owner_id=owner_id, key=key, locked_on=now)
+        in_progress = IdempotencyClaim(status=ClaimStatus.IN_PROGRESS, owner_id=owner_id, key=key)
+        with self.session_factory() as db:
+            inserted = db.execute(
+                _database.dialect_insert(db, _models.IdempotencyKey)
+                .values(owner_id=owner_id, key=key, locked_on=now,
+                        expires_on=now + _datetime.timedelta(seconds=self.ttl_seconds))
+                .on_conflict_do_nothing()
+            ).rowcount
+            db.commit()
+            if inserted:
+                return claimed
+
+            db_key = db.get(_models.IdempotencyKey, (owner_id, key))
+            if db_key is None:
+                # Released meanwhile - the request failed, this one may try again
+                return in_progress
+
+            is_dead = db_key.post_id is None and \
+                db_key.locked_on <= now - _datetime.timedelta(seconds=self.lock_timeout_seconds)
+            if db_key.expires_on <= now or is_dead:
+                # Only one of the concurrent requests takes it over
+                taken_over = db.execute(
+                    _sql.update(_models.IdempotencyKey)
+                    .where(_models.IdempotencyKey.owner_id == owner_id, _models.IdempotencyKey.key == key,
+                           _models.IdempotencyKey.locked_on == db_key.locked_on)
+                    .values(post_id=None, locked_on=now,
+                            expires_on=now + _datetime.timedelta(seconds=self.ttl_seconds))
+                ).rowcount
+                db.commit()
+                return claimed if taken_over else in_progress
+
+            if db_key.post_id is None:
+                return in_progress
+            return IdempotencyClaim(status=ClaimStatus.COMPLETED, owner_id=owner_id, key=key, post_id=db_key.post_id)
+
+    @staticmethod
+    def _is_held(claim: IdempotencyClaim):
+        """
+        :param claim: A request's claim \n
+        :return: The condition matching the key while the request still holds it
+        """
+        return _sql.and_(_models.IdempotencyKey.owner_id == claim.owner_id, _models.IdempotencyKey.key == claim.key,
+                         _models.IdempotencyKey.locked_on == claim.locked_on,
+                         _models.IdempotencyKey.post_id.is_(None))
+
+    def renew(self, claim: IdempotencyClaim) -> bool:
+        """
+        Keeps a claimed key while its request runs - e.g. while a slow upload is read \n
+        :param claim: The request's claim \n
+        :return: False if a retry took the key over meanwhile
+        """
+        now = _datetime.datetime.now()
+        with self.session_factory() as db:
+            renewed = db.execute(
+                _sql.update(_models.IdempotencyKey).where(self._is_held(claim)).values(locked_on=now)
+            ).rowcount
+            db.commit()
+
+        if renewed:
+            claim.locked_on = now
+        return renewed == 1
+
+    def complete(self, db: _orm.Session, claim: IdempotencyClaim, post_id: uuid.UUID) -> bool:
+        """
+        Records the post created for a key \n
+        The change is part of the session's transaction - the one creating the post - the caller commits. \n
+        :param db: A database session \n
+        :param claim: The request's claim \n
+        :param post_id: The id of the created post \n
+        :return: False if a retry took the key over meanwhile - the post must not be created
+        """
+        return db.execute(
+            _sql.update(_models.IdempotencyKey).where(self._is_held(claim)).values(post_id=post_id)
+        ).rowcount == 1
+
+    def release(self, claim: IdempotencyClaim):
+        """
+        Releases a key whose request failed - its retry creates the post \n
+        A key taken over by a retry is kept. \n
+        :param claim: The request's claim
+        """
+        with self.session_factory() as db:
+            db.execute(_sql.delete(_models.IdempotencyKey).where(self._is_held(claim)))
+            db.commit()
+
+    def purge_expired(self) -> int:
+        """
+        Deletes the expired keys \n
+        :return: The number of keys deleted
+        """
+        with self.session_factory() as db:
+            purged = db.execute(
+                _sql.delete(_models.IdempotencyKey)
+                .where(_models.IdempotencyKey.expires_on <= _datetime.datetime.now())
+            ).rowcount
+            db.commit()
+        return purged
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,176 @@
+import asyncio
+import concurrent.futures
+import logging
+import mimetypes
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+load_dotenv()
+# The uploads are processed by a pool of processes - the CPU bound work never holds the event loop nor the GIL
+IMAGE_PROCESSING_WORKERS = int(os.getenv("IMAGE_PROCESSING_WORKERS", "2"))
+IMAGE_PROCESSING_TIMEOUT_SECONDS = float(os.getenv("IMAGE_PROCESSING_TIMEOUT_SECONDS", "30"))
+# The quality of the JPEG images re-encoded after being rotated
+IMAGE_JPEG_QUALITY = 90
+# The number of horizontal and vertical components of the blurhash - 4 x 3 makes a 28 characters hash
+BLURHASH_X_COMPONENTS = 4
+BLURHASH_Y_COMPONENTS = 3
+# The blurhash is computed on a thumbnail - its details would be averaged out anyway
+BLURHASH_THUMBNAIL_SIZE = (64, 64)
+BLURHASH_BASE83_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+# The formats re-saved without their EXIF data
+EXIF_STRIPPED_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+logger = logging.getLogger(__name__)
+
+_pool: concurrent.futures.ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _encode_base83(value: int, length: int) -> str:
+    return "".join(
+        BLURHASH_BASE83_CHARACTERS[(value // 83 ** (length - position)) % 83] for position in range(1, length + 1)
+    )
+
+
+def _linear_to_srgb(value: float) -> int:
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def compute_blurhash(image: Image.Image, x_components: int = BLURHASH_X_COMPONENTS,
+                     y_components: int = BLURHASH_Y_COMPONENTS) -> str:
+    """
+    Computes the blurhash of an image - a few characters a client decodes into a blurred placeholder \n
+    See https://github.com/woltapp/blurhash for the algorithm \n
+    :param image: The image \n
+    :param x_components: The number of horizontal components, between 1 and 9 \n
+    :param y_components: The number of vertical components, between 1 and 9 \n
+    :return: The blurhash
+    """
+    thumbnail = image.convert("RGB")
+    thumbnail.thumbnail(BLURHASH_THUMBNAIL_SIZE)
+    srgb = np.asarray(thumbnail, dtype=np.float64) / 255
+    linear = np.where(srgb <= 0.04045, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4)
+    height, width = linear.shape[:2]
+
+    basis_x = np.cos(np.pi * np.outer(np.arange(x_components), np.arange(width)) / width)
+    basis_y = np.cos(np.pi * np.outer(np.arange(y_components), np.arange(height)) / height)
+    # factors[j, i] is the (r, g, b) weight of the cos(i.x) * cos(j.y) component
+    factors = np.einsum("jy,ix,yxc->jic", basis_y, basis_x, linear) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+    factors = factors.reshape(-1, 3)
+    dc, ac = factors[0], factors[1:]
+
+    blurhash = _encode_base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if len(ac):
+        quantised_maximum = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_maximum + 1) / 166
+        blurhash += _encode_base83(quantised_maximum, 1)
+    else:
+        maximum = 1
+        blurhash += _encode_base83(0, 1)
+
+    red, green, blue = (_linear_to_srgb(value) for value in dc)
+    blurhash += _encode_base83((red << 16) + (green << 8) + blue, 4)
+
+    quantised_ac = np.clip(np.floor(np.sign(ac) * np.sqrt(np.abs(ac / maximum)) * 9 + 9.5), 0, 18).astype(int)
+    for red, green, blue in quantised_ac:
+        blurhash += _encode_base83(red * 19 * 19 + green * 19 + blue, 2)
+
+    return blurhash
+
+
+def _strip_exif(image: Image.Image, path: str) -> Image.Image:
+    """
+    Re-saves an image without its EXIF data - its orientation is applied first \n
+    The file is replaced at once, it is never read half written. \n
+    :param image: The opened image \n
+    :param path: The image's file path \n
+    :return: The image as saved
+    """
+    image_format = image.format
+    transposed_image = ImageOps.exif_transpose(image)
+    save_options = {"format": image_format}
+    if image.info.get("icc_profile"):
+        save_options["icc_profile"] = image.info["icc_profile"]
+    if image_format == "JPEG":
+        # The quantization tables are kept when the pixels are unchanged - no quality loss
+        save_options["quality"] = "keep" if transposed_image is image else IMAGE_JPEG_QUALITY
+    elif image_format == "WEBP":
+        save_options["quality"] = IMAGE_JPEG_QUALITY
+
+    temporary_path = f"{path}.tmp"
+    transposed_image.save(temporary_path, **save_options)
+    os.replace(temporary_path, path)
+    return transposed_image
+
+
+def process_image(path: str) -> dict:
+    """
+    Extracts the metadata of an uploaded image, strips its EXIF data and computes its blurhash - runs in the pool \n
+    A file that is not an image only gets its size and its MIME type guessed from its name. \n
+    :param path: The image's file path \n
+    :return: The width, height, mime_type, byte_size and blurhash of the image
+    """
+    metadata = {"width": None, "height": None, "mime_type": mimetypes.guess_type(path)[0],
+                "byte_size": None, "blurhash": None}
+    try:
+        with Image.open(path) as image:
+            image.load()
+            metadata["mime_type"] = image.get_format_mimetype() or metadata["mime_type"]
+            if image.format in EXIF_STRIPPED_FORMATS and image.getexif() and not getattr(image, "is_animated", False):
+                image = _strip_exif(image=image, path=path)
+            metadata["width"], metadata["height"] = image.size
+            metadata["blurhash"] = compute_blurhash(image)
+    except (UnidentifiedImageError, OSError, ValueError) as err:
+        logger.warning("Cannot process the image %s: %s", path, err)
+
+    if os.path.exists(path):
+        metadata["byte_size"] = os.path.getsize(path)
+    return metadata
+
+
+def get_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Gets the pool processing the images - created by each worker on its first upload
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = concurrent.futures.ProcessPoolExecutor(max_workers=IMAGE_PROCESSING_WORKERS)
+        return _pool
+
+
+def shutdown_pool():
+    """
+    Stops the pool processing the images - if started
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def extract_image_metadata(path: str) -> dict:
+    """
+    Processes an uploaded image in the pool - see process_image \n
+    :param path: The image's file path \n
+    :return: The metadata of the image - all None when the processing fails
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(get_pool(), process_image, path),
+                                      timeout=IMAGE_PROCESSING_TIMEOUT_SECONDS)
+    except (asyncio.TimeoutError, concurrent.futures.process.BrokenProcessPool) as err:
+        logger.warning("Cannot process the image %s: %r", path, err)
+        if isinstance(err, concurrent.futures.process.BrokenProcessPool):
+            shutdown_pool()
+        return {"width": None, "height": None, "mime_type": None, "byte_size": None, "blurhash": None}
@@ -0,0 +1,283 @@
+import datetime as _datetime
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Iterable
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import project.src.config.db.database as _database
+from project.src.app import models as _models
+from project.src.app.models.post import INCLUDE_DELETED_POSTS_OPTION
+
+try:
+    from pyroaring import BitMap
+except ImportError:  # The posting lists are plain bitsets - see IntBitMap
+    BitMap = None
+
+load_dotenv()
+INVERTED_INDEX_ENABLED = os.getenv("INVERTED_INDEX_ENABLED", "false").lower() == "true"
+# The rows read per round trip while the index is built
+INVERTED_INDEX_BUILD_CHUNK_SIZE = int(os.getenv("INVERTED_INDEX_BUILD_CHUNK_SIZE", "10000"))
+# The index catches up with the posts written through the other workers this often
+INVERTED_INDEX_SYNC_INTERVAL_SECONDS = float(os.getenv("INVERTED_INDEX_SYNC_INTERVAL_SECONDS", "5"))
+# The changes are read again a bit before the last sync - the workers' clocks may differ
+INVERTED_INDEX_SYNC_OVERLAP_SECONDS = float(os.getenv("INVERTED_INDEX_SYNC_OVERLAP_SECONDS", "2"))
+
+logger = logging.getLogger(__name__)
+
+
+class IntBitMap:
+    """
+    A set of non negative integers kept in the bits of an int - used when pyroaring is not installed \n
+    It has the methods of pyroaring.BitMap used by the index.
+    """
+    __slots__ = ("_bits",)
+
+    def __init__(self, values: Iterable[int] = ()):
+        buffer = bytearray()
+        for value in values:
+            if value >> 3 >= len(buffer):
+                buffer.extend(bytes((value >> 3) - len(buffer) + 1))
+            buffer[value >> 3] |= 1 << (value & 7)
+        self._bits = int.from_bytes(buffer, "little")
+
+    def add(self, value: int):
+        self._bits |= 1 << value
+
+    def discard(self, value: int):
+        self._bits &= ~(1 << value)
+
+    def __and__(self, other: "IntBitMap") -> "IntBitMap":
+        result = IntBitMap()
+        result._bits = self._bits & other._bits
+        return result
+
+    def __or__(self, other: "IntBitMap") -> "IntBitMap":
+        result = IntBitMap()
+        result._bits = self._bits | other._bits
+        return result
+
+    def __len__(self) -> int:
+        return self._bits.bit_count()
+
+    def __iter__(self):
+        for byte_index, byte in enumerate(self._bits.to_bytes((self._bits.bit_length() + 7) // 8, "little")):
+            while byte:
+                lowest_bit = byte & -byte
+                yield (byte_index << 3) + lowest_bit.bit_length() - 1
+                byte ^= lowest_bit
+
+
+def new_bitmap(values: Iterable[int] = ()):
+    """
+    :param values: The integers of the bitmap \n
+    :return: A compressed bitmap - a plain bitset without pyroaring
+    """
+    return BitMap(values) if BitMap is not None else IntBitMap(values)
+
+
+class InvertedIndex:
+    """
+    The posting lists of the tags and of the owners - bitmaps of integer surrogate post ids \n
+    A post gets its surrogate when it is indexed - in the creation order while the index is built. The posts
+    written through this worker are indexed at once, those written through the other workers at the next sync.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.is_ready = False
+        self._reset()
+
+    def _reset(self):
+        self._surrogates: dict[UUID, int] = {}
+        # By surrogate: (post id, created_on), None once the post is deleted
+        self._posts: list[tuple[UUID, _datetime.datetime] | None] = []
+        self._posts_owners: dict[int, int] = {}
+        self._posts_tags: dict[int, frozenset[UUID]] = {}
+        self._tags: dict[UUID, object] = {}
+        self._owners: dict[int, object] = {}
+        self._synced_on: _datetime.datetime | None = None
+        self._sync_checked_on = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"ready": self.is_ready, "posts": len(self._posts_owners), "tags": len(self._tags),
+                    "owners": len(self._owners), "bitmap": "roaring" if BitMap is not None else "bitset"}
+
+    def build(self, db: _orm.Session):
+        """
+        Builds the index - streams the posts, then the links of the posts and the tags \n
+        :param db: A database session
+        """
+        synced_on = _datetime.datetime.now()
+        posts, surrogates, posts_owners = [], {}, {}
+        owners_surrogates: dict[int, list[int]] = {}
+        rows = db.execute(
+            _sql.select(_models.Post.id, _models.Post.owner_id, _models.Post.created_on)
+            .order_by(_models.Post.created_on, _models.Post.id)
+            .execution_options(yield_per=INVERTED_INDEX_BUILD_CHUNK_SIZE)
+        )
+        for row in rows:
+            surrogate = len(posts)
+            posts.append((row.id, row.created_on))
+            surrogates[row.id] = surrogate
+            posts_owners[surrogate] = row.owner_id
+            owners_surrogates.setdefault(row.owner_id, []).append(surrogate)
+
+        posts_tags: dict[int, set[UUID]] = {}
+        tags_surrogates: dict[UUID, list[int]] = {}
+        linker = _database.post_tag_linker
+        rows = db.execute(
+            _sql.select(linker.c.post_id, linker.c.tag_id)
+            .execution_options(yield_per=INVERTED_INDEX_BUILD_CHUNK_SIZE)
+        )
+        for row in rows:
+            # The links of the deleted posts are purged with them
+            surrogate = surrogates.get(row.post_id)
+            if surrogate is not None:
+                posts_tags.setdefault(surrogate, set()).add(row.tag_id)
+                tags_surrogates.setdefault(row.tag_id, []).append(surrogate)
+
+        with self._lock:
+            self._reset()
+            self._surrogates, self._posts, self._posts_owners = surrogates, posts, posts_owners
+            self._posts_tags = {surrogate: frozenset(tags_ids) for surrogate, tags_ids in posts_tags.items()}
+            self._tags = {tag_id: new_bitmap(values) for tag_id, values in tags_surrogates.items()}
+            self._owners = {owner_id: new_bitmap(values) for owner_id, values in owners_surrogates.items()}
+            self._synced_on = synced_on
+            self.is_ready = True
+        logger.info("Inverted index built: %s", self.stats())
+
+    def index_post(self, post_id: UUID, owner_id: int, created_on: _datetime.datetime, tags_ids: Iterable[UUID]):
+        """
+        Adds a post to the index - or updates its tags \n
+        :param post_id: The post id \n
+        :param owner_id: The post's owner id \n
+        :param created_on: The post's creation datetime \n
+        :param tags_ids: The ids of the post's tags
+        """
+        tags_ids = frozenset(tags_ids)
+        with self._lock:
+            if not self.is_ready:
+                return
+
+            surrogate = self._surrogates.get(post_id)
+            if surrogate is None:
+                surrogate = len(self._posts)
+                self._posts.append((post_id, created_on))
+                self._surrogates[post_id] = surrogate
+                self._posts_owners[surrogate] = owner_id
+                self._owners.setdefault(owner_id, new_bitmap()).add(surrogate)
+
+            previous_tags_ids = self._posts_tags.get(surrogate, frozenset())
+            for tag_id in previous_tags_ids - tags_ids:
+                self._tags[tag_id].discard(surrogate)
+            for tag_id in tags_ids - previous_tags_ids:
+                self._tags.setdefault(tag_id, new_bitmap()).add(surrogate)
+            self._posts_tags[surrogate] = tags_ids
+
+    def remove_post(self, post_id: UUID):
+        """
+        Removes a - deleted - post from the index \n
+        :param post_id: The post id
+        """
+        with self._lock:
+            surrogate = self._surrogates.pop(post_id, None)
+            if surrogate is None:
+                return
+
+            self._posts[surrogate] = None
+            self._owners[self._posts_owners.pop(surrogate)].discard(surrogate)
+            for tag_id in self._posts_tags.pop(surrogate, frozenset()):
+                self._tags[tag_id].discard(surrogate)
+
+    def remove_tag(self, tag_id: UUID):
+        """
+        Removes a - deleted - tag from the index \n
+        :param tag_id: The tag id
+        """
+        with self._lock:
+            bitmap = self._tags.pop(tag_id, None)
+            for surrogate in bitmap or ():
+                self._posts_tags[surrogate] = self._posts_tags[surrogate] - {tag_id}
+
+    def sync(self, db: _orm.Session):
+        """
+        Indexes the posts written through the other workers since the last sync - at most every
+        INVERTED_INDEX_SYNC_INTERVAL_SECONDS seconds \n
+        :param db: A database session
+        """
+        with self._lock:
+            if not self.is_ready or time.monotonic() - self._sync_checked_on < INVERTED_INDEX_SYNC_INTERVAL_SECONDS:
+                return
+            self._sync_checked_on = time.monotonic()
+            since = self._synced_on - _datetime.timedelta(seconds=INVERTED_INDEX_SYNC_OVERLAP_SECONDS)
+
+        synced_on = _datetime.datetime.now()
+        # A post's tags only change with its caption or its tags - its update datetime changes then
+        rows = db.execute(
+            _sql.select(_models.Post.id, _models.Post.owner_id, _models.Post.created_on, _models.Post.deleted_on)
+            .where(_sql.or_(_models.Post.updated_on >= since, _models.Post.deleted_on >= since))
+            .execution_options(**{INCLUDE_DELETED_POSTS_OPTION: True})
+        ).all()
+
+        tags_ids_by_post = {row.id: [] for row in rows if row.deleted_on is None}
+        if tags_ids_by_post:
+            linker = _database.post_tag_linker
+            for post_id, tag_id in db.execute(
+                    _sql.select(linker.c.post_id, linker.c.tag_id).where(linker.c.post_id.in_(tags_ids_by_post))):
+                tags_ids_by_post[post_id].append(tag_id)
+
+        for row in rows:
+            if row.deleted_on is not None:
+                self.remove_post(post_id=row.id)
+            else:
+                self.index_post(post_id=row.id, owner_id=row.owner_id, created_on=row.created_on,
+                                tags_ids=tags_ids_by_post[row.id])
+
+        with self._lock:
+            self._synced_on = synced_on
+
+    def page(self, tags_ids: list[UUID], owners_ids: list[int] | None, skip: int, limit: int,
+             latest: bool) -> list[UUID]:
+        """
+        Gets a page of the posts having all the given tags - and one of the given owners - by intersecting
+        their posting lists \n
+        :param tags_ids: The tags ids \n
+        :param owners_ids: If set, the [posts] owners ids \n
+        :param skip: Query param 'skip' \n
+        :param limit: Query param 'limit' \n
+        :param latest: If True, the latest posts first - the oldest first otherwise \n
+        :return: The posts ids
+        """
+        with self._lock:
+            # The smallest lists first - the intersections shrink faster
+            bitmaps = sorted((self._tags.get(tag_id, new_bitmap()) for tag_id in tags_ids), key=len)
+            if owners_ids is not None:
+                owners_bitmap = new_bitmap()
+                for owner_id in set(owners_ids):
+                    owners_bitmap = owners_bitmap | self._owners.get(owner_id, new_bitmap())
+                bitmaps.insert(0, owners_bitmap)
+
+            matches = bitmaps[0]
+            for bitmap in bitmaps[1:]:
+                if not matches:
+                    break
+                matches = matches & bitmap
+
+            if latest:
+                surrogates = heapq.nlargest(skip + limit, matches, key=lambda surrogate: self._posts[surrogate][1])
+                surrogates = surrogates[skip:]
+            else:
+                surrogates = list(itertools.islice(matches, skip, skip + limit))
+            return [self._posts[surrogate][0] for surrogate in surrogates]
+
+
+inverted_index = InvertedIndex()
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import AsyncIterator
+
+from dotenv import load_dotenv
+
+import project.src.app.services.changes as _changes_service
+import project.src.config.db.database as _database
+from project.src.app.app_enums.changeActionEnum import ChangeActionEnum
+from project.src.app.app_enums.changeObjectTypeEnum import ChangeObjectTypeEnum
+
+load_dotenv()
+# A subscriber gets at most one likes count per post per interval - the latest one
+LIKES_STREAM_INTERVAL_SECONDS = float(os.getenv("LIKES_STREAM_INTERVAL_SECONDS", "1"))
+# A comment is sent when nothing changed for a while - the proxies keep the connection open
+LIKES_STREAM_HEARTBEAT_SECONDS = float(os.getenv("LIKES_STREAM_HEARTBEAT_SECONDS", "15"))
+# The memory of a subscriber is bounded by its number of posts - one pending count each
+LIKES_STREAM_MAX_POSTS = int(os.getenv("LIKES_STREAM_MAX_POSTS", "100"))
+LIKES_STREAM_MAX_SUBSCRIBERS = int(os.getenv("LIKES_STREAM_MAX_SUBSCRIBERS", "1000"))
+# "local": the likes of the worker only - "change_log": the likes of all the workers, read from the change log
+LIKES_BROKER = os.getenv("LIKES_BROKER", "local").lower()
+LIKES_BROKER_POLL_INTERVAL_SECONDS = float(os.getenv("LIKES_BROKER_POLL_INTERVAL_SECONDS", "1"))
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """
+    The likes counts not sent yet to a client - the latest count of each post only
+    """
+
+    def __init__(self, posts_ids: set[uuid.UUID]):
+        self.posts_ids = posts_ids
+        self._pending: dict[uuid.UUID, int] = {}
+        self._sent: dict[uuid.UUID, int] = {}
+        self._has_pending = asyncio.Event()
+
+    def push(self, post_id: uuid.UUID, likes: int):
+        self._pending[post_id] = likes
+        self._has_pending.set()
+
+    async def pop(self, timeout: float) -> dict[uuid.UUID, int]:
+        """
+        Waits for the pending counts \n
+        :param timeout: The maximum time to wait \n
+        :return: The counts that changed since the last sent ones - empty after the timeout
+        """
+        try:
+            await asyncio.wait_for(self._has_pending.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return {}
+
+        pending, self._pending = self._pending, {}
+        self._has_pending.clear()
+        changed = {post_id: likes for post_id, likes in pending.items() if self._sent.get(post_id) != likes}
+        self._sent.update(changed)
+        return changed
+
+
+class LikesBroker:
+    """
+    The in-process pub/sub of the likes counts - the likes are published by the worker handling them, or by the relay
+    of the change log when relayed
+    """
+
+    def __init__(self, max_subscribers: int = LIKES_STREAM_MAX_SUBSCRIBERS,
+                 relayed: bool = LIKES_BROKER == "change_log"):
+        self.max_subscribers = max_subscribers
+        self.relayed = relayed
+        self._subscribers_by_post: dict[uuid.UUID, set[Subscriber]] = {}
+        self.subscribers_count = 0
+        self.published = 0
+
+    def is_full(self) -> bool:
+        return self.subscribers_count >= self.max_subscribers
+
+    def subscribe(self, posts_ids: set[uuid.UUID]) -> Subscriber:
+        """
+        Subscribes to the likes counts of some posts \n
+        :param posts_ids: The ids of the posts \n
+        :return: The subscriber - to unsubscribe at the end
+        """
+        subscriber = Subscriber(posts_ids=posts_ids)
+        for post_id in posts_ids:
+            self._subscribers_by_post.setdefault(post_id, set()).add(subscriber)
+        self.subscribers_count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        for post_id in subscriber.posts_ids:
+            subscribers = self._subscribers_by_post.get(post_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers_by_post[post_id]
+        self.subscribers_count -= 1
+
+    def publish(self, post_id: uuid.UUID, likes: int):
+        """
+        Publishes the new likes count of a post to its subscribers - from the event loop \n
+        :param post_id: The id of the post \n
+        :param likes: The likes count
+        """
+        self.published += 1
+        for subscriber in self._subscribers_by_post.get(post_id, ()):
+            subscriber.push(post_id=post_id, likes=likes)
+
+    def publish_handled(self, post_id: uuid.UUID, likes: int):
+        """
+        Publishes the like of a post handled by this worker - unless relayed: the relay publishes it, in the order of
+        the change log, so a count never follows a newer one \n
+        :param post_id: The id of the post \n
+        :param likes: The likes count
+        """
+        if not self.relayed:
+            self.publish(post_id=post_id, likes=likes)
+
+    def to_dict(self) -> dict:
+        return {"broker": LIKES_BROKER, "subscribers": self.subscribers_count,
+                "subscribed_posts": len(self._subscribers_by_post), "published": self.published}
+
+
+likes_broker = LikesBroker()
+
+
+async def relay_change_log_likes(broker: LikesBroker = likes_broker):
+    """
+    Publishes the likes of all the workers, read from the change log every LIKES_BROKER_POLL_INTERVAL_SECONDS
+    seconds - until cancelled \n
+    The likes logged before the worker started are skipped. \n
+    :param broker: The broker to publish to
+    """
+    def read_changes(after: int | None) -> tuple[list[tuple[uuid.UUID, int]], int]:
+        db = _database.SessionLocal()
+        try:
+            if after is None:
+                return [], _changes_service.get_last_change_seq(db=db)
+            page = _changes_service.query_changes(db=db, after=after, limit=_changes_service.CHANGES_LIMIT_MAX_NUMBER)
+        finally:
+            db.close()
+
+        likes = [(change.object_id, change.payload["likes"]) for change in page["changes"]
+                 if change.object_type == ChangeObjectTypeEnum.POST.value
+                 and change.action == ChangeActionEnum.LIKED.value]
+        return likes, page["next_after"]
+
+    after = None
+    while True:
+        try:
+            likes, after = await asyncio.to_thread(read_changes, after)
+            for post_id, post_likes in likes:
+                broker.publish(post_id=post_id, likes=post_likes)
+        except Exception:
+            logger.exception("The likes could not be read from the change log")
+
+        await asyncio.sleep(LIKES_BROKER_POLL_INTERVAL_SECONDS)
+
+
+def format_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode("utf-8")
+
+
+async def stream_likes(posts_ids: set[uuid.UUID], initial_likes: dict[uuid.UUID, int],
+                       broker: LikesBroker = likes_broker,
+                       interval_seconds: float = LIKES_STREAM_INTERVAL_SECONDS,
+                       heartbeat_seconds: float = LIKES_STREAM_HEARTBEAT_SECONDS) -> AsyncIterator[bytes]:
+    """
+    Streams the likes counts of some posts as server-sent events - one "likes" event per changed post, at most once
+    per interval - until the client disconnects \n
+    :param posts_ids: The ids of the followed posts - subscribed while the stream lasts \n
+    :param initial_likes: The current likes counts, sent first - a like published before the subscription is sent
+    with the next one \n
+    :param broker: The broker to subscribe to \n
+    :param interval_seconds: The minimum time between two events of a post \n
+    :param heartbeat_seconds: The time without event after which a comment is sent \n
+    :return: The events
+    """
+    subscriber = broker.subscribe(posts_ids=posts_ids)
+    try:
+        for post_id, likes in initial_likes.items():
+            subscriber.push(post_id=post_id, likes=likes)
+
+        while True:
+            changed = await subscriber.pop(timeout=heartbeat_seconds)
+            if not changed:
+                yield b": heartbeat\n\n"
+                continue
+
+            yield b"".join(format_event("likes", {"id": str(post_id), "likes": likes})
+                           for post_id, likes in changed.items())
+            # The counts published meanwhile are coalesced
+            await asyncio.sleep(interval_seconds)
+    finally:
+        broker.unsubscribe(subscriber)
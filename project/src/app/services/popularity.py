@@ -0,0 +1,142 @@
+import datetime as _datetime
+import math
+import os
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import project.src.app.services.sparse_fieldsets as _sparse_fieldsets_service
+import project.src.config.db.database as _database
+from project.src.app import models as _models
+
+load_dotenv()
+# A post needs 10 times more likes to rank as high as a post created HOT_SCORE_DECAY_SECONDS later
+HOT_SCORE_DECAY_SECONDS = float(os.getenv("HOT_SCORE_DECAY_SECONDS", "45000"))
+HOT_SCORE_EPOCH = _datetime.datetime(2023, 1, 1)
+RECOMPUTE_CHUNK_SIZE = int(os.getenv("HOT_SCORES_RECOMPUTE_CHUNK_SIZE", "1000"))
+
+
+def compute_hot_score(likes: int | None, created_on: _datetime.datetime) -> float:
+    """
+    Computes the popularity of a post \n
+    The age is part of the score - a newer post scores higher - so the stored scores never need to decay. \n
+    :param likes: The number of likes of the post \n
+    :param created_on: The post's creation datetime \n
+    :return: The score
+    """
+    age_score = (created_on - HOT_SCORE_EPOCH).total_seconds() / HOT_SCORE_DECAY_SECONDS
+    return round(math.log10(max(likes or 0, 1)) + age_score, 7)
+
+
+async def refresh_hot_score(db: _orm.Session, post_id: UUID, likes: int | None, created_on: _datetime.datetime):
+    """
+    Stores the score of a post - on the post and on its links to its tags, so both feeds are index scans \n
+    The changes are part of the session's transaction, the caller commits. \n
+    :param db: A database session \n
+    :param post_id: The post id \n
+    :param likes: The number of likes of the post \n
+    :param created_on: The post's creation datetime \n
+    :return: The score
+    """
+    hot_score = compute_hot_score(likes=likes, created_on=created_on)
+
+    db.execute(
+        _sql.update(_models.Post).where(_models.Post.id == post_id)
+        .values(hot_score=hot_score)
+    )
+    db.execute(
+        _sql.update(_database.post_tag_linker).where(_database.post_tag_linker.c.post_id == post_id)
+        .values(hot_score=hot_score)
+    )
+
+    return hot_score
+
+
+async def recompute_hot_scores(db: _orm.Session, chunk_size: int = RECOMPUTE_CHUNK_SIZE) -> int:
+    """
+    Recomputes the scores of all the posts, by chunks ordered by id - after a change of formula
+    or for the posts created before the scores existed \n
+    :param db: A database session \n
+    :param chunk_size: The number of posts processed - and committed - at once \n
+    :return: The number of posts processed
+    """
+    last_post_id = None
+    count = 0
+
+    while True:
+        query = _sql.select(_models.Post.id, _models.Post.likes, _models.Post.created_on) \
+            .order_by(_models.Post.id) \
+            .limit(chunk_size)
+        if last_post_id is not None:
+            query = query.where(_models.Post.id > last_post_id)
+
+        rows = db.execute(query).all()
+        if not rows:
+            break
+        last_post_id = rows[-1].id
+
+        for row in rows:
+            await refresh_hot_score(db=db, post_id=row.id, likes=row.likes, created_on=row.created_on)
+
+        db.commit()
+        count += len(rows)
+
+    return count
+
+
+async def get_popular_posts(db: _orm.Session, owners_ids: list[int] | None, tags_slug: list[str] | None,
+                            skip: int, limit: int, fields: tuple[str, ...] | None = None):
+    """
+    Gets the most popular posts \n
+    With tags, the posts are read from the first tag's links - indexed by (tag_id, hot_score). \n
+    Without, from the posts - indexed by hot_score and by (owner_id, hot_score). \n
+    :param db: A database session \n
+    :param owners_ids: The [posts] owners ids \n
+    :param tags_slug: The [posts] tags \n
+    :param skip: Query param 'skip' \n
+    :param limit: Query param 'limit' \n
+    :param fields: If set, only these fields of the posts are loaded \n
+    :return: A list of posts, the most popular first
+    """
+    query = get_popular_posts_query(db=db, owners_ids=owners_ids, tags_slug=tags_slug, fields=fields)
+    return [] if query is None else query.offset(skip).limit(limit).all()
+
+
+def get_popular_posts_query(db: _orm.Session, owners_ids: list[int] | None, tags_slug: list[str] | None,
+                            fields: tuple[str, ...] | None = None, streamed: bool = False) -> _orm.Query | None:
+    """
+    Gets the query of the most popular posts - see get_popular_posts \n
+    :param db: A database session \n
+    :param owners_ids: The [posts] owners ids \n
+    :param tags_slug: The [posts] tags \n
+    :param fields: If set, only these fields of the posts are loaded \n
+    :param streamed: If True, the query can be read from a server-side cursor \n
+    :return: The query, the most popular first - None when none of the tags exists
+    """
+    query = db.query(_models.Post).options(*_sparse_fieldsets_service.get_post_load_options(fields, streamed=streamed))
+
+    if owners_ids is not None:
+        query = query.filter(_models.Post.owner_id.in_(set(owners_ids)))
+
+    # As when the posts are not sorted, the unknown tags are ignored
+    tags_ids = [] if tags_slug is None else [
+        tag_id for (tag_id,) in
+        db.query(_models.Tag.id).filter(_models.Tag.slug.in_({slug.lower() for slug in tags_slug}))
+    ]
+    if tags_slug is not None and not tags_ids:
+        return None
+
+    if tags_ids:
+        linker = _database.post_tag_linker
+        query = query \
+            .join(linker, linker.c.post_id == _models.Post.id) \
+            .filter(linker.c.tag_id == tags_ids[0]) \
+            .order_by(linker.c.hot_score.desc(), _models.Post.id)
+        for tag_id in tags_ids[1:]:
+            query = query.filter(_models.Post.tags.any(_models.Tag.id == tag_id))
+    else:
+        query = query.order_by(_models.Post.hot_score.desc(), _models.Post.id)
+
+    return query
@@ -4,7 +4,7 @@ import shutil
 import uuid
 from http import HTTPStatus
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 from uuid import UUID
 
 import sqlalchemy as _sql
@@ -12,20 +12,40 @@ import sqlalchemy.orm as _orm
 from dotenv import load_dotenv
 from fastapi import UploadFile, HTTPException
 
+import project.src.app.services.changes as _changes_service
+import project.src.app.services.counters as _counters_service
+import project.src.app.services.export as _export_service
+import project.src.app.services.idempotency as _idempotency_service
+import project.src.app.services.image_processing as _image_processing_service
+import project.src.app.services.inverted_index as _inverted_index_service
+import project.src.app.services.live_likes as _live_likes_service
+import project.src.app.services.popularity as _popularity_service
+import project.src.app.services.search as _search_service
+import project.src.app.services.single_flight as _single_flight_service
+import project.src.app.services.sparse_fieldsets as _sparse_fieldsets_service
 import project.src.app.services.tag as _tag_service
+import project.src.app.services.timeline as _timeline_service
+import project.src.app.services.trending as _trending_service
+import project.src.app.services.upload as _upload_service
 from project.src.app import models as _models
 from project.src.app import schemas as _schemas
+from project.src.app.app_enums.changeActionEnum import ChangeActionEnum
+from project.src.app.app_enums.changeObjectTypeEnum import ChangeObjectTypeEnum
 from project.src.app.app_enums.likePostActionEnum import LikePostActionEnum
+from project.src.config.db import partitioning as _partitioning
 
 load_dotenv()
 SKIP_DEFAULT_NUMBER = 0
 LIMIT_DEFAULT_NUMBER = 100
 LATEST_DEFAULT_VALUE = False
+POPULAR_DEFAULT_VALUE = False
 
 
 async def get_posts(db: _orm.Session, owners_ids: list[int] | None, tags_slug: list[str] | None,
                     skip: int = SKIP_DEFAULT_NUMBER, limit: int = LIMIT_DEFAULT_NUMBER,
-                    latest: Optional[bool] = LATEST_DEFAULT_VALUE):
+                    latest: Optional[bool] = LATEST_DEFAULT_VALUE,
+                    popular: Optional[bool] = POPULAR_DEFAULT_VALUE,
+                    shared: bool = False, fields: tuple[str, ...] | None = None):
     """
     Gets all the posts \n
     :param owners_ids:
@@ -35,34 +55,92 @@ async def get_posts(db: _orm.Session, owners_ids: list[int] | None, tags_slug: l
     :param skip: Query param 'skip' \n
     :param limit: Query param 'limit' \n
     :param latest: Defines whether the request concerns the latest posts or not \n
+    :param popular: Defines whether the request concerns the most popular posts or not \n
+    :param shared: If True, the first page of the latest posts is shared with the identical concurrent calls -
+    read only \n
+    :param fields: If set, only these fields of the posts are loaded - see services.sparse_fieldsets \n
     :return: A list of posts
     """
+    if shared and latest is True and popular is not True and owners_ids is None and tags_slug is None and skip == 0:
+        return await _single_flight_service.single_flight.do(
+            _single_flight_service.get_flight_key(db, "latest_posts", limit, fields),
+            _query_latest_posts, db, limit, SKIP_DEFAULT_NUMBER, fields
+        )
+
+    if popular is True:
+        return await _popularity_service.get_popular_posts(db=db, owners_ids=owners_ids, tags_slug=tags_slug,
+                                                           skip=skip, limit=limit, fields=fields)
+
     if (owners_ids is not None) & (tags_slug is not None):
         return await get_posts_by_owners_and_tags(db=db, owners_ids=owners_ids,
-                                                  tags_slug=tags_slug, skip=skip, limit=limit, latest=latest)
+                                                  tags_slug=tags_slug, skip=skip, limit=limit, latest=latest,
+                                                  fields=fields)
     else:
         if owners_ids is not None:
             return await get_posts_by_owners(db=db, owners_ids=owners_ids,
-                                             skip=skip, limit=limit, latest=latest)
+                                             skip=skip, limit=limit, latest=latest, fields=fields)
         if tags_slug is not None:
             return await get_posts_by_tags(db=db, tags_slug=tags_slug,
-                                           skip=skip, limit=limit, latest=latest)
+                                           skip=skip, limit=limit, latest=latest, fields=fields)
 
     if latest is True:
-        return db.query(_models.Post) \
-            .options(_orm.joinedload(_models.Post.tags)) \
-            .order_by(_models.Post.created_on.desc()) \
-            .offset(skip).limit(limit).all()
+        return _query_latest_posts(db=db, limit=limit, skip=skip, fields=fields)
 
     return db.query(_models.Post) \
-        .options(_orm.joinedload(_models.Post.tags)) \
+        .options(*_sparse_fieldsets_service.get_post_load_options(fields)) \
         .offset(skip).limit(limit).all()
 
 
+async def iter_posts(db: _orm.Session, owners_ids: list[int] | None, tags_slug: list[str] | None,
+                     skip: int = SKIP_DEFAULT_NUMBER, limit: int = LIMIT_DEFAULT_NUMBER,
+                     latest: Optional[bool] = LATEST_DEFAULT_VALUE, popular: Optional[bool] = POPULAR_DEFAULT_VALUE,
+                     fields: tuple[str, ...] | None = None) -> Iterator[_models.Post]:
+    """
+    Gets a page of posts, to stream - see get_posts \n
+    A page read by a single query - all the posts, the latest or the most popular ones - is read from a server-side
+    cursor, LIST_STREAM_CHUNK_SIZE posts at a time, as it is sent. The pages merged in memory - filtered by tags,
+    timelines of owners - are read as by get_posts. \n
+    :param db: A database session \n
+    :param owners_ids: The [posts] owners ids \n
+    :param tags_slug: The [posts] tags \n
+    :param skip: Query param 'skip' \n
+    :param limit: Query param 'limit' \n
+    :param latest: Defines whether the request concerns the latest posts or not \n
+    :param popular: Defines whether the request concerns the most popular posts or not \n
+    :param fields: If set, only these fields of the posts are loaded \n
+    :return: The posts - read while iterated
+    """
+    query = None
+    if popular is True:
+        query = _popularity_service.get_popular_posts_query(db=db, owners_ids=owners_ids, tags_slug=tags_slug,
+                                                            fields=fields, streamed=True)
+        if query is None:
+            return iter([])
+    elif owners_ids is None and tags_slug is None and not (latest is True and _partitioning.POSTS_PARTITIONED):
+        query = db.query(_models.Post) \
+            .options(*_sparse_fieldsets_service.get_post_load_options(fields, streamed=True))
+        if latest is True:
+            query = query.order_by(_models.Post.created_on.desc())
+
+    if query is None:
+        return iter(await get_posts(db=db, owners_ids=owners_ids, tags_slug=tags_slug, skip=skip, limit=limit,
+                                    latest=latest, popular=popular, fields=fields))
+    return iter(query.offset(skip).limit(limit).yield_per(_export_service.LIST_STREAM_CHUNK_SIZE))
+
+
+def _query_latest_posts(db: _orm.Session, limit: int, skip: int = SKIP_DEFAULT_NUMBER,
+                        fields: tuple[str, ...] | None = None):
+    query = db.query(_models.Post) \
+        .options(*_sparse_fieldsets_service.get_post_load_options(fields)) \
+        .order_by(_models.Post.created_on.desc())
+    return _partitioning.fetch_latest_first(query=query, created_on=_models.Post.created_on, skip=skip, limit=limit)
+
+
 async def get_posts_by_owners_and_tags(db: _orm.Session, owners_ids: list[int],
                                        tags_slug: list[str], skip: int = SKIP_DEFAULT_NUMBER,
                                        limit: int = LIMIT_DEFAULT_NUMBER,
-                                       latest: Optional[bool] = LATEST_DEFAULT_VALUE):
+                                       latest: Optional[bool] = LATEST_DEFAULT_VALUE,
+                                       fields: tuple[str, ...] | None = None):
     """
     Gets all the posts owned by each listed owner and with all the specified tags \n
     :param latest:
@@ -71,29 +149,34 @@ async def get_posts_by_owners_and_tags(db: _orm.Session, owners_ids: list[int],
     :param tags_slug: The [posts] tags \n
     :param skip: Query param 'skip' \n
     :param limit: Query param 'limit' \n
+    :param fields: If set, only these fields of the owners' posts are loaded \n
     :return: A list of posts
     """
-    posts_by_tags = await get_posts_by_tags(db=db, tags_slug=tags_slug,
-                                            skip=skip, limit=limit, latest=latest)
-    posts_by_owners = await get_posts_by_owners(db=db, owners_ids=owners_ids,
-                                                skip=skip, limit=limit, latest=latest)
-
-    if len(posts_by_tags) < len(posts_by_owners):
-        posts = [p for p in posts_by_tags if p in posts_by_owners]
-    else:
-        posts = [p for p in posts_by_owners if p in posts_by_tags]
-
-    if latest is True:
-        posts.sort(key=lambda x: x.created_on, reverse=True)
-
-    new_posts = posts[skip:limit]
-
-    return new_posts
+    if _inverted_index_service.inverted_index.is_ready:
+        return await _get_indexed_posts(db=db, tags_slug=tags_slug, owners_ids=owners_ids, skip=skip, limit=limit,
+                                        latest=latest, fields=fields)
+
+    # As with the index, the unknown tags are ignored
+    tags_ids = [tag_id for (tag_id,) in db.execute(
+        _sql.select(_models.Tag.id).where(_models.Tag.slug.in_({slug.lower() for slug in tags_slug}))
+    )]
+    if not tags_ids:
+        return []
+
+    # The page is read by a single query - in the order of the index: the oldest first, unless latest
+    order_by = (_models.Post.created_on.desc(), _models.Post.id.desc()) if latest is True \
+        else (_models.Post.created_on, _models.Post.id)
+    return db.query(_models.Post) \
+        .options(*_sparse_fieldsets_service.get_post_load_options(fields)) \
+        .filter(_models.Post.owner_id.in_(set(owners_ids)),
+                *(_models.Post.tags.any(_models.Tag.id == tag_id) for tag_id in tags_ids)) \
+        .order_by(*order_by) \
+        .offset(skip).limit(limit).all()
 
 
 async def get_posts_by_tags(db: _orm.Session, tags_slug: list[str],
                             skip: Optional[int] = SKIP_DEFAULT_NUMBER, limit: Optional[int] = LIMIT_DEFAULT_NUMBER,
-                            latest: Optional[bool] = LATEST_DEFAULT_VALUE):
+                            latest: Optional[bool] = LATEST_DEFAULT_VALUE, fields: tuple[str, ...] | None = None):
     """
     Gets the posts having all the specified tags \n
     :param latest:
@@ -101,8 +184,13 @@ async def get_posts_by_tags(db: _orm.Session, tags_slug: list[str],
     :param skip:
     :param db: A database session \n
     :param tags_slug: A list of tag slug \n
+    :param fields: If set, only these fields of the posts are loaded - when the inverted index is used \n
     :return: A list of posts
     """
+    if _inverted_index_service.inverted_index.is_ready:
+        return await _get_indexed_posts(db=db, tags_slug=tags_slug, owners_ids=None, skip=skip, limit=limit,
+                                        latest=latest, fields=fields)
+
     posts = []
     for slug in tags_slug:
         tag = await _tag_service.get_tag_by_slug(db, slug)
@@ -114,14 +202,42 @@ async def get_posts_by_tags(db: _orm.Session, tags_slug: list[str],
     if latest is True:
         posts.sort(key=lambda x: x.created_on, reverse=True)
 
-    new_posts = posts[skip:limit]
+    new_posts = posts[skip:skip + limit]
 
     return new_posts
 
 
+async def _get_indexed_posts(db: _orm.Session, tags_slug: list[str], owners_ids: list[int] | None, skip: int,
+                             limit: int, latest: Optional[bool], fields: tuple[str, ...] | None):
+    """
+    Gets the posts having all the specified tags - and one of the specified owners - from the intersection of their
+    posting lists in the inverted index: only the page's posts are read from the database \n
+    :return: A list of posts
+    """
+    index = _inverted_index_service.inverted_index
+    index.sync(db=db)
+
+    # As without the index, the unknown tags are ignored
+    tags_ids = [tag_id for (tag_id,) in db.execute(
+        _sql.select(_models.Tag.id).where(_models.Tag.slug.in_({slug.lower() for slug in tags_slug}))
+    )]
+    if not tags_ids:
+        return []
+
+    posts_ids = index.page(tags_ids=tags_ids, owners_ids=owners_ids, skip=skip, limit=limit, latest=latest is True)
+    if not posts_ids:
+        return []
+
+    posts = db.query(_models.Post) \
+        .options(*_sparse_fieldsets_service.get_post_load_options(fields)) \
+        .filter(_models.Post.id.in_(posts_ids)).all()
+    positions = {post_id: position for position, post_id in enumerate(posts_ids)}
+    return sorted(posts, key=lambda post: positions[post.id])
+
+
 async def get_posts_by_owners(db: _orm.Session, owners_ids: list[int],
                               skip: Optional[int] = SKIP_DEFAULT_NUMBER, limit: Optional[int] = LIMIT_DEFAULT_NUMBER,
-                              latest: Optional[bool] = LATEST_DEFAULT_VALUE):
+                              latest: Optional[bool] = LATEST_DEFAULT_VALUE, fields: tuple[str, ...] | None = None):
     """
     Gets the posts having all the specified tags \n
     :param owners_ids:
@@ -129,25 +245,24 @@ async def get_posts_by_owners(db: _orm.Session, owners_ids: list[int],
     :param latest:
     :param limit:
     :param skip:
+    :param fields: If set, only these fields of the posts are loaded \n
     :return: A list of posts
     """
-    posts = []
-    owners_ids = set(owners_ids)
-    for owner_id in owners_ids:
-        posts_by_owner = await get_posts_by_owner(db=db, owner_id=owner_id, skip=skip,
-                                                  limit=limit, latest=latest)
-        posts += posts_by_owner
-
     if latest is True:
-        posts.sort(key=lambda x: x.created_on, reverse=True)
+        return await _timeline_service.get_timeline(db=db, owners_ids=owners_ids, skip=skip, limit=limit,
+                                                    fields=fields)
 
-    new_posts = posts[skip:limit]
-
-    return new_posts
+    # The page is read by a single query - the posts of each owner together, the oldest first
+    return db.query(_models.Post) \
+        .options(*_sparse_fieldsets_service.get_post_load_options(fields)) \
+        .filter(_models.Post.owner_id.in_(set(owners_ids))) \
+        .order_by(_models.Post.owner_id, _models.Post.created_on, _models.Post.id) \
+        .offset(skip).limit(limit).all()
 
 
 async def get_posts_by_owner(db: _orm.Session, owner_id: int, skip: int = SKIP_DEFAULT_NUMBER,
-                             limit: int = LIMIT_DEFAULT_NUMBER, latest: Optional[bool] = LATEST_DEFAULT_VALUE):
+                             limit: int = LIMIT_DEFAULT_NUMBER, latest: Optional[bool] = LATEST_DEFAULT_VALUE,
+                             fields: tuple[str, ...] | None = None):
     """
     Gets all the posts owned by the user [with user_id = owner_id] \n
     :param latest:
@@ -155,28 +270,78 @@ async def get_posts_by_owner(db: _orm.Session, owner_id: int, skip: int = SKIP_D
     :param owner_id: The [posts] owner id \n
     :param skip: Query param 'skip' \n
     :param limit: Query param 'limit' \n
+    :param fields: If set, only these fields of the posts are loaded \n
     :return: A list of posts
     """
     if latest is True:
-        return db.query(_models.Post) \
-            .options(_orm.joinedload(_models.Post.tags)) \
+        query = db.query(_models.Post) \
+            .options(*_sparse_fieldsets_service.get_post_load_options(fields)) \
             .filter(_models.Post.owner_id == owner_id) \
-            .order_by(_models.Post.created_on.desc()) \
-            .offset(skip).limit(limit).all()
+            .order_by(_models.Post.created_on.desc())
+        return _partitioning.fetch_latest_first(query=query, created_on=_models.Post.created_on, skip=skip,
+                                                limit=limit)
 
     return db.query(_models.Post) \
-        .options(_orm.joinedload(_models.Post.tags)) \
+        .options(*_sparse_fieldsets_service.get_post_load_options(fields)) \
         .filter(_models.Post.owner_id == owner_id) \
         .offset(skip).limit(limit).all()
 
 
-async def get_post_by_id(db: _orm.Session, post_id: UUID):
+async def get_post_by_id(db: _orm.Session, post_id: UUID, shared: bool = False):
     """
     Gets the post with id = post_id \n
     :param db: A database session \n
     :param post_id: The [wanted] post id \n
+    :param shared: If True, the post is shared with the identical concurrent calls - read only \n
     :return: A post
     """
+    if shared:
+        return await _single_flight_service.single_flight.do(
+            _single_flight_service.get_flight_key(db, "post", post_id),
+            _query_post_by_id, db, post_id
+        )
+
+    return _query_post_by_id(db=db, post_id=post_id)
+
+
+def get_post_version(post: _models.Post) -> tuple:
+    """
+    Gets the version of a post - it changes whenever the post's response changes \n
+    :param post: A post \n
+    :return: The version
+    """
+    return post.id, post.updated_on, post.likes
+
+
+async def query_post_version(db: _orm.Session, post_id: UUID) -> tuple | None:
+    """
+    Gets the version of a post - see get_post_version - reading only the version columns, by primary key \n
+    :param db: A database session \n
+    :param post_id: The post id \n
+    :return: The version, None if there is no such post
+    """
+    row = db.execute(
+        _sql.select(_models.Post.id, _models.Post.updated_on, _models.Post.likes)
+        .where(_models.Post.id == post_id)
+    ).first()
+    return None if row is None else tuple(row)
+
+
+async def get_posts_likes(db: _orm.Session, posts_ids: list[UUID]) -> dict[UUID, int]:
+    """
+    Gets the likes counts of some posts - only this column is read \n
+    :param db: A database session \n
+    :param posts_ids: The posts ids \n
+    :return: The likes count of each found post
+    """
+    return {
+        post_id: likes for post_id, likes in db.execute(
+            _sql.select(_models.Post.id, _models.Post.likes).where(_models.Post.id.in_(posts_ids))
+        )
+    }
+
+
+def _query_post_by_id(db: _orm.Session, post_id: UUID):
     return db.query(_models.Post) \
         .options(_orm.joinedload(_models.Post.tags)) \
         .filter(_models.Post.id == post_id).first()
@@ -200,45 +365,109 @@ async def save_upload_file(upload_file: UploadFile, destination: Path) -> None:
         upload_file.file.close()
 
 
-async def create_post(db: _orm.Session, post: _schemas.PostCreate, file: UploadFile):
+async def record_tags_links(db: _orm.Session, tags_ids: list[uuid.UUID], created_on: _datetime.datetime,
+                            delta: int = 1):
     """
-    Creates a post \n
-    :param file: \n
+    Keeps the tags counters - the hourly usages and the posts counts - in line with the links of a post \n
+    The changes are part of the session's transaction, the caller commits. \n
     :param db: A database session \n
-    :param post: All the needed data to create a post \n
-    :return: The created post
-    """
-    db_tags = []
-    # check if there are new tags - if so, create them 
-    if post.tags:
-        db_tags = await _tag_service.create_tag_from_post(db=db, tags=post.tags)
-
-    db_post = _models.Post(
-        image="",
-        caption=post.caption,
-        published=post.published,
-        owner_id=post.owner_id,
-        tags=db_tags
-    )
-    now_datetime = _datetime.datetime.now()
-    db_post.published_on = now_datetime if post.published else _schemas.DEFAULT_DATETIME
-    db_post.created_on = now_datetime
-    db_post.updated_on = now_datetime
-
-    db.add(db_post)
-    db.commit()
+    :param tags_ids: The ids of the tags linked to - or unlinked from - the post \n
+    :param created_on: The post's creation datetime \n
+    :param delta: 1 when the tags are linked to the post, -1 when they are unlinked
+    """
+    await _trending_service.record_tags_usage(db=db, usages=[(tag_id, created_on) for tag_id in tags_ids],
+                                              delta=delta)
+    await _counters_service.adjust_tags_posts_counts(db=db, tags_ids=tags_ids, delta=delta)
 
-    post_id = db_post.id
-    destination = f"{os.getenv('IMAGES_DIRECTORY_NAME')}/{post_id}_{file.filename}"
 
-    await save_upload_file(upload_file=file, destination=Path(destination))
+async def create_post(db: _orm.Session, post: _schemas.PostCreate, file: UploadFile | None = None,
+                      idempotency_claim: _idempotency_service.IdempotencyClaim | None = None,
+                      db_upload: _models.Upload | None = None):
+    """
+    Creates a post - with an uploaded file or a finalized resumable upload \n
+    The image is placed and processed before the post is written - the transaction only holds the inserts, the
+    counters and the commit. A post not created leaves no image, and its upload can be used again. \n
+    :param file: \n
+    :param db: A database session \n
+    :param post: All the needed data to create a post \n
+    :param idempotency_claim: The claim of the client's key - it gets the post in the transaction creating it, see
+    services.idempotency \n
+    :param db_upload: A finalized upload - its file is moved, instead of the file being copied \n
+    :return: The created post, None if the upload was used by another post meanwhile
+    :raise IdempotencyKeyLostError: If a retry took the client's key over - the post is not created
+    """
+    if db_upload is not None:
+        # Only one post moves the upload's file - its use is committed first, and released if the post fails
+        if not _upload_service.consume_upload(db=db, db_upload=db_upload):
+            db.rollback()
+            return None
+        db.commit()
+
+    post_id = uuid.uuid4()
+    filename = file.filename if db_upload is None else db_upload.filename
+    destination = f"{os.getenv('IMAGES_DIRECTORY_NAME')}/{post_id}_{filename}"
+    try:
+        if db_upload is None:
+            await save_upload_file(upload_file=file, destination=Path(destination))
+        else:
+            _upload_service.move_upload_file(db_upload=db_upload, destination=Path(destination))
+        image_metadata = await _image_processing_service.extract_image_metadata(path=destination)
+        # The transaction locks the key - it is not renewed meanwhile
+        if idempotency_claim is not None:
+            await idempotency_claim.stop_renewal()
+
+        if _partitioning.POSTS_PARTITIONED:
+            _partitioning.posts_partitions_keeper.ensure(bind=db.get_bind())
+
+        # The caption's hashtags are tags too - create the missing ones
+        db_tags = await _tag_service.create_tag_from_post(
+            db=db,
+            tags=_tag_service.merge_tags(tags=post.tags, caption=post.caption)
+        )
+
+        db_post = _models.Post(
+            id=post_id,
+            image=destination,
+            caption=post.caption,
+            published=post.published,
+            owner_id=post.owner_id,
+            tags=db_tags,
+            **image_metadata
+        )
+        now_datetime = _datetime.datetime.now()
+        db_post.published_on = now_datetime if post.published else _schemas.DEFAULT_DATETIME
+        db_post.created_on = now_datetime
+        db_post.updated_on = now_datetime
+
+        db.add(db_post)
+        db.flush()
+        await record_tags_links(db=db, tags_ids=[db_tag.id for db_tag in db_tags], created_on=now_datetime)
+        await _counters_service.adjust_owner_posts_count(db=db, owner_id=post.owner_id, delta=1)
+        await _search_service.index_post_caption(db=db, post_id=post_id, caption=post.caption)
+        await _popularity_service.refresh_hot_score(db=db, post_id=post_id, likes=0, created_on=now_datetime)
+        _changes_service.record_change(db=db, object_type=ChangeObjectTypeEnum.POST, object_id=post_id,
+                                       action=ChangeActionEnum.CREATED)
+        # The key gets the post in the transaction creating it - unless a retry took it over
+        if idempotency_claim is not None and not _idempotency_service.idempotency_store.complete(
+                db=db, claim=idempotency_claim, post_id=post_id):
+            raise _idempotency_service.IdempotencyKeyLostError(idempotency_claim.key)
+        db.commit()
+    except Exception:
+        # Neither the post nor its image are kept - its upload can be used again
+        db.rollback()
+        if db_upload is None:
+            Path(destination).unlink(missing_ok=True)
+        else:
+            _upload_service.restore_upload_file(db_upload=db_upload, source=Path(destination))
+            _upload_service.release_upload(db=db, db_upload=db_upload)
+        raise
 
-    db.execute(
-        _sql.update(_models.Post).where(_models.Post.id == post_id)
-        .values(image=destination)
-    )
-    db.commit()
     db.refresh(db_post)
+    _timeline_service.timeline_engine.on_post_created(owner_id=db_post.owner_id, post_id=post_id,
+                                                      created_on=now_datetime)
+    _inverted_index_service.inverted_index.index_post(post_id=post_id, owner_id=db_post.owner_id,
+                                                      created_on=now_datetime,
+                                                      tags_ids=[db_tag.id for db_tag in db_tags])
 
     return db_post
 
@@ -251,12 +480,18 @@ async def like_unlike_post(db: _orm.Session, post_id: uuid.UUID, like_action: Li
     :param post_id: The id of the post to publish \n
     :return: The updated post
     """
-    db.execute(
+    db_post = db.execute(
         _sql.update(_models.Post).where(_models.Post.id == post_id)
         .values(likes=_models.Post.likes + 1 if (like_action.value == LikePostActionEnum.LIKE.value) else _models.Post.likes - 1)
-    )
+        .returning(_models.Post.likes, _models.Post.created_on)
+    ).one()
+    await _popularity_service.refresh_hot_score(db=db, post_id=post_id, likes=db_post.likes,
+                                                created_on=db_post.created_on)
+    _changes_service.record_change(db=db, object_type=ChangeObjectTypeEnum.POST, object_id=post_id,
+                                   action=ChangeActionEnum.LIKED, payload={"likes": db_post.likes})
 
     db.commit()
+    _live_likes_service.likes_broker.publish_handled(post_id=post_id, likes=db_post.likes)
     return await get_post_by_id(db=db, post_id=post_id)
 
 
@@ -270,16 +505,32 @@ async def update_post(db: _orm.Session, post_id: uuid.UUID, upd_post: _schemas.P
     """
     now_datetime = _datetime.datetime.now()
     db_post = await get_post_by_id(db=db, post_id=post_id)
+    previous_tags_ids = {db_tag.id for db_tag in db_post.tags}
     has_been_updated = False
 
     if upd_post.caption is not None:
         db_post.caption = upd_post.caption
+        await _search_service.index_post_caption(db=db, post_id=post_id, caption=upd_post.caption)
         has_been_updated = True
 
     if upd_post.tags is not None:
-        db_tags = await _tag_service.create_tag_from_post(db=db, tags=upd_post.tags)
-        db_post.tags = [] if db_tags is None else db_tags
+        tags = _tag_service.merge_tags(tags=upd_post.tags, caption=db_post.caption)
+        db_post.tags = await _tag_service.create_tag_from_post(db=db, tags=tags)
         has_been_updated = True
+    elif upd_post.caption is not None:
+        # The post keeps its tags and gets the new caption's hashtags
+        tags = _tag_service.merge_tags(tags=db_post.tags, caption=upd_post.caption)
+        db_post.tags = await _tag_service.create_tag_from_post(db=db, tags=tags)
+
+    tags_ids = {db_tag.id for db_tag in db_post.tags}
+    await record_tags_links(db=db, tags_ids=list(tags_ids - previous_tags_ids), created_on=db_post.created_on)
+    await record_tags_links(db=db, tags_ids=list(previous_tags_ids - tags_ids), created_on=db_post.created_on,
+                            delta=-1)
+
+    # The new links to the tags need the post's score - they are inserted first, the session does not autoflush
+    db.flush()
+    await _popularity_service.refresh_hot_score(db=db, post_id=post_id, likes=db_post.likes,
+                                                created_on=db_post.created_on)
 
     if db_post.published is False & upd_post.published:
         if upd_post.published is True:
@@ -291,19 +542,33 @@ async def update_post(db: _orm.Session, post_id: uuid.UUID, upd_post: _schemas.P
         _sql.update(_models.Post).where(_models.Post.id == post_id)
         .values(updated_on=_models.Post.updated_on if has_been_updated is False else now_datetime)
     )
+    if has_been_updated:
+        _changes_service.record_change(db=db, object_type=ChangeObjectTypeEnum.POST, object_id=post_id,
+                                       action=ChangeActionEnum.UPDATED)
 
     db.commit()
+    _inverted_index_service.inverted_index.index_post(post_id=post_id, owner_id=db_post.owner_id,
+                                                      created_on=db_post.created_on, tags_ids=tags_ids)
     return await get_post_by_id(db=db, post_id=post_id)
 
 
 async def delete_post(db: _orm.Session, post_id: uuid.UUID):
     """
-    Deletes - puts the 'visible' attribute to false - a post \n
+    Deletes - sets the 'deleted_on' attribute of - a post \n
+    The post is hidden at once, the row and the image are purged later by the garbage collector. \n
     :param db: A database session \n
     :param post_id: The post id to delete \n
     :return: True if deleted
     """
     db_post = await get_post_by_id(db=db, post_id=post_id)
-    db.delete(db_post)
+    await _search_service.remove_post_caption(db=db, post_id=post_id)
+    await record_tags_links(db=db, tags_ids=[db_tag.id for db_tag in db_post.tags], created_on=db_post.created_on,
+                            delta=-1)
+    await _counters_service.adjust_owner_posts_count(db=db, owner_id=db_post.owner_id, delta=-1)
+    db_post.deleted_on = _datetime.datetime.now()
+    _changes_service.record_change(db=db, object_type=ChangeObjectTypeEnum.POST, object_id=post_id,
+                                   action=ChangeActionEnum.DELETED)
     db.commit()
+    _timeline_service.timeline_engine.on_post_deleted(owner_id=db_post.owner_id, post_id=post_id)
+    _inverted_index_service.inverted_index.remove_post(post_id=post_id)
     return True
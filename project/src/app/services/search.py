@@ -0,0 +1,141 @@
+import re
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+
+import project.src.app.services.sparse_fieldsets as _sparse_fieldsets_service
+from project.src.app import models as _models
+
+SKIP_DEFAULT_NUMBER = 0
+LIMIT_DEFAULT_NUMBER = 100
+
+# Postgres: the text search configuration of the generated "posts.caption_search" tsvector column
+CAPTION_SEARCH_CONFIGURATION = "simple"
+# SQLite: the FTS5 virtual table indexing the posts captions
+CAPTION_SEARCH_SQLITE_TABLE_NAME = "posts_caption_search"
+
+POSTGRES_CAPTION_SEARCH_DDL = [
+    f"ALTER TABLE posts ADD COLUMN IF NOT EXISTS caption_search tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{CAPTION_SEARCH_CONFIGURATION}', coalesce(caption, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_posts_caption_search ON posts USING GIN (caption_search)",
+]
+SQLITE_CAPTION_SEARCH_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {CAPTION_SEARCH_SQLITE_TABLE_NAME} USING fts5(post_id UNINDEXED, caption)",
+]
+
+_caption_search_sqlite_table = _sql.table(
+    CAPTION_SEARCH_SQLITE_TABLE_NAME,
+    _sql.column("post_id", _sql.Uuid),
+    _sql.column("caption", _sql.Text),
+    _sql.column("rank"),
+)
+_SEARCH_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def get_caption_search_ddl(dialect_name: str) -> list[str]:
+    """
+    Gets the statements creating the captions full-text index \n
+    :param dialect_name: The database dialect name \n
+    :return: A list of idempotent DDL statements
+    """
+    match dialect_name:
+        case "postgresql":
+            return POSTGRES_CAPTION_SEARCH_DDL
+        case "sqlite":
+            return SQLITE_CAPTION_SEARCH_DDL
+    return []
+
+
+def _is_sqlite(db: _orm.Session) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def _to_fts5_query(query: str) -> str:
+    """
+    Turns a user query into a FTS5 query matching all its words - FTS5 operators are not exposed to users
+    """
+    return " ".join(f'"{term}"' for term in _SEARCH_TERM_PATTERN.findall(query))
+
+
+async def index_post_caption(db: _orm.Session, post_id: UUID, caption: str | None):
+    """
+    Indexes - or re-indexes - the caption of a post \n
+    Postgres keeps its generated tsvector column up to date by itself, only SQLite needs it. \n
+    :param db: A database session \n
+    :param post_id: The post id \n
+    :param caption: The post's caption
+    """
+    if not _is_sqlite(db):
+        return
+
+    await remove_post_caption(db=db, post_id=post_id)
+    if caption:
+        db.execute(
+            _sql.insert(_caption_search_sqlite_table)
+            .values(post_id=post_id, caption=caption)
+        )
+
+
+async def remove_post_caption(db: _orm.Session, post_id: UUID):
+    """
+    Removes a post's caption from the index \n
+    :param db: A database session \n
+    :param post_id: The post id
+    """
+    if not _is_sqlite(db):
+        return
+
+    db.execute(
+        _sql.delete(_caption_search_sqlite_table)
+        .where(_caption_search_sqlite_table.c.post_id == post_id)
+    )
+
+
+async def search_posts(db: _orm.Session, query: str, owners_ids: list[int] | None = None,
+                       tags_slug: list[str] | None = None, skip: int = SKIP_DEFAULT_NUMBER,
+                       limit: int = LIMIT_DEFAULT_NUMBER, fields: tuple[str, ...] | None = None):
+    """
+    Searches the posts by caption, the best matches first \n
+    :param db: A database session \n
+    :param query: The words to search in the captions \n
+    :param owners_ids: If set, only the posts of these owners are searched \n
+    :param tags_slug: If set, only the posts having all these tags are searched \n
+    :param skip: Query param 'skip' \n
+    :param limit: Query param 'limit' \n
+    :param fields: If set, only these fields of the posts are loaded \n
+    :return: A list of posts
+    """
+    db_query = db.query(_models.Post.id)
+
+    if _is_sqlite(db):
+        fts_query = _to_fts5_query(query)
+        if not fts_query:
+            return []
+        db_query = db_query \
+            .join(_caption_search_sqlite_table, _caption_search_sqlite_table.c.post_id == _models.Post.id) \
+            .filter(_sql.text(f"{CAPTION_SEARCH_SQLITE_TABLE_NAME} MATCH :fts_query").bindparams(fts_query=fts_query)) \
+            .order_by(_caption_search_sqlite_table.c.rank)
+    else:
+        caption_search = _sql.literal_column("posts.caption_search")
+        ts_query = _sql.func.websearch_to_tsquery(CAPTION_SEARCH_CONFIGURATION, query)
+        db_query = db_query \
+            .filter(caption_search.op("@@")(ts_query)) \
+            .order_by(_sql.func.ts_rank(caption_search, ts_query).desc())
+
+    if owners_ids is not None:
+        db_query = db_query.filter(_models.Post.owner_id.in_(set(owners_ids)))
+
+    for slug in tags_slug or []:
+        db_query = db_query.filter(_models.Post.tags.any(_models.Tag.slug == slug.lower()))
+
+    # Ranks the matching ids first, then loads only the page's posts with their tags
+    posts_ids = [row.id for row in db_query.order_by(_models.Post.created_on.desc()).offset(skip).limit(limit)]
+    if not posts_ids:
+        return []
+
+    posts = db.query(_models.Post) \
+        .options(*_sparse_fieldsets_service.get_post_load_options(fields)) \
+        .filter(_models.Post.id.in_(posts_ids)).all()
+    positions = {post_id: position for position, post_id in enumerate(posts_ids)}
+    return sorted(posts, key=lambda post: positions[post.id])
@@ -0,0 +1,52 @@
+import asyncio
+from typing import Any, Callable, Hashable
+
+import sqlalchemy.orm as _orm
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent reads: the first call runs the query - in a thread, so that the event loop
+    goes on - and the calls arriving while it runs wait for its result instead of running it again \n
+    The result is shared: it must be fully loaded - no lazy load after the query - and never modified.
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Runs a blocking function - unless a call with the same key runs already - and gets its result \n
+        :param key: The key of the call - e.g. the function name and its arguments \n
+        :param function: The function \n
+        :return: The result of the function
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.get_running_loop().create_task(asyncio.to_thread(function, *args, **kwargs))
+            self._flights[key] = flight
+            flight.add_done_callback(lambda _: self._forget(key, flight))
+
+        # A cancelled caller does not cancel the query of the others
+        return await asyncio.shield(flight)
+
+    def _forget(self, key: Hashable, flight: asyncio.Task):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+
+single_flight = SingleFlight()
+
+
+def get_flight_key(db: _orm.Session, *parts: Hashable) -> tuple:
+    """
+    Gets the key of a read - only the reads of the same database are coalesced, a replica's result never answers
+    a read of the primary \n
+    :param db: The database session of the caller \n
+    :param parts: The name and the arguments of the read \n
+    :return: The key
+    """
+    return id(db.get_bind()), *parts
@@ -0,0 +1,94 @@
+import sqlalchemy.orm as _orm
+
+from project.src.app import models as _models
+from project.src.app import schemas as _schemas
+
+# The fields a client can ask for - those of the responses
+POST_FIELDS = tuple(_schemas.Post.__fields__)
+TAG_FIELDS = tuple(_schemas.Tag.__fields__)
+# Always loaded - the services sort and merge the posts with them
+POST_REQUIRED_COLUMNS = ("id", "created_on")
+TAG_REQUIRED_COLUMNS = ("id",)
+
+
+def parse_fields(fields: str | None, allowed_fields: tuple[str, ...]) -> tuple[str, ...] | None:
+    """
+    Parses the 'fields' query param - e.g. "id,image,likes" \n
+    :param fields: The comma separated fields, None for all the fields \n
+    :param allowed_fields: The fields of the objects \n
+    :return: The fields, in the asked order - None for all the fields
+    :raise ValueError: If a field is unknown or if no field is given
+    """
+    if fields is None:
+        return None
+
+    parsed_fields = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown_fields = [field for field in parsed_fields if field not in allowed_fields]
+    if unknown_fields or not parsed_fields:
+        raise ValueError(unknown_fields)
+    return parsed_fields
+
+
+def get_post_load_options(fields: tuple[str, ...] | None, streamed: bool = False) -> list:
+    """
+    Gets the loader options of a posts query - only the columns of the asked fields are selected and the tags are
+    joined only when asked \n
+    :param fields: The asked fields, None for all the fields \n
+    :param streamed: If True, the tags are read per chunk of posts - a joined collection cannot be streamed \n
+    :return: The options
+    """
+    load_tags = _orm.selectinload(_models.Post.tags) if streamed else _orm.joinedload(_models.Post.tags)
+    if fields is None:
+        return [load_tags]
+
+    columns = dict.fromkeys([*POST_REQUIRED_COLUMNS, *(field for field in fields if field != "tags")])
+    options = [_orm.load_only(*(getattr(_models.Post, column) for column in columns))]
+    if "tags" in fields:
+        options.append(load_tags)
+    return options
+
+
+def get_tag_load_options(fields: tuple[str, ...] | None, streamed: bool = False) -> list:
+    """
+    Gets the loader options of a tags query - see get_post_load_options \n
+    :param fields: The asked fields, None for all the fields \n
+    :param streamed: If True, the posts - and their tags - are read per chunk of tags \n
+    :return: The options
+    """
+    if fields is None:
+        return [_orm.selectinload(_models.Tag.posts).selectinload(_models.Post.tags) if streamed
+                else _orm.joinedload(_models.Tag.posts)]
+
+    columns = dict.fromkeys([*TAG_REQUIRED_COLUMNS, *(field for field in fields if field != "posts")])
+    options = [_orm.load_only(*(getattr(_models.Tag, column) for column in columns))]
+    if "posts" in fields:
+        options.append(_orm.selectinload(_models.Tag.posts).selectinload(_models.Post.tags))
+    return options
+
+
+def serialize_post(post: _models.Post, fields: tuple[str, ...]) -> dict:
+    """
+    Serializes the asked fields of a post - the other columns may not be loaded \n
+    :param post: A post \n
+    :param fields: The asked fields \n
+    :return: The fields' values
+    """
+    return {
+        field: [_schemas.TagBase.from_orm(tag).dict() for tag in post.tags] if field == "tags"
+        else getattr(post, field)
+        for field in fields
+    }
+
+
+def serialize_tag(tag: _models.Tag, fields: tuple[str, ...]) -> dict:
+    """
+    Serializes the asked fields of a tag - see serialize_post \n
+    :param tag: A tag \n
+    :param fields: The asked fields \n
+    :return: The fields' values
+    """
+    return {
+        field: [_schemas.PostBase.from_orm(post).dict() for post in tag.posts] if field == "posts"
+        else getattr(tag, field)
+        for field in fields
+    }
@@ -1,52 +1,130 @@
 import datetime as _datetime
+import re
+from typing import Iterator
+
+import sqlalchemy as _sql
 import sqlalchemy.orm as _orm
 
+import project.src.app.services.changes as _changes_service
+import project.src.app.services.export as _export_service
+import project.src.app.services.inverted_index as _inverted_index_service
+import project.src.app.services.single_flight as _single_flight_service
+import project.src.app.services.sparse_fieldsets as _sparse_fieldsets_service
+import project.src.config.db.database as _database
 from project.src.app import models as _models
 from project.src.app import schemas as _schemas
+from project.src.app.app_enums.changeActionEnum import ChangeActionEnum
+from project.src.app.app_enums.changeObjectTypeEnum import ChangeObjectTypeEnum
+
+# A hashtag is a '#' followed by letters, digits or underscores - '#sunset', '#summer_2023'
+HASHTAG_PATTERN = re.compile(r"(?<![\w#])#(\w+)", re.UNICODE)
 
 
-async def get_tags(db: _orm.Session, skip: int = 0, limit: int = 100):
+async def get_tags(db: _orm.Session, skip: int = 0, limit: int = 100, fields: tuple[str, ...] | None = None):
     """
     Gets all the tags \n
     :param db: A database session \n
     :param skip: Query param 'skip' \n
     :param limit: Query param 'limit'
+    :param fields: If set, only these fields of the tags are loaded - see services.sparse_fieldsets \n
     :return: A list of tags
     """
     return db.query(_models.Tag) \
-        .options(_orm.joinedload(_models.Tag.posts)) \
+        .options(*_sparse_fieldsets_service.get_tag_load_options(fields)) \
         .offset(skip).limit(limit).all()
 
 
-async def search_tags(db: _orm.Session, characters: str, skip: int = 0, limit: int = 100):
+async def iter_tags(db: _orm.Session, skip: int = 0, limit: int = 100,
+                    fields: tuple[str, ...] | None = None) -> Iterator[_models.Tag]:
+    """
+    Gets a page of tags, to stream - read from a server-side cursor, LIST_STREAM_CHUNK_SIZE tags - and their posts -
+    at a time, as it is sent \n
+    :param db: A database session \n
+    :param skip: Query param 'skip' \n
+    :param limit: Query param 'limit' \n
+    :param fields: If set, only these fields of the tags are loaded \n
+    :return: The tags - read while iterated
+    """
+    return iter(db.query(_models.Tag)
+                .options(*_sparse_fieldsets_service.get_tag_load_options(fields, streamed=True))
+                .offset(skip).limit(limit).yield_per(_export_service.LIST_STREAM_CHUNK_SIZE))
+
+
+async def search_tags(db: _orm.Session, characters: str, skip: int = 0, limit: int = 100,
+                      fields: tuple[str, ...] | None = None):
     """
     Gets all the tags with names containing the given characters \n
     :param db: A database session \n
     :param characters: Characters to search in tag name \n
     :param skip: Query param 'skip' \n
     :param limit: Query param 'limit'
+    :param fields: If set, only these fields of the tags are loaded \n
     :return: A list of tags
     """
     characters = characters.lower()
     return db.query(_models.Tag) \
-        .options(_orm.joinedload(_models.Tag.posts)) \
+        .options(*_sparse_fieldsets_service.get_tag_load_options(fields)) \
         .where(_models.Tag.slug.contains(characters)) \
         .offset(skip).limit(limit).all()
 
 
-async def get_tag_by_slug(db: _orm.Session, tag_slug: str):
+async def get_tag_by_slug(db: _orm.Session, tag_slug: str, shared: bool = False):
     """
     Gets a tag \n
     :param db: A database session \n
     :param tag_slug: The slug of the [wanted] tag \n
+    :param shared: If True, the tag - and its posts with their tags - is shared with the identical concurrent
+    calls - read only \n
     :return: The found tag
     """
     tag_slug = tag_slug.lower()
+    if shared:
+        return await _single_flight_service.single_flight.do(
+            _single_flight_service.get_flight_key(db, "tag", tag_slug),
+            _query_tag_with_posts_tags, db, tag_slug
+        )
+
     return db.query(_models.Tag) \
         .options(_orm.joinedload(_models.Tag.posts)) \
         .filter(_models.Tag.slug == tag_slug).first()
 
 
+def get_tag_version(tag: _models.Tag) -> tuple:
+    """
+    Gets the version of a tag - it changes whenever the tag's response changes: its posts are updated on every change \n
+    :param tag: A tag \n
+    :return: The version
+    """
+    return tag.id, tag.name, len(tag.posts), max((post.updated_on for post in tag.posts), default=None)
+
+
+async def query_tag_version(db: _orm.Session, tag_slug: str) -> tuple | None:
+    """
+    Gets the version of a tag - see get_tag_version - without loading its posts \n
+    :param db: A database session \n
+    :param tag_slug: The slug of the tag \n
+    :return: The version, None if there is no such tag
+    """
+    linker = _database.post_tag_linker
+    row = db.execute(
+        _sql.select(_models.Tag.id, _models.Tag.name, _sql.func.count(_models.Post.id),
+                    _sql.func.max(_models.Post.updated_on))
+        .outerjoin(linker, linker.c.tag_id == _models.Tag.id)
+        # The soft deleted posts are not hidden from the joins - only from the queries of posts
+        .outerjoin(_models.Post, _sql.and_(_models.Post.id == linker.c.post_id, _models.Post.deleted_on.is_(None)))
+        .where(_models.Tag.slug == tag_slug.lower())
+        .group_by(_models.Tag.id, _models.Tag.name)
+    ).first()
+    return None if row is None else tuple(row)
+
+
+def _query_tag_with_posts_tags(db: _orm.Session, tag_slug: str):
+    # Everything the response needs is loaded - the callers sharing it cannot load more
+    return db.query(_models.Tag) \
+        .options(_orm.selectinload(_models.Tag.posts).selectinload(_models.Post.tags)) \
+        .filter(_models.Tag.slug == tag_slug).first()
+
+
 async def create_tag(db: _orm.Session, tag: _schemas.TagCreate):
     """
     Creates a tag \n
@@ -61,28 +139,87 @@ async def create_tag(db: _orm.Session, tag: _schemas.TagCreate):
     db_tag.created_on = _datetime.datetime.now()
 
     db.add(db_tag)
+    db.flush()
+    _changes_service.record_change(db=db, object_type=ChangeObjectTypeEnum.TAG, object_id=db_tag.id,
+                                   action=ChangeActionEnum.CREATED)
     db.commit()
     db.refresh(db_tag)
     return db_tag
 
 
+def extract_hashtags(caption: str | None) -> list[str]:
+    """
+    Extracts the hashtags of a caption - the ones too short to be a tag, or reserved, are ignored \n
+    :param caption: A post's caption \n
+    :return: The hashtags names without the '#', once per slug and in order of appearance
+    """
+    if not caption:
+        return []
+
+    hashtags = {}
+    for name in HASHTAG_PATTERN.findall(caption):
+        if len(name) >= _schemas.TAG_MIN_LENGTH and name.lower() not in _schemas.RESERVED_TAG_SLUGS:
+            hashtags.setdefault(name.lower(), name)
+
+    return list(hashtags.values())
+
+
+def merge_tags(tags: list[_schemas.TagCreate], caption: str | None) -> list[_schemas.TagCreate]:
+    """
+    Merges the given tags and the hashtags of a caption \n
+    :param tags: The explicit tags \n
+    :param caption: A post's caption \n
+    :return: The tags, once per slug
+    """
+    merged_tags = {}
+    for tag in tags:
+        merged_tags.setdefault(tag.name.lower(), tag)
+    for hashtag in extract_hashtags(caption):
+        merged_tags.setdefault(hashtag.lower(), _schemas.TagCreate(name=hashtag))
+
+    return list(merged_tags.values())
+
+
 async def create_tag_from_post(db: _orm.Session, tags: list[_schemas.TagCreate]):
     """
-    Creates a tag while creating a post \n
+    Creates the missing tags while creating - or updating - a post \n
+    All the tags are looked up and inserted in a single batch. \n
     :param db: A database session \n
     :param tags: The list of tags \n
-    :return: True 
+    :return: The tags, in the given order
     """
-    rsl_tags = []
+    names_by_slug = {}
     for tag in tags:
-        db_tag = await get_tag_by_slug(db=db, tag_slug=tag.name.lower())
-        if db_tag is None:
-            rsl_tag = await create_tag(db=db, tag=tag)
-            rsl_tags.append(rsl_tag)
-        else:
-            rsl_tags.append(db_tag)
+        names_by_slug.setdefault(tag.name.lower(), tag.name)
+
+    if not names_by_slug:
+        return []
+
+    slugs = list(names_by_slug)
+    existing_slugs = {
+        slug for (slug,) in db.query(_models.Tag.slug).filter(_models.Tag.slug.in_(slugs))
+    }
+    missing_tags = [
+        {"name": names_by_slug[slug], "slug": slug, "created_on": _datetime.datetime.now()}
+        for slug in slugs if slug not in existing_slugs
+    ]
+    if missing_tags:
+        # Another request may create the same tags meanwhile - its tags are kept
+        db.execute(
+            _database.dialect_insert(db, _models.Tag)
+            .values(missing_tags)
+            .on_conflict_do_nothing()
+        )
 
-    return rsl_tags
+    db_tags = {
+        db_tag.slug: db_tag for db_tag in db.query(_models.Tag).filter(_models.Tag.slug.in_(slugs))
+    }
+    for missing_tag in missing_tags:
+        if missing_tag["slug"] in db_tags:
+            _changes_service.record_change(db=db, object_type=ChangeObjectTypeEnum.TAG,
+                                           object_id=db_tags[missing_tag["slug"]].id,
+                                           action=ChangeActionEnum.CREATED)
+    return [db_tags[slug] for slug in slugs if slug in db_tags]
 
 
 async def delete_tag_by_slug(db: _orm.Session, tag_slug: str):
@@ -95,8 +232,17 @@ async def delete_tag_by_slug(db: _orm.Session, tag_slug: str):
     try:
         tag_slug = tag_slug.lower()
         db_tag = await get_tag_by_slug(db=db, tag_slug=tag_slug)
+        # The tag's posts do not include the deleted ones, which are not purged yet - their links go first
+        linker = _database.post_tag_linker
+        db.execute(
+            _sql.delete(linker).where(
+                linker.c.tag_id == db_tag.id,
+                linker.c.post_id.in_(_sql.select(_models.Post.id).where(_models.Post.deleted_on.is_not(None)))
+            )
+        )
         db.delete(db_tag)
         db.commit()
+        _inverted_index_service.inverted_index.remove_tag(tag_id=db_tag.id)
         return True
     except (Exception, ):
         return False
@@ -0,0 +1,224 @@
+import bisect
+import datetime as _datetime
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import project.src.app.services.sparse_fieldsets as _sparse_fieldsets_service
+from project.src.app import models as _models
+from project.src.config.db import partitioning as _partitioning
+
+load_dotenv()
+# The number of latest posts ids kept per owner
+TIMELINE_RING_SIZE = int(os.getenv("TIMELINE_RING_SIZE", "200"))
+# The rings are reloaded after a while - the posts created through the other workers show up then
+TIMELINE_RING_TTL_SECONDS = float(os.getenv("TIMELINE_RING_TTL_SECONDS", "30"))
+# The number of owners whose ring is kept - the least recently used rings are dropped first
+TIMELINE_MAX_RINGS = int(os.getenv("TIMELINE_MAX_RINGS", "10000"))
+
+
+class OwnerRing:
+    """
+    The latest posts of an owner - (created_on, post id) pairs, the oldest first
+    """
+    __slots__ = ("entries", "complete", "loaded_on")
+
+    def __init__(self, entries: list[tuple[_datetime.datetime, UUID]], complete: bool):
+        self.entries = entries
+        # True when the ring holds all the posts of the owner
+        self.complete = complete
+        self.loaded_on = time.monotonic()
+
+
+class TimelineEngine:
+    """
+    Keeps the latest posts ids of each owner in memory and merges them into timelines \n
+    A page of a timeline over k owners is a lazy k-way merge of their rings: O((skip + limit) * log k). \n
+    At most max_rings rings are kept, the least recently used first in the dict - the expired ones are dropped too.
+    """
+
+    def __init__(self, ring_size: int = TIMELINE_RING_SIZE, ttl_seconds: float = TIMELINE_RING_TTL_SECONDS,
+                 max_rings: int = TIMELINE_MAX_RINGS):
+        self.ring_size = ring_size
+        self.ttl_seconds = ttl_seconds
+        self.max_rings = max_rings
+        self._rings: OrderedDict[int, OwnerRing] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, ring: OwnerRing | None) -> bool:
+        return ring is not None and time.monotonic() - ring.loaded_on < self.ttl_seconds
+
+    def _drop_stale_rings(self):
+        """
+        Drops the least recently used rings - while expired, or beyond max_rings - the caller holds the lock
+        """
+        while self._rings:
+            owner_id, ring = next(iter(self._rings.items()))
+            if len(self._rings) <= self.max_rings and self._is_fresh(ring):
+                return
+            del self._rings[owner_id]
+
+    @property
+    def rings_count(self) -> int:
+        return len(self._rings)
+
+    def set_ring(self, owner_id: int, entries: list[tuple[_datetime.datetime, UUID]], complete: bool):
+        """
+        Replaces the ring of an owner \n
+        :param owner_id: The owner id \n
+        :param entries: The (created_on, post id) pairs of the owner's latest posts \n
+        :param complete: True if these are all the owner's posts
+        """
+        entries = sorted(entries)
+        if len(entries) > self.ring_size:
+            entries = entries[-self.ring_size:]
+            complete = False
+
+        with self._lock:
+            self._rings[owner_id] = OwnerRing(entries=entries, complete=complete)
+            self._rings.move_to_end(owner_id)
+            self._drop_stale_rings()
+
+    def get_cold_owners(self, owners_ids: set[int]) -> set[int]:
+        """
+        Gets the owners whose ring is missing or expired \n
+        :param owners_ids: The owners ids \n
+        :return: The owners ids to load
+        """
+        with self._lock:
+            self._drop_stale_rings()
+            return {owner_id for owner_id in owners_ids if not self._is_fresh(self._rings.get(owner_id))}
+
+    def load_rings(self, db: _orm.Session, owners_ids: set[int]):
+        """
+        Loads the rings of the given owners from the database - in a single query \n
+        :param db: A database session \n
+        :param owners_ids: The owners ids
+        """
+        if not owners_ids:
+            return
+
+        rank = _sql.func.row_number().over(
+            partition_by=_models.Post.owner_id,
+            order_by=(_models.Post.created_on.desc(), _models.Post.id.desc())
+        ).label("rank")
+        ranked_posts = _sql.select(_models.Post.owner_id, _models.Post.id, _models.Post.created_on, rank) \
+            .where(_models.Post.owner_id.in_(owners_ids)) \
+            .subquery()
+        # One more post than the ring size tells whether the ring holds all the owner's posts
+        rows = db.execute(
+            _sql.select(ranked_posts.c.owner_id, ranked_posts.c.id, ranked_posts.c.created_on)
+            .where(ranked_posts.c.rank <= self.ring_size + 1)
+        ).all()
+
+        entries_by_owner = {owner_id: [] for owner_id in owners_ids}
+        for row in rows:
+            entries_by_owner[row.owner_id].append((row.created_on, row.id))
+
+        for owner_id, entries in entries_by_owner.items():
+            self.set_ring(owner_id=owner_id, entries=entries, complete=len(entries) <= self.ring_size)
+
+    def on_post_created(self, owner_id: int, post_id: UUID, created_on: _datetime.datetime):
+        """
+        Adds a new post to its owner's ring - if loaded \n
+        :param owner_id: The post's owner id \n
+        :param post_id: The post id \n
+        :param created_on: The post's creation datetime
+        """
+        with self._lock:
+            ring = self._rings.get(owner_id)
+            if ring is None:
+                return
+            bisect.insort(ring.entries, (created_on, post_id))
+            if len(ring.entries) > self.ring_size:
+                del ring.entries[0]
+                ring.complete = False
+
+    def on_post_deleted(self, owner_id: int, post_id: UUID):
+        """
+        Removes a post from its owner's ring - if loaded \n
+        :param owner_id: The post's owner id \n
+        :param post_id: The post id
+        """
+        with self._lock:
+            ring = self._rings.get(owner_id)
+            if ring is not None:
+                ring.entries = [entry for entry in ring.entries if entry[1] != post_id]
+
+    def page(self, owners_ids: set[int], skip: int, limit: int) -> list[UUID] | None:
+        """
+        Merges the rings of the owners into a page of their timeline, the latest posts first \n
+        :param owners_ids: The owners ids - their rings must be loaded \n
+        :param skip: Query param 'skip' \n
+        :param limit: Query param 'limit' \n
+        :return: The posts ids, or None when the page goes deeper than the rings
+        """
+        with self._lock:
+            rings = [self._rings[owner_id] for owner_id in owners_ids if owner_id in self._rings]
+            if len(rings) < len(owners_ids):
+                return None
+            for owner_id in owners_ids:
+                self._rings.move_to_end(owner_id)
+
+            if any(not ring.complete and not ring.entries for ring in rings):
+                return None
+            # The posts older than the oldest entry of a partial ring may be missing from the merge
+            boundary = max((ring.entries[0] for ring in rings if not ring.complete), default=None)
+            merged_entries = heapq.merge(*(reversed(ring.entries) for ring in rings), reverse=True)
+
+            posts_ids = []
+            for entry in itertools.islice(merged_entries, skip + limit):
+                if boundary is not None and entry < boundary:
+                    return None
+                posts_ids.append(entry[1])
+
+            # The rings ran out before the end of the page, the partial rings' owners have older posts
+            if boundary is not None and len(posts_ids) < skip + limit:
+                return None
+
+        return posts_ids[skip:]
+
+
+timeline_engine = TimelineEngine()
+
+
+async def get_timeline(db: _orm.Session, owners_ids: list[int], skip: int, limit: int,
+                       fields: tuple[str, ...] | None = None):
+    """
+    Gets the latest posts of the given owners \n
+    The page is merged from the in-memory rings, the database is queried when it goes deeper than the rings. \n
+    :param db: A database session \n
+    :param owners_ids: The [posts] owners ids \n
+    :param skip: Query param 'skip' \n
+    :param limit: Query param 'limit' \n
+    :param fields: If set, only these fields of the posts are loaded \n
+    :return: A list of posts, the latest first
+    """
+    owners_ids = set(owners_ids)
+    timeline_engine.load_rings(db=db, owners_ids=timeline_engine.get_cold_owners(owners_ids))
+    posts_ids = timeline_engine.page(owners_ids=owners_ids, skip=skip, limit=limit)
+
+    if posts_ids is None:
+        query = db.query(_models.Post) \
+            .options(*_sparse_fieldsets_service.get_post_load_options(fields)) \
+            .filter(_models.Post.owner_id.in_(owners_ids)) \
+            .order_by(_models.Post.created_on.desc(), _models.Post.id.desc())
+        return _partitioning.fetch_latest_first(query=query, created_on=_models.Post.created_on, skip=skip,
+                                                limit=limit)
+
+    if not posts_ids:
+        return []
+
+    posts = db.query(_models.Post) \
+        .options(*_sparse_fieldsets_service.get_post_load_options(fields)) \
+        .filter(_models.Post.id.in_(posts_ids)).all()
+    positions = {post_id: position for position, post_id in enumerate(posts_ids)}
+    return sorted(posts, key=lambda post: positions[post.id])
@@ -0,0 +1,122 @@
+import datetime as _datetime
+import os
+import threading
+import time
+from collections import defaultdict
+from uuid import UUID
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import project.src.config.db.database as _database
+from project.src.app import models as _models
+
+load_dotenv()
+TRENDING_WINDOW_HOURS_DEFAULT_NUMBER = 24
+TRENDING_WINDOW_HOURS_MAX_NUMBER = 24 * 7
+TRENDING_LIMIT_DEFAULT_NUMBER = 10
+TRENDING_LIMIT_MAX_NUMBER = 100
+# The usages of a tag weigh half as much every TRENDING_HALF_LIFE_HOURS hours
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "6"))
+TRENDING_CACHE_SECONDS = float(os.getenv("TRENDING_CACHE_SECONDS", "60"))
+
+_trending_cache: dict[tuple[int, int], tuple[float, list[dict]]] = {}
+_trending_cache_lock = threading.Lock()
+
+
+def get_bucket_start(moment: _datetime.datetime) -> _datetime.datetime:
+    """
+    Gets the beginning of the hour of a moment - the usages are counted per hour \n
+    :param moment: A datetime \n
+    :return: The datetime truncated to the hour
+    """
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+async def record_tags_usage(db: _orm.Session, usages: list[tuple[UUID, _datetime.datetime]], delta: int = 1):
+    """
+    Increments - or decrements - the hourly usage counters of the tags \n
+    The changes are part of the session's transaction, the caller commits. \n
+    :param db: A database session \n
+    :param usages: The (tag id, post creation datetime) pairs \n
+    :param delta: 1 when the tags are added to the posts, -1 when they are removed
+    """
+    counts = defaultdict(int)
+    for tag_id, used_on in usages:
+        counts[(tag_id, get_bucket_start(used_on))] += delta
+
+    if not counts:
+        return
+
+    if delta > 0:
+        statement = _database.dialect_insert(db, _models.TagUsage).values([
+            {"tag_id": tag_id, "bucket_start": bucket_start, "count": count}
+            for (tag_id, bucket_start), count in counts.items()
+        ])
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[_models.TagUsage.tag_id, _models.TagUsage.bucket_start],
+            set_={"count": _models.TagUsage.count + statement.excluded.count}
+        ))
+        return
+
+    # The usages counted before the counters existed are unknown - the counters never go below 0
+    for (tag_id, bucket_start), count in counts.items():
+        new_count = _models.TagUsage.count + count
+        db.execute(
+            _sql.update(_models.TagUsage)
+            .where(_models.TagUsage.tag_id == tag_id, _models.TagUsage.bucket_start == bucket_start)
+            .values(count=_sql.case((new_count < 0, 0), else_=new_count))
+        )
+
+
+async def get_trending_tags(db: _orm.Session, window_hours: int = TRENDING_WINDOW_HOURS_DEFAULT_NUMBER,
+                            limit: int = TRENDING_LIMIT_DEFAULT_NUMBER) -> list[dict]:
+    """
+    Gets the most used tags of the last hours - the recent usages weigh more \n
+    The scores are computed in a single query over the hourly counters, then cached for a little while. \n
+    :param db: A database session \n
+    :param window_hours: The number of hours to look back \n
+    :param limit: The maximum number of tags to return \n
+    :return: A list of tags (slug, name & score), the hottest first
+    """
+    cache_key = (window_hours, limit)
+    with _trending_cache_lock:
+        cached = _trending_cache.get(cache_key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    current_bucket_start = get_bucket_start(_datetime.datetime.now())
+    weights = {
+        current_bucket_start - _datetime.timedelta(hours=age): 0.5 ** (age / TRENDING_HALF_LIFE_HOURS)
+        for age in range(window_hours)
+    }
+    score = _sql.func.sum(
+        _models.TagUsage.count * _sql.case(weights, value=_models.TagUsage.bucket_start, else_=0.0)
+    ).label("score")
+    scores = _sql.select(_models.TagUsage.tag_id, score) \
+        .where(_models.TagUsage.bucket_start >= min(weights)) \
+        .group_by(_models.TagUsage.tag_id) \
+        .subquery()
+
+    rows = db.execute(
+        _sql.select(_models.Tag.slug, _models.Tag.name, scores.c.score)
+        .join(scores, scores.c.tag_id == _models.Tag.id)
+        .where(scores.c.score > 0)
+        .order_by(scores.c.score.desc(), _models.Tag.slug)
+        .limit(limit)
+    ).all()
+    trending_tags = [{"slug": row.slug, "name": row.name, "score": round(row.score, 4)} for row in rows]
+
+    with _trending_cache_lock:
+        _trending_cache[cache_key] = (time.monotonic() + TRENDING_CACHE_SECONDS, trending_tags)
+
+    return trending_tags
+
+
+def clear_trending_tags_cache():
+    """
+    Forgets the cached trending tags
+    """
+    with _trending_cache_lock:
+        _trending_cache.clear()
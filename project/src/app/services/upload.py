@@ -0,0 +1,233 @@
+import asyncio
+import datetime as _datetime
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+from project.src.app import models as _models
+from project.src.app import schemas as _schemas
+from project.src.app.app_enums.uploadStatusEnum import UploadStatusEnum
+
+load_dotenv()
+UPLOAD_MAX_SIZE_BYTES = int(os.getenv("UPLOAD_MAX_SIZE_BYTES", str(50 * 1024 * 1024)))
+# Each request sends a short chunk - a worker is not held for the whole upload
+UPLOAD_CHUNK_MAX_BYTES = int(os.getenv("UPLOAD_CHUNK_MAX_BYTES", str(8 * 1024 * 1024)))
+# An upload not used by a post within this time is purged, its staging file too
+UPLOAD_TTL_SECONDS = float(os.getenv("UPLOAD_TTL_SECONDS", "86400"))
+UPLOAD_HASH_BLOCK_SIZE_BYTES = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def get_staging_directory() -> Path:
+    """
+    Gets the directory of the files being uploaded - UPLOADS_DIRECTORY_NAME, or a sub directory of the images one:
+    the finalized files are moved, not copied, to the images directory \n
+    :return: The directory
+    """
+    return Path(os.getenv("UPLOADS_DIRECTORY_NAME") or f"{os.getenv('IMAGES_DIRECTORY_NAME')}/.uploads")
+
+
+def get_staging_path(upload_id: uuid.UUID) -> Path:
+    return get_staging_directory() / str(upload_id)
+
+
+async def create_upload(db: _orm.Session, upload: _schemas.UploadCreate) -> _models.Upload:
+    """
+    Starts a resumable upload - with an empty staging file \n
+    :param db: A database session \n
+    :param upload: The file to upload \n
+    :return: The created upload
+    """
+    now_datetime = _datetime.datetime.now()
+    db_upload = _models.Upload(
+        owner_id=upload.owner_id,
+        filename=os.path.basename(upload.filename),
+        size=upload.size,
+        sha256=upload.sha256.lower() if upload.sha256 else None,
+        status=UploadStatusEnum.IN_PROGRESS.value,
+        created_on=now_datetime,
+        expires_on=now_datetime + _datetime.timedelta(seconds=UPLOAD_TTL_SECONDS)
+    )
+    db.add(db_upload)
+    db.commit()
+    db.refresh(db_upload)
+
+    staging_path = get_staging_path(db_upload.id)
+    staging_path.parent.mkdir(parents=True, exist_ok=True)
+    staging_path.touch()
+    return db_upload
+
+
+async def get_upload_by_id(db: _orm.Session, upload_id: uuid.UUID) -> _models.Upload | None:
+    return db.query(_models.Upload).filter(_models.Upload.id == upload_id).first()
+
+
+async def append_chunk(db: _orm.Session, db_upload: _models.Upload, offset: int,
+                       chunk: AsyncIterator[bytes]) -> bool:
+    """
+    Appends a chunk to the staging file, at its offset \n
+    The chunk is received in its own part file: only the request moving the offset writes it to the staging file - a
+    stale or concurrent chunk, e.g. sent again after a lost response, never overwrites the accepted bytes. \n
+    :param db: A database session \n
+    :param db_upload: The upload, in progress \n
+    :param offset: The offset of the chunk - the upload's offset \n
+    :param chunk: The bytes of the chunk \n
+    :return: False if another request wrote a chunk at this offset meanwhile
+    :raise ValueError: If the chunk is larger than UPLOAD_CHUNK_MAX_BYTES or than the rest of the file
+    """
+    max_length = min(UPLOAD_CHUNK_MAX_BYTES, db_upload.size - offset)
+    length = 0
+    staging_path = get_staging_path(db_upload.id)
+    part_path = staging_path.with_name(f"{staging_path.name}.{uuid.uuid4()}")
+    try:
+        # The file is written off the event loop
+        with open(part_path, "wb") as part_file:
+            async for data in chunk:
+                length += len(data)
+                if length > max_length:
+                    raise ValueError(length)
+                await asyncio.to_thread(part_file.write, data)
+
+        # Only one of the concurrent chunks moves the offset - the upload stays locked until its bytes are written
+        moved = db.execute(
+            _sql.update(_models.Upload)
+            .where(_models.Upload.id == db_upload.id, _models.Upload.offset == offset,
+                   _models.Upload.status == UploadStatusEnum.IN_PROGRESS.value)
+            .values(offset=offset + length)
+        ).rowcount == 1
+        if moved:
+            await asyncio.to_thread(write_part_file, part_path, staging_path, offset)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        part_path.unlink(missing_ok=True)
+
+    db.commit()
+    db.refresh(db_upload)
+    return moved
+
+
+def write_part_file(part_path: Path, staging_path: Path, offset: int):
+    """
+    Writes a received chunk to the staging file, at its offset - on the disk before its offset is committed \n
+    :param part_path: The file of the chunk \n
+    :param staging_path: The staging file \n
+    :param offset: The offset of the chunk
+    """
+    with open(part_path, "rb") as part_file, open(staging_path, "r+b") as staging_file:
+        staging_file.seek(offset)
+        shutil.copyfileobj(part_file, staging_file)
+        staging_file.flush()
+        os.fsync(staging_file.fileno())
+
+
+def hash_file(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        while block := file.read(UPLOAD_HASH_BLOCK_SIZE_BYTES):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+async def finalize_upload(db: _orm.Session, db_upload: _models.Upload) -> bool:
+    """
+    Checks the checksum of a complete upload - the file can then be used by a post \n
+    A corrupted file is emptied: the upload starts again from the first byte. \n
+    :param db: A database session \n
+    :param db_upload: The upload - all its bytes received \n
+    :return: False if the file does not match the expected checksum
+    """
+    staging_path = get_staging_path(db_upload.id)
+    # The file may be large - it is read off the event loop
+    if db_upload.sha256 is not None and await asyncio.to_thread(hash_file, staging_path) != db_upload.sha256:
+        with open(staging_path, "r+b") as staging_file:
+            staging_file.truncate(0)
+        db_upload.offset = 0
+        db.commit()
+        return False
+
+    db_upload.status = UploadStatusEnum.FINALIZED.value
+    db.commit()
+    db.refresh(db_upload)
+    return True
+
+
+def consume_upload(db: _orm.Session, db_upload: _models.Upload) -> bool:
+    """
+    Marks a finalized upload as used by a post \n
+    The change is part of the session's transaction - the one creating the post - the caller commits. \n
+    :param db: A database session \n
+    :param db_upload: The finalized upload \n
+    :return: False if another post used it meanwhile
+    """
+    return db.execute(
+        _sql.update(_models.Upload)
+        .where(_models.Upload.id == db_upload.id, _models.Upload.status == UploadStatusEnum.FINALIZED.value)
+        .values(status=UploadStatusEnum.CONSUMED.value)
+    ).rowcount == 1
+
+
+def release_upload(db: _orm.Session, db_upload: _models.Upload):
+    """
+    Makes a consumed upload usable again - the post using it was not created \n
+    :param db: A database session \n
+    :param db_upload: The consumed upload
+    """
+    db.execute(
+        _sql.update(_models.Upload)
+        .where(_models.Upload.id == db_upload.id, _models.Upload.status == UploadStatusEnum.CONSUMED.value)
+        .values(status=UploadStatusEnum.FINALIZED.value)
+    )
+    db.commit()
+
+
+def move_upload_file(db_upload: _models.Upload, destination: Path):
+    """
+    Moves the file of a consumed upload to the images directory - a rename on the same file system \n
+    :param db_upload: The upload \n
+    :param destination: The image's path
+    """
+    shutil.move(get_staging_path(db_upload.id), destination)
+
+
+def restore_upload_file(db_upload: _models.Upload, source: Path):
+    """
+    Moves the file of an upload back to the staging directory - the post using it was not created \n
+    :param db_upload: The upload \n
+    :param source: The image's path
+    """
+    if source.exists():
+        shutil.move(source, get_staging_path(db_upload.id))
+
+
+def purge_expired_uploads(db: _orm.Session) -> int:
+    """
+    Deletes the expired uploads and their staging files - the consumed ones have none anymore \n
+    :param db: A database session \n
+    :return: The number of uploads deleted
+    """
+    uploads_ids = db.execute(
+        _sql.delete(_models.Upload)
+        .where(_models.Upload.expires_on <= _datetime.datetime.now())
+        .returning(_models.Upload.id)
+    ).scalars().all()
+    db.commit()
+
+    for upload_id in uploads_ids:
+        try:
+            os.remove(get_staging_path(upload_id))
+        except FileNotFoundError:
+            pass
+        except OSError as err:
+            logger.warning("Cannot remove the staging file of the upload %s: %s", upload_id, err)
+    return len(uploads_ids)
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Awaitable, Callable
+
+import sqlalchemy as _sql
+from dotenv import load_dotenv
+
+import project.src.app.services.inverted_index as _inverted_index_service
+import project.src.app.services.post as _post_service
+import project.src.app.services.tag as _tag_service
+import project.src.app.services.trending as _trending_service
+import project.src.config.db.database as _database
+from project.src.config.db.replicas import replica_pool
+
+load_dotenv()
+# The number of connections opened by each worker before taking traffic
+WARMUP_POOL_SIZE = int(os.getenv("WARMUP_POOL_SIZE", "5"))
+# The worker is ready even if a hook fails - a warmup only makes the first requests faster
+WARMUP_HOOK_TIMEOUT_SECONDS = float(os.getenv("WARMUP_HOOK_TIMEOUT_SECONDS", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimings:
+    """
+    When the worker started, finished warming up and served its first request - monotonic clock
+    """
+
+    def __init__(self):
+        self.started_on = time.monotonic()
+        self.ready_on: float | None = None
+        self.first_request_on: float | None = None
+        self.hooks_seconds: dict[str, float] = {}
+
+    def mark_started(self):
+        """
+        Restarts the clock - in a worker forked from a preloaded app
+        """
+        self.__init__()
+
+    def mark_first_request(self):
+        if self.first_request_on is None:
+            self.first_request_on = time.monotonic()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.ready_on is not None
+
+    def to_dict(self) -> dict:
+        def since_start(moment: float | None) -> float | None:
+            return None if moment is None else round(moment - self.started_on, 4)
+
+        return {
+            "warmup_seconds": since_start(self.ready_on),
+            "time_to_first_request_seconds": since_start(self.first_request_on),
+            "hooks_seconds": self.hooks_seconds,
+        }
+
+
+startup_timings = StartupTimings()
+
+_warmup_hooks: list[tuple[str, Callable[[], Awaitable[None]]]] = []
+
+
+def register_warmup_hook(name: str):
+    """
+    Registers a function run by each worker before it is ready - in the registration order \n
+    :param name: The name of the hook, used in the timings
+    """
+    def decorator(hook: Callable[[], Awaitable[None]]):
+        _warmup_hooks.append((name, hook))
+        return hook
+    return decorator
+
+
+async def run_warmup_hooks():
+    """
+    Runs the warmup hooks one after the other, then marks the worker ready
+    """
+    for name, hook in _warmup_hooks:
+        hook_started_on = time.monotonic()
+        try:
+            await asyncio.wait_for(hook(), timeout=WARMUP_HOOK_TIMEOUT_SECONDS)
+        except Exception:
+            logger.exception("The warmup hook %s failed", name)
+        startup_timings.hooks_seconds[name] = round(time.monotonic() - hook_started_on, 4)
+
+    startup_timings.ready_on = time.monotonic()
+    logger.info("Worker %d ready: %s", os.getpid(), startup_timings.to_dict())
+
+
+def _prime_engine_pool(engine: _sql.Engine, size: int):
+    # Only a queue pool keeps several connections
+    if isinstance(engine.pool, _sql.pool.QueuePool):
+        size = min(size, engine.pool.size())
+    else:
+        size = 1
+
+    connections = []
+    try:
+        for _ in range(size):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.execute(_sql.text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+@register_warmup_hook("connection_pools")
+async def prime_connection_pools():
+    """
+    Opens the connections of the primary's and of the replicas' pools - the first requests do not pay for them
+    """
+    engines = [_database.engine] + [replica.engine for replica in replica_pool.replicas]
+    await asyncio.gather(*(asyncio.to_thread(_prime_engine_pool, engine, WARMUP_POOL_SIZE) for engine in engines))
+
+
+@register_warmup_hook("queries")
+async def compile_queries():
+    """
+    Runs the most common queries once - SQLAlchemy caches their compiled form, the ORM its loading plans
+    """
+    db = _database.SessionLocal()
+    try:
+        await _post_service.get_posts(db=db, owners_ids=None, tags_slug=None, limit=1)
+        await _post_service.get_posts(db=db, owners_ids=None, tags_slug=None, limit=1, latest=True)
+        await _post_service.get_posts(db=db, owners_ids=None, tags_slug=None, limit=1, popular=True)
+        await _post_service.get_post_by_id(db=db, post_id=uuid.uuid4())
+        await _tag_service.get_tags(db=db, limit=1)
+    finally:
+        db.close()
+
+
+@register_warmup_hook("trending_tags")
+async def prime_trending_tags():
+    """
+    Computes the default trending tags - they are cached
+    """
+    db = _database.SessionLocal()
+    try:
+        await _trending_service.get_trending_tags(db=db)
+    finally:
+        db.close()
+
+
+@register_warmup_hook("inverted_index")
+async def build_inverted_index():
+    """
+    Builds the inverted index of the posts' tags and owners - if enabled
+    """
+    if not _inverted_index_service.INVERTED_INDEX_ENABLED:
+        return
+
+    def build():
+        db = _database.SessionLocal()
+        try:
+            _inverted_index_service.inverted_index.build(db=db)
+        finally:
+            db.close()
+
+    await asyncio.to_thread(build)
@@ -1,16 +1,50 @@
 import os
 
 import sqlalchemy as _sql
+import sqlalchemy.dialects.postgresql as _postgresql
+import sqlalchemy.dialects.sqlite as _sqlite
 import sqlalchemy.orm as _orm
 from dotenv import load_dotenv
 
+from project.src.config.db.partitioning import POSTS_PARTITIONED
+from project.src.config.db.pool_metrics import MeteredQueuePool
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_BACKEND = _sql.engine.make_url(DATABASE_URL).get_backend_name()
+
+# The INSERT statements of the databases supporting the "ON CONFLICT" clauses - the counters, the tags, the
+# idempotency keys... are upserted
+UPSERT_INSERTS = {
+    "postgresql": _postgresql.insert,
+    "sqlite": _sqlite.insert,
+}
+
+
+def get_upsert_insert(backend: str):
+    """
+    Gets the INSERT statement builder of a database \n
+    :param backend: The database, e.g. "postgresql" \n
+    :return: The builder
+    :raise ValueError: If the database does not support the upserts
+    """
+    try:
+        return UPSERT_INSERTS[backend]
+    except KeyError:
+        raise ValueError(f"The {backend} database is not supported - the upserts need one of: "
+                         f"{', '.join(UPSERT_INSERTS)}") from None
+
+
+# An unsupported DATABASE_URL fails at startup - not on the first write
+get_upsert_insert(DATABASE_BACKEND)
 
 metadata = _sql.MetaData()
 
-engine = _sql.create_engine(DATABASE_URL)
+# The Postgres pool records its waits - the admission control sheds the traffic when they grow
+engine = _sql.create_engine(DATABASE_URL, poolclass=MeteredQueuePool) \
+    if DATABASE_BACKEND == "postgresql" \
+    else _sql.create_engine(DATABASE_URL)
 SessionLocal = _orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = _orm.declarative_base()
 
@@ -18,6 +52,20 @@ Base = _orm.declarative_base()
 # The (association) table linking posts and tags - post_tag_linker
 post_tag_linker = _sql.Table(
     "post_tag_linker", Base.metadata,
-    _sql.Column("post_id", _sql.Uuid, _sql.ForeignKey("posts.id"), primary_key=True),
-    _sql.Column("tag_id", _sql.Uuid, _sql.ForeignKey("tags.id"), primary_key=True)
+    # A partitioned "posts" table has no unique constraint on the id alone - it cannot be referenced
+    _sql.Column("post_id", _sql.Uuid, *([] if POSTS_PARTITIONED else [_sql.ForeignKey("posts.id")]), primary_key=True),
+    _sql.Column("tag_id", _sql.Uuid, _sql.ForeignKey("tags.id"), primary_key=True),
+    # A copy of the post's hot_score - the popular feed of a tag is a scan of this index
+    _sql.Column("hot_score", _sql.Float, nullable=False, default=0, server_default="0"),
+    _sql.Index("ix_post_tag_linker_tag_id_hot_score", "tag_id", "hot_score")
 )
+
+
+def dialect_insert(db: _orm.Session, table):
+    """
+    Gets an INSERT statement supporting the "ON CONFLICT" clauses of the session's database \n
+    :param db: A database session \n
+    :param table: The table - or model - to insert into \n
+    :return: The INSERT statement
+    """
+    return get_upsert_insert(db.get_bind().dialect.name)(table)
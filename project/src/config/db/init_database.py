@@ -1,8 +1,59 @@
+import logging
+
+import sqlalchemy as _sql
+
 import project.src.config.db.database as _database
+import project.src.config.db.partitioning as _partitioning
+import project.src.app.models.change as _change
+import project.src.app.models.idempotency_key as _idempotency_key
+import project.src.app.models.owner_posts_count as _owner_posts_count
 import project.src.app.models.post as _post
 import project.src.app.models.tag as _tag
+import project.src.app.models.tag_usage as _tag_usage
+import project.src.app.models.upload as _upload
+import project.src.app.services.search as _search_service
+
+logger = logging.getLogger(__name__)
+
+
+def add_tables_to_picshare_database(bind: _sql.Engine = _database.engine):
+    _database.Base.metadata.create_all(bind=bind)
+
+    with bind.begin() as connection:
+        if bind.dialect.name == "postgresql":
+            upgrade_postgres_tables(connection)
+            if _partitioning.POSTS_PARTITIONED:
+                create_posts_partitions(connection)
+
+        # Objects that cannot be described by the models - they all are idempotent
+        for statement in _search_service.get_caption_search_ddl(bind.dialect.name):
+            connection.execute(_sql.text(statement))
+
+
+def upgrade_postgres_tables(connection: _sql.Connection):
+    """
+    Adds the columns and the indexes added to the models since the tables were created \n
+    A new column must be nullable or have a server default. \n
+    :param connection: A connection to a Postgres database
+    """
+    for table in _database.Base.metadata.sorted_tables:
+        for column in table.columns:
+            if column.primary_key:
+                continue
+            column_ddl = _sql.schema.CreateColumn(column).compile(dialect=connection.dialect)
+            connection.execute(_sql.text(f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {column_ddl}"))
 
+        for index in table.indexes:
+            connection.execute(_sql.schema.CreateIndex(index, if_not_exists=True))
 
-def add_tables_to_picshare_database():
-    return _database.Base.metadata.create_all(bind=_database.engine)
 
+def create_posts_partitions(connection: _sql.Connection):
+    """
+    Creates the partitions of the "posts" table - a table created before the partitioning must be converted first \n
+    :param connection: A connection to a Postgres database
+    """
+    if not _partitioning.is_posts_table_partitioned(connection):
+        logger.warning("The posts table is not partitioned - run: python -m project.src.app.jobs.partition_posts "
+                       "--convert")
+        return
+    _partitioning.create_posts_partitions(connection)
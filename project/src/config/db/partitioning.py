@@ -0,0 +1,203 @@
+import datetime as _datetime
+import logging
+import os
+import re
+import threading
+
+import sqlalchemy as _sql
+from dotenv import load_dotenv
+
+load_dotenv()
+# Postgres only - the "posts" table is partitioned by month of creation
+POSTS_PARTITIONING_ENABLED = os.getenv("POSTS_PARTITIONING_ENABLED", "false").lower() == "true"
+POSTS_PARTITIONED = POSTS_PARTITIONING_ENABLED and os.getenv("DATABASE_URL") is not None \
+    and _sql.engine.make_url(os.getenv("DATABASE_URL")).get_backend_name() == "postgresql"
+# The partitions of the next months are created in advance
+POSTS_PARTITIONS_MONTHS_AHEAD = int(os.getenv("POSTS_PARTITIONS_MONTHS_AHEAD", "3"))
+# The latest feeds read the partitions of the last months first - the older ones only when they are not enough
+POSTS_LATEST_WINDOW_MONTHS = int(os.getenv("POSTS_LATEST_WINDOW_MONTHS", "1"))
+
+POSTS_TABLE_NAME = "posts"
+POSTS_DEFAULT_PARTITION_NAME = "posts_default"
+POSTS_PARTITION_NAME_PATTERN = re.compile(r"^posts_(\d{4})_(\d{2})$")
+
+logger = logging.getLogger(__name__)
+
+
+def get_month_start(moment: _datetime.datetime, months_offset: int = 0) -> _datetime.datetime:
+    """
+    Gets the start of a month \n
+    :param moment: A moment of the month \n
+    :param months_offset: The number of months to move - negative to go back \n
+    :return: The first day of the month, at midnight
+    """
+    month_index = moment.year * 12 + moment.month - 1 + months_offset
+    return _datetime.datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def get_partition_name(month_start: _datetime.datetime) -> str:
+    return f"{POSTS_TABLE_NAME}_{month_start:%Y_%m}"
+
+
+def get_partition_ddl(month_start: _datetime.datetime) -> str:
+    """
+    Gets the statement creating the partition of a month - idempotent \n
+    :param month_start: The first day of the month \n
+    :return: The statement
+    """
+    return f"CREATE TABLE IF NOT EXISTS {get_partition_name(month_start)} PARTITION OF {POSTS_TABLE_NAME} " \
+           f"FOR VALUES FROM ('{month_start:%Y-%m-%d}') TO ('{get_month_start(month_start, 1):%Y-%m-%d}')"
+
+
+def is_posts_table_partitioned(connection: _sql.Connection) -> bool:
+    return connection.execute(_sql.text(
+        "SELECT 1 FROM pg_partitioned_table JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid "
+        "WHERE pg_class.relname = :table_name"
+    ), {"table_name": POSTS_TABLE_NAME}).first() is not None
+
+
+def get_posts_partitions_names(connection: _sql.Connection) -> list[str]:
+    return [name for (name,) in connection.execute(_sql.text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE parent.relname = :table_name ORDER BY child.relname"
+    ), {"table_name": POSTS_TABLE_NAME})]
+
+
+def create_posts_partitions(connection: _sql.Connection, since: _datetime.datetime | None = None,
+                            months_ahead: int = POSTS_PARTITIONS_MONTHS_AHEAD) -> list[str]:
+    """
+    Creates the missing partitions of the "posts" table - from a month to a few months ahead - and the default
+    partition, which receives the posts out of these months \n
+    :param connection: A connection to a Postgres database \n
+    :param since: The first month to create, the current month by default \n
+    :param months_ahead: The number of months after the current one to create \n
+    :return: The names of the partitions
+    """
+    month_start = get_month_start(since or _datetime.datetime.now())
+    last_month_start = get_month_start(_datetime.datetime.now(), months_ahead)
+
+    names = []
+    while month_start <= last_month_start:
+        connection.execute(_sql.text(get_partition_ddl(month_start)))
+        names.append(get_partition_name(month_start))
+        month_start = get_month_start(month_start, 1)
+
+    connection.execute(_sql.text(
+        f"CREATE TABLE IF NOT EXISTS {POSTS_DEFAULT_PARTITION_NAME} PARTITION OF {POSTS_TABLE_NAME} DEFAULT"
+    ))
+    return names
+
+
+def detach_posts_partitions(connection: _sql.Connection, before: _datetime.datetime) -> list[str]:
+    """
+    Detaches the partitions of the months ended before a date - they become plain tables, to archive then drop \n
+    Their posts are not served anymore. \n
+    :param connection: A connection to a Postgres database \n
+    :param before: The date - only the months ending before it are detached \n
+    :return: The names of the detached partitions
+    """
+    detached_names = []
+    for name in get_posts_partitions_names(connection):
+        match = POSTS_PARTITION_NAME_PATTERN.match(name)
+        if match is None:
+            continue
+        month_start = _datetime.datetime(int(match.group(1)), int(match.group(2)), 1)
+        if get_month_start(month_start, 1) <= before:
+            connection.execute(_sql.text(f"ALTER TABLE {POSTS_TABLE_NAME} DETACH PARTITION {name}"))
+            detached_names.append(name)
+    return detached_names
+
+
+def partition_posts_table(connection: _sql.Connection) -> int:
+    """
+    Replaces an existing "posts" table with a partitioned one holding the same rows - to run once, in a maintenance
+    window: the table is locked while its rows are copied \n
+    The former table is kept as "posts_unpartitioned". The indexes are created again by
+    add_tables_to_picshare_database. \n
+    :param connection: A connection to a Postgres database - in a transaction \n
+    :return: The number of copied posts
+    """
+    connection.execute(_sql.text(f"LOCK TABLE {POSTS_TABLE_NAME} IN ACCESS EXCLUSIVE MODE"))
+    connection.execute(_sql.text(
+        "CREATE TABLE posts_partitioned (LIKE posts INCLUDING DEFAULTS INCLUDING GENERATED) "
+        "PARTITION BY RANGE (created_on)"
+    ))
+    connection.execute(_sql.text("ALTER TABLE posts_partitioned ALTER COLUMN created_on SET NOT NULL"))
+    connection.execute(_sql.text("ALTER TABLE posts_partitioned ADD PRIMARY KEY (id, created_on)"))
+
+    oldest_created_on = connection.execute(_sql.text("SELECT min(created_on) FROM posts")).scalar()
+    connection.execute(_sql.text(f"ALTER TABLE {POSTS_TABLE_NAME} RENAME TO posts_unpartitioned"))
+    connection.execute(_sql.text(f"ALTER TABLE posts_partitioned RENAME TO {POSTS_TABLE_NAME}"))
+    create_posts_partitions(connection, since=oldest_created_on)
+
+    # The generated columns - the captions' search vector - are computed again
+    columns = ", ".join(name for (name,) in connection.execute(_sql.text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_name = 'posts_unpartitioned' AND is_generated = 'NEVER' ORDER BY ordinal_position"
+    )))
+    copied = connection.execute(_sql.text(
+        f"INSERT INTO {POSTS_TABLE_NAME} ({columns}) SELECT {columns} FROM posts_unpartitioned"
+    )).rowcount
+
+    # A partitioned table has no unique constraint on the id alone - the links cannot reference it
+    connection.execute(_sql.text("ALTER TABLE post_tag_linker DROP CONSTRAINT IF EXISTS post_tag_linker_post_id_fkey"))
+    # The names of the former indexes are freed for the partitioned table's ones
+    for (index_name,) in connection.execute(_sql.text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'posts_unpartitioned'")).all():
+        connection.execute(_sql.text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_unpartitioned"'))
+    return copied
+
+
+class PostsPartitionsKeeper:
+    """
+    Creates the partitions of the next months - checked once a month by each worker, on its first post creation
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_month_start: _datetime.datetime | None = None
+
+    def ensure(self, bind: _sql.Engine):
+        """
+        Creates the missing partitions of the current and the next months - unless checked this month already \n
+        :param bind: The engine of a Postgres database
+        """
+        month_start = get_month_start(_datetime.datetime.now())
+        with self._lock:
+            if self._checked_month_start == month_start:
+                return
+            self._checked_month_start = month_start
+
+        try:
+            with bind.begin() as connection:
+                create_posts_partitions(connection)
+        except _sql.exc.SQLAlchemyError:
+            # Another worker may create them at the same time - the default partition takes the posts meanwhile
+            logger.exception("The partitions of the posts could not be created")
+            with self._lock:
+                self._checked_month_start = None
+
+
+posts_partitions_keeper = PostsPartitionsKeeper()
+
+
+def fetch_latest_first(query, created_on: _sql.Column, skip: int, limit: int) -> list:
+    """
+    Runs a query of posts sorted by creation datetime, the latest first \n
+    On a partitioned table, the partitions of the last POSTS_LATEST_WINDOW_MONTHS months are read first - the older
+    ones only when the page is not full. \n
+    :param query: The sorted query \n
+    :param created_on: The creation datetime column \n
+    :param skip: Query param 'skip' \n
+    :param limit: Query param 'limit' \n
+    :return: The page of the query
+    """
+    if POSTS_PARTITIONED:
+        since = get_month_start(_datetime.datetime.now(), -POSTS_LATEST_WINDOW_MONTHS)
+        rows = query.filter(created_on >= since).offset(skip).limit(limit).all()
+        if len(rows) >= limit:
+            return rows
+
+    return query.offset(skip).limit(limit).all()
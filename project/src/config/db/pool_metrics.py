@@ -0,0 +1,56 @@
+import collections
+import threading
+import time
+
+import sqlalchemy as _sql
+
+# The pool wait time is the mean of the waits of the last seconds - it goes back to 0 when nothing waits anymore
+POOL_WAIT_WINDOW_SECONDS = 5.0
+
+
+class PoolWaitMonitor:
+    """
+    Records how long the connections checkouts waited for a free connection
+    """
+
+    def __init__(self, window_seconds: float = POOL_WAIT_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._samples: collections.deque[tuple[float, float]] = collections.deque()
+        self._lock = threading.Lock()
+
+    def _forget_old_samples(self, now: float):
+        while self._samples and self._samples[0][0] < now - self.window_seconds:
+            self._samples.popleft()
+
+    def record(self, wait_seconds: float):
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, wait_seconds))
+            self._forget_old_samples(now)
+
+    def wait_seconds(self) -> float:
+        """
+        Gets the mean wait of the checkouts of the last seconds \n
+        :return: The mean wait, 0 without checkouts
+        """
+        with self._lock:
+            self._forget_old_samples(time.monotonic())
+            if not self._samples:
+                return 0.0
+            return sum(wait for _, wait in self._samples) / len(self._samples)
+
+
+pool_wait_monitor = PoolWaitMonitor()
+
+
+class MeteredQueuePool(_sql.pool.QueuePool):
+    """
+    A queue pool recording the time spent waiting for its connections - see the admission control middleware
+    """
+
+    def _do_get(self):
+        started_on = time.monotonic()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait_monitor.record(time.monotonic() - started_on)
@@ -0,0 +1,113 @@
+import itertools
+import os
+import threading
+import time
+
+import sqlalchemy as _sql
+import sqlalchemy.exc as _sql_exc
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Comma separated list of the read-only replicas urls - leave empty to read from the primary only
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# A replica lagging behind the primary for more than this number of seconds is not used
+DATABASE_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DATABASE_REPLICA_MAX_LAG_SECONDS", "5"))
+DATABASE_REPLICA_HEALTH_CHECK_INTERVAL_SECONDS = float(
+    os.getenv("DATABASE_REPLICA_HEALTH_CHECK_INTERVAL_SECONDS", "10")
+)
+
+# Postgres only: 0 when the replica replayed everything it received, the replay delay otherwise
+POSTGRES_REPLICATION_LAG_QUERY = _sql.text(
+    "SELECT CASE "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+HEALTH_CHECK_QUERY = _sql.text("SELECT 1")
+
+
+class Replica:
+    """
+    A read-only database replica and its last known health
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = _sql.create_engine(url, pool_pre_ping=True)
+        self.session_factory = _orm.sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.healthy = True
+        self.lag_seconds = 0.0
+        self.checked_on = None
+
+
+class ReplicaPool:
+    """
+    Hands out sessions on the healthy replicas in a round-robin fashion \n
+    A replica is healthy when it answers and lags behind the primary less than the configured tolerance.
+    """
+
+    def __init__(self, urls: list[str], max_lag_seconds: float = DATABASE_REPLICA_MAX_LAG_SECONDS,
+                 health_check_interval_seconds: float = DATABASE_REPLICA_HEALTH_CHECK_INTERVAL_SECONDS):
+        self.replicas = [Replica(url) for url in urls]
+        self.max_lag_seconds = max_lag_seconds
+        self.health_check_interval_seconds = health_check_interval_seconds
+        self._cursor = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def measure_lag(connection: _sql.Connection) -> float:
+        """
+        Measures the replication lag of a replica - the other databases only have to answer \n
+        :param connection: A connection to the replica \n
+        :return: The lag in seconds
+        """
+        if connection.dialect.name == "postgresql":
+            return float(connection.execute(POSTGRES_REPLICATION_LAG_QUERY).scalar() or 0)
+
+        connection.execute(HEALTH_CHECK_QUERY)
+        return 0.0
+
+    def check(self, replica: Replica):
+        """
+        Checks that a replica answers and measures its replication lag \n
+        :param replica: The replica to check \n
+        :return: True if the replica can be used
+        """
+        try:
+            with replica.engine.connect() as connection:
+                replica.lag_seconds = self.measure_lag(connection)
+            replica.healthy = replica.lag_seconds <= self.max_lag_seconds
+        except _sql_exc.SQLAlchemyError:
+            replica.healthy = False
+
+        replica.checked_on = time.monotonic()
+        return replica.healthy
+
+    def _is_due_for_check(self, replica: Replica):
+        return replica.checked_on is None \
+            or time.monotonic() - replica.checked_on >= self.health_check_interval_seconds
+
+    def session(self) -> _orm.Session | None:
+        """
+        Opens a session on the next healthy replica \n
+        :return: A database session, or None when no replica can be used
+        """
+        if not self.replicas:
+            return None
+
+        with self._lock:
+            start = next(self._cursor)
+
+        for index in range(len(self.replicas)):
+            replica = self.replicas[(start + index) % len(self.replicas)]
+            if self._is_due_for_check(replica):
+                self.check(replica)
+            if replica.healthy:
+                return replica.session_factory()
+
+        return None
+
+
+replica_pool = ReplicaPool(DATABASE_REPLICA_URLS)
@@ -0,0 +1,85 @@
+"""
+The production server - gunicorn managing uvicorn workers - and its configuration \n
+The app is imported once by the master and forked into the workers, which warm up before taking traffic. \n
+Usage: python -m project.src.config.server
+"""
+import multiprocessing
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+SERVER_BIND = os.getenv("SERVER_BIND", "0.0.0.0:8000")
+# One worker per available core, unless WEB_CONCURRENCY is set
+WEB_CONCURRENCY = os.getenv("WEB_CONCURRENCY")
+WEB_MAX_WORKERS = int(os.getenv("WEB_MAX_WORKERS", "8"))
+SERVER_TIMEOUT_SECONDS = int(os.getenv("SERVER_TIMEOUT_SECONDS", "60"))
+
+# The master creates the tables once - the workers must not
+os.environ.setdefault("DATABASE_INIT_ON_STARTUP", "false")
+
+
+def get_workers_count() -> int:
+    """
+    Gets the number of workers - WEB_CONCURRENCY, or the number of cores the process may run on \n
+    :return: The number of workers
+    """
+    if WEB_CONCURRENCY:
+        return max(1, int(WEB_CONCURRENCY))
+
+    try:
+        cores_count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores_count = multiprocessing.cpu_count()
+    return max(1, min(cores_count, WEB_MAX_WORKERS))
+
+
+# The gunicorn settings
+bind = SERVER_BIND
+workers = get_workers_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+# The modules are imported once - the workers share their memory pages
+preload_app = True
+timeout = SERVER_TIMEOUT_SECONDS
+graceful_timeout = SERVER_TIMEOUT_SECONDS
+keepalive = 5
+accesslog = "-"
+
+
+def on_starting(server):
+    """
+    Creates the tables before the workers start
+    """
+    import project.src.config.db.database as _database
+    from project.src.config.db.init_database import add_tables_to_picshare_database
+
+    add_tables_to_picshare_database()
+    # The workers must not share the master's connections
+    _database.engine.dispose()
+
+
+def post_fork(server, worker):
+    """
+    Drops the connections inherited from the master - without closing them, they are the master's - and restarts
+    the startup clock of the worker
+    """
+    import project.src.config.db.database as _database
+    from project.src.app.services.warmup import startup_timings
+    from project.src.config.db.replicas import replica_pool
+
+    _database.engine.dispose(close=False)
+    for replica in replica_pool.replicas:
+        replica.engine.dispose(close=False)
+    startup_timings.mark_started()
+
+
+def main():
+    from gunicorn.app.wsgiapp import run
+
+    sys.argv = [sys.argv[0], "--config", "python:project.src.config.server", "project.src.app.main:app"]
+    run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import asyncio
+
+from starlette.requests import Request
+
+from project.src.app.middlewares.admission_control import RouteClass, classify_request, ROUTE_CLASSES
+from project.src.config.db.pool_metrics import PoolWaitMonitor
+
+
+def build_request(method: str, path: str) -> Request:
+    return Request({"type": "http", "method": method, "path": path, "headers": [], "query_string": b""})
+
+
+def test_classify_request():
+    assert classify_request(build_request("GET", "/api/v1/posts/")) is ROUTE_CLASSES["read"]
+    assert classify_request(build_request("POST", "/api/v1/posts/new")) is ROUTE_CLASSES["upload"]
+    assert classify_request(build_request("PUT", "/api/v1/posts/update/1")) is ROUTE_CLASSES["write"]
+    assert classify_request(build_request("GET", "/health/ready")) is None, "Should never shed the probes!"
+
+
+def test_route_class_should_shed_when_the_queue_is_full():
+    async def scenario():
+        route_class = RouteClass("test", max_in_flight=1, max_queued=1, max_queue_wait_seconds=1,
+                                 max_pool_wait_seconds=1)
+        assert await route_class.admit() is True
+
+        queued_admission = asyncio.create_task(route_class.admit())
+        await asyncio.sleep(0)
+        assert route_class.queued == 1
+        assert await route_class.admit() is False, "Should be shed because the queue is full!"
+
+        route_class.release()
+        assert await queued_admission is True
+        route_class.release()
+        assert route_class.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_route_class_should_shed_after_waiting_too_long():
+    async def scenario():
+        route_class = RouteClass("test", max_in_flight=1, max_queued=5, max_queue_wait_seconds=0.05,
+                                 max_pool_wait_seconds=1)
+        assert await route_class.admit() is True
+        assert await route_class.admit() is False
+        assert route_class.queued == 0
+
+    asyncio.run(scenario())
+
+
+def test_pool_wait_monitor_should_forget_the_old_waits():
+    monitor = PoolWaitMonitor(window_seconds=0.05)
+    monitor.record(0.2)
+    monitor.record(0.4)
+    assert abs(monitor.wait_seconds() - 0.3) < 1e-9
+    asyncio.run(asyncio.sleep(0.06))
+    assert monitor.wait_seconds() == 0.0
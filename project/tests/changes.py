@@ -0,0 +1,76 @@
+import asyncio
+import uuid
+
+import sqlalchemy.orm as _orm
+
+from project.src.app import models as _models
+from project.src.app.app_enums.changeActionEnum import ChangeActionEnum
+from project.src.app.app_enums.changeObjectTypeEnum import ChangeObjectTypeEnum
+from project.src.app.services.changes import compact_changes, get_changes, record_change
+
+def record_post_change(db: _orm.Session, post_id: uuid.UUID, action: ChangeActionEnum, payload: dict | None = None):
+    record_change(db=db, object_type=ChangeObjectTypeEnum.POST, object_id=post_id, action=action, payload=payload)
+    db.commit()
+
+
+def test_get_changes_should_page_with_the_cursor(db):
+    first_page = asyncio.run(get_changes(db=db, after=0, limit=1000))
+    after = first_page["next_after"]
+
+    post_id = uuid.uuid4()
+    for action in (ChangeActionEnum.CREATED, ChangeActionEnum.UPDATED, ChangeActionEnum.DELETED):
+        record_post_change(db=db, post_id=post_id, action=action)
+
+    page = asyncio.run(get_changes(db=db, after=after, limit=2))
+    assert [change.action for change in page["changes"]] == [ChangeActionEnum.CREATED, ChangeActionEnum.UPDATED]
+    page = asyncio.run(get_changes(db=db, after=page["next_after"], limit=2))
+    assert [change.action for change in page["changes"]] == [ChangeActionEnum.DELETED]
+    page = asyncio.run(get_changes(db=db, after=page["next_after"], limit=2))
+    assert page["changes"] == [], "Should be at the end of the change log!"
+
+
+def test_compact_changes_should_keep_the_latest_like(db):
+    post_id, other_post_id = uuid.uuid4(), uuid.uuid4()
+    record_post_change(db=db, post_id=post_id, action=ChangeActionEnum.CREATED)
+    for likes in range(1, 4):
+        record_post_change(db=db, post_id=post_id, action=ChangeActionEnum.LIKED, payload={"likes": likes})
+    record_post_change(db=db, post_id=other_post_id, action=ChangeActionEnum.LIKED, payload={"likes": 1})
+    record_post_change(db=db, post_id=other_post_id, action=ChangeActionEnum.DELETED)
+
+    assert compact_changes(db=db) == 3
+    changes = db.query(_models.Change).filter(_models.Change.object_id.in_([post_id, other_post_id])) \
+        .order_by(_models.Change.seq).all()
+    assert [(change.object_id, change.action, change.payload) for change in changes] == [
+        (post_id, ChangeActionEnum.CREATED.value, None),
+        (post_id, ChangeActionEnum.LIKED.value, {"likes": 3}),
+        (other_post_id, ChangeActionEnum.DELETED.value, None)
+    ]
+    assert compact_changes(db=db) == 0
+
+
+def test_get_changes_should_serve_a_change_committed_late(session_factory):
+    with session_factory() as db:
+        after = asyncio.run(get_changes(db=db, after=0, limit=1000))["next_after"]
+
+    late_post_id, post_id = uuid.uuid4(), uuid.uuid4()
+    with session_factory() as late_db, session_factory() as db:
+        # As a post creation: its tags' changes are recorded, and flushed, long before its commit
+        record_change(db=late_db, object_type=ChangeObjectTypeEnum.TAG, object_id=late_post_id,
+                      action=ChangeActionEnum.CREATED)
+        late_db.flush()
+        record_post_change(db=db, post_id=post_id, action=ChangeActionEnum.CREATED)
+        page = asyncio.run(get_changes(db=db, after=after, limit=1000))
+        assert [change.object_id for change in page["changes"]] == [post_id]
+
+        late_db.commit()
+        page = asyncio.run(get_changes(db=db, after=page["next_after"], limit=1000))
+        assert [change.object_id for change in page["changes"]] == [late_post_id], "Should not skip a late change!"
+
+
+def test_record_change_should_forget_the_changes_rolled_back(db):
+    after = asyncio.run(get_changes(db=db, after=0, limit=1000))["next_after"]
+    record_change(db=db, object_type=ChangeObjectTypeEnum.POST, object_id=uuid.uuid4(),
+                  action=ChangeActionEnum.CREATED)
+    db.rollback()
+    db.commit()
+    assert asyncio.run(get_changes(db=db, after=after, limit=1000))["changes"] == []
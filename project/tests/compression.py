@@ -0,0 +1,66 @@
+import gzip
+import json
+
+import brotli
+import fastapi as _fastapi
+from fastapi.testclient import TestClient
+
+from project.src.app.middlewares.compression import (
+    compress_response, negotiate_encoding, compression_metrics, COMPRESSION_MIN_SIZE_BYTES)
+
+app = _fastapi.FastAPI()
+app.middleware("http")(compress_response)
+client = TestClient(app)
+
+large_listing = [{"id": index, "caption": "A caption repeated in every post"} for index in range(100)]
+
+
+@app.get("/large")
+async def get_large_listing():
+    return large_listing
+
+
+@app.get("/small")
+async def get_small_listing():
+    return [{"id": 1}]
+
+
+@app.get("/image")
+async def get_image():
+    return _fastapi.Response(content=b"\x89PNG" * COMPRESSION_MIN_SIZE_BYTES, media_type="image/png")
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate, br") == "br", "Should prefer brotli between equals!"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert negotiate_encoding("br;q=0, *") == "gzip"
+    assert negotiate_encoding("deflate") is None
+    assert negotiate_encoding("") is None
+
+
+def test_compress_response_should_compress_large_json():
+    bytes_out = compression_metrics.bytes_out
+
+    for encoding, decompress in (("gzip", gzip.decompress), ("br", brotli.decompress)):
+        # The raw stream - the client would decode it otherwise
+        with client.stream("GET", "/large", headers={"Accept-Encoding": encoding}) as response:
+            body = b"".join(response.iter_raw())
+        assert response.headers["Content-Encoding"] == encoding
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert len(body) < len(decompress(body))
+        assert json.loads(decompress(body)) == large_listing
+
+    assert compression_metrics.bytes_out > bytes_out
+    assert compression_metrics.ratio() < 1
+
+
+def test_compress_response_should_skip_small_and_image_responses():
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers, "Should not compress below the threshold!"
+
+    response = client.get("/image", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers, "Should not compress the images!"
+
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.json() == large_listing
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+from sqlalchemy.pool import StaticPool
+
+load_dotenv()
+# Without a database url, the tests run on in-memory SQLite databases - the app reads its url when imported
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+TEST_DATABASE_URL = os.getenv("DATABASE_TEST_URL") or "sqlite://"
+# Set by pytest-xdist in each of its workers - "pytest -n auto" runs the tests on all the cores
+XDIST_WORKER_ID = os.getenv("PYTEST_XDIST_WORKER")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import project.src.app.routes.posts as _posts_routes  # noqa: E402
+import project.src.app.routes.tags as _tags_routes  # noqa: E402
+import project.src.app.services.timeline as _timeline_service  # noqa: E402
+from project.src.app.main import app  # noqa: E402
+from project.src.app.routes.shared_constants_and_methods import get_primary_session_factory  # noqa: E402
+from project.src.app.services.idempotency import idempotency_store  # noqa: E402
+from project.src.config.db.init_database import add_tables_to_picshare_database  # noqa: E402
+
+
+def get_worker_database_url(url: str, worker_id: str | None = XDIST_WORKER_ID) -> _sql.URL:
+    """
+    Gets the test database of a pytest-xdist worker - the workers do not wait for each other's locks \n
+    An in-memory SQLite database is already private to its process. \n
+    :param url: The test database url \n
+    :param worker_id: The worker id, e.g. "gw0" - None without pytest-xdist \n
+    :return: The url of the worker's database
+    """
+    database_url = _sql.engine.make_url(url)
+    if worker_id is None or database_url.database in (None, "", ":memory:"):
+        return database_url
+
+    if database_url.get_backend_name() == "sqlite":
+        root, extension = os.path.splitext(database_url.database)
+        return database_url.set(database=f"{root}_{worker_id}{extension}")
+    return database_url.set(database=f"{database_url.database}_{worker_id}")
+
+
+def create_postgres_database(url: _sql.URL):
+    """
+    Creates a Postgres database if it does not exist - from the maintenance database of its server \n
+    :param url: The url of the database
+    """
+    server_engine = _sql.create_engine(url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    try:
+        with server_engine.connect() as connection:
+            exists = connection.execute(_sql.text("SELECT 1 FROM pg_database WHERE datname = :name"),
+                                        {"name": url.database}).scalar()
+            if not exists:
+                connection.execute(_sql.text(f'CREATE DATABASE "{url.database}"'))
+    finally:
+        server_engine.dispose()
+
+
+def create_test_engine(url: _sql.URL) -> _sql.Engine:
+    """
+    Creates the engine of the test database \n
+    On SQLite, the transactions are started by SQLAlchemy - pysqlite's own handling breaks the savepoints - and the
+    ids are generated by a gen_random_uuid() function, as on Postgres. \n
+    :param url: The url of the test database \n
+    :return: The engine
+    """
+    if url.get_backend_name() != "sqlite":
+        return _sql.create_engine(url)
+
+    # The test client runs the app in another thread - on the test's connection
+    engine = _sql.create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool) \
+        if url.database in (None, "", ":memory:") \
+        else _sql.create_engine(url, connect_args={"check_same_thread": False})
+
+    @_sql.event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        dbapi_connection.create_function("gen_random_uuid", 0, lambda: uuid.uuid4().hex)
+
+    @_sql.event.listens_for(engine, "begin")
+    def on_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    return engine
+
+
+@pytest.fixture(scope="session")
+def engine():
+    url = get_worker_database_url(TEST_DATABASE_URL)
+    if url.get_backend_name() == "postgresql":
+        create_postgres_database(url)
+
+    test_engine = create_test_engine(url)
+    add_tables_to_picshare_database(bind=test_engine)
+    yield test_engine
+    test_engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    """
+    Gives the sessions of a test - all in a transaction rolled back at the end of the test \n
+    Their commits only release savepoints: the tests do not see each other's data and can run in any order.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    try:
+        yield _orm.sessionmaker(bind=connection, autocommit=False, autoflush=False,
+                                join_transaction_mode="create_savepoint")
+    finally:
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def inline_threads(monkeypatch):
+    """
+    Runs the calls sent to threads in the event loop - the sessions of a test share a single connection: concurrent
+    requests would interleave their savepoints
+    """
+    async def run_inline(function, /, *args, **kwargs):
+        return function(*args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "to_thread", run_inline)
+
+
+@pytest.fixture
+def images_directory(tmp_path, monkeypatch):
+    """
+    Gives each test its own images directory - the uploads are staged in it too
+    """
+    monkeypatch.setenv("IMAGES_DIRECTORY_NAME", str(tmp_path))
+    monkeypatch.delenv("UPLOADS_DIRECTORY_NAME", raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def client(session_factory, images_directory, monkeypatch):
+    """
+    Gives a client of the app on the test's sessions and images directory - the startup is not run
+    """
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    monkeypatch.setitem(app.dependency_overrides, _posts_routes.get_db, override_get_db)
+    monkeypatch.setitem(app.dependency_overrides, _tags_routes.get_db, override_get_db)
+    # The reads fall back to the primary - there is no replica in the tests
+    monkeypatch.setitem(app.dependency_overrides, get_primary_session_factory, lambda: session_factory)
+    # The idempotency keys are read before the routes - without their dependencies
+    monkeypatch.setattr(idempotency_store, "session_factory", session_factory)
+    # The rings would keep the posts of the rolled back transactions
+    monkeypatch.setattr(_timeline_service, "timeline_engine", _timeline_service.TimelineEngine())
+    return TestClient(app)
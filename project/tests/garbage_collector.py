@@ -0,0 +1,62 @@
+import datetime
+import os
+import uuid
+
+import sqlalchemy.orm as _orm
+
+from project.src.app import models as _models
+from project.src.app.services.garbage_collector import find_orphan_images, purge_deleted_posts
+
+def add_post(db: _orm.Session, image: str, deleted_on: datetime.datetime | None = None) -> uuid.UUID:
+    post_id = uuid.uuid4()
+    db.add(_models.Post(id=post_id, image=image, owner_id=1, deleted_on=deleted_on))
+    db.commit()
+    return post_id
+
+
+def test_deleted_posts_should_be_hidden(db, tmp_path):
+    kept_post_id = add_post(db=db, image=str(tmp_path / "kept.png"))
+    deleted_post_id = add_post(db=db, image=str(tmp_path / "deleted.png"), deleted_on=datetime.datetime.now())
+    db.expunge_all()
+
+    posts_ids = [post.id for post in db.query(_models.Post).all()]
+    assert kept_post_id in posts_ids
+    assert deleted_post_id not in posts_ids
+    assert db.get(_models.Post, deleted_post_id) is None
+
+
+def test_purge_deleted_posts_should_remove_the_rows_and_the_images(db, tmp_path):
+    kept_image = tmp_path / "kept.png"
+    recently_deleted_image = tmp_path / "recently_deleted.png"
+    deleted_image = tmp_path / "deleted.png"
+    for image in (kept_image, recently_deleted_image, deleted_image):
+        image.write_bytes(b"image")
+
+    kept_post_id = add_post(db=db, image=str(kept_image))
+    add_post(db=db, image=str(recently_deleted_image), deleted_on=datetime.datetime.now())
+    add_post(db=db, image=str(deleted_image), deleted_on=datetime.datetime.now() - datetime.timedelta(hours=2))
+
+    assert purge_deleted_posts(db=db, retention_seconds=3600) == 1
+    assert not deleted_image.exists()
+    assert recently_deleted_image.exists(), "Should be kept until the end of the retention!"
+    assert kept_image.exists()
+    assert db.get(_models.Post, kept_post_id) is not None
+    assert purge_deleted_posts(db=db, retention_seconds=3600) == 0
+
+
+def test_find_orphan_images_should_ignore_the_referenced_and_the_recent_files(db, tmp_path):
+    referenced_image = tmp_path / "referenced.png"
+    deleted_post_image = tmp_path / "deleted_post.png"
+    orphan_image = tmp_path / "orphan.png"
+    recent_orphan_image = tmp_path / "recent_orphan.png"
+    for image in (referenced_image, deleted_post_image, orphan_image, recent_orphan_image):
+        image.write_bytes(b"image")
+    one_day_ago = datetime.datetime.now().timestamp() - 86400
+    for image in (referenced_image, deleted_post_image, orphan_image):
+        os.utime(image, (one_day_ago, one_day_ago))
+
+    add_post(db=db, image=str(referenced_image))
+    # Not purged yet - its image is still referenced
+    add_post(db=db, image=str(deleted_post_image), deleted_on=datetime.datetime.now())
+
+    assert find_orphan_images(db=db, directory=str(tmp_path), min_age_seconds=3600) == [str(orphan_image)]
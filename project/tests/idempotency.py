@@ -0,0 +1,98 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from project.src.app.services.idempotency import ClaimRenewal, ClaimStatus, IdempotencyStore
+
+
+def test_idempotency_store_should_give_the_key_once(session_factory):
+    store = IdempotencyStore(session_factory=session_factory)
+    key, post_id = str(uuid.uuid4()), uuid.uuid4()
+    claim = store.claim(owner_id=1, key=key)
+    assert (claim.status, claim.post_id) == (ClaimStatus.CLAIMED, None)
+    assert store.claim(owner_id=1, key=key).status == ClaimStatus.IN_PROGRESS
+    # The keys of the owners are distinct
+    other_owner_claim = store.claim(owner_id=2, key=key)
+    assert other_owner_claim.status == ClaimStatus.CLAIMED
+
+    with session_factory() as db:
+        assert store.complete(db=db, claim=claim, post_id=post_id)
+        db.commit()
+    completed = store.claim(owner_id=1, key=key)
+    assert (completed.status, completed.post_id) == (ClaimStatus.COMPLETED, post_id)
+
+    # A completed key is kept, a failed one can be claimed again
+    store.release(claim=claim)
+    assert store.claim(owner_id=1, key=key).status == ClaimStatus.COMPLETED
+    store.release(claim=other_owner_claim)
+    assert store.claim(owner_id=2, key=key).status == ClaimStatus.CLAIMED
+
+
+def test_idempotency_store_should_take_the_dead_and_the_expired_keys_over(session_factory):
+    key = str(uuid.uuid4())
+    store = IdempotencyStore(session_factory=session_factory, lock_timeout_seconds=0)
+    assert store.claim(owner_id=1, key=key).status == ClaimStatus.CLAIMED
+    assert store.claim(owner_id=1, key=key).status == ClaimStatus.CLAIMED, "Should take a dead request's key over!"
+
+    store = IdempotencyStore(session_factory=session_factory, ttl_seconds=0)
+    key = str(uuid.uuid4())
+    claim = store.claim(owner_id=1, key=key)
+    assert claim.status == ClaimStatus.CLAIMED
+    with session_factory() as db:
+        store.complete(db=db, claim=claim, post_id=uuid.uuid4())
+        db.commit()
+    assert store.claim(owner_id=1, key=key).status == ClaimStatus.CLAIMED, "Should forget an expired key!"
+    assert store.purge_expired() >= 1
+
+
+def test_idempotency_store_should_fence_a_taken_over_claim(session_factory):
+    store = IdempotencyStore(session_factory=session_factory, lock_timeout_seconds=0)
+    key, post_id = str(uuid.uuid4()), uuid.uuid4()
+    dead_claim = store.claim(owner_id=1, key=key)
+    retry_claim = store.claim(owner_id=1, key=key)
+    assert retry_claim.status == ClaimStatus.CLAIMED
+
+    # The request of the dead claim neither records its post nor releases the retry's key
+    assert not store.renew(claim=dead_claim)
+    with session_factory() as db:
+        assert not store.complete(db=db, claim=dead_claim, post_id=uuid.uuid4())
+    store.release(claim=dead_claim)
+    with session_factory() as db:
+        assert store.complete(db=db, claim=retry_claim, post_id=post_id), "Should keep the retry's claim!"
+        db.commit()
+    assert store.claim(owner_id=1, key=key).post_id == post_id
+
+
+def test_idempotency_store_should_keep_a_renewed_key(session_factory):
+    store = IdempotencyStore(session_factory=session_factory, lock_timeout_seconds=0.2)
+    key = str(uuid.uuid4())
+    claim = store.claim(owner_id=1, key=key)
+    for _ in range(3):
+        time.sleep(0.1)
+        assert store.renew(claim=claim)
+        assert store.claim(owner_id=1, key=key).status == ClaimStatus.IN_PROGRESS, "Should not take a live key over!"
+
+    with session_factory() as db:
+        assert store.complete(db=db, claim=claim, post_id=uuid.uuid4())
+
+
+@pytest.mark.usefixtures("inline_threads")
+def test_claim_renewal_should_keep_the_key_until_stopped(session_factory):
+    store = IdempotencyStore(session_factory=session_factory, lock_timeout_seconds=0.3)
+    key = str(uuid.uuid4())
+    claim = store.claim(owner_id=1, key=key)
+
+    async def scenario():
+        claim.renewal = ClaimRenewal(store=store, claim=claim)
+        await asyncio.sleep(0.5)
+        assert store.claim(owner_id=1, key=key).status == ClaimStatus.IN_PROGRESS, "Should keep a renewed key!"
+        await claim.stop_renewal()
+        locked_on = claim.locked_on
+        await asyncio.sleep(0.2)
+        assert claim.locked_on == locked_on, "Should not renew a stopped claim!"
+
+    asyncio.run(scenario())
+    with session_factory() as db:
+        assert store.complete(db=db, claim=claim, post_id=uuid.uuid4())
@@ -0,0 +1,43 @@
+from PIL import Image
+
+from project.src.app.services.image_processing import compute_blurhash, process_image
+
+EXIF_ORIENTATION_TAG = 0x0112
+EXIF_MAKE_TAG = 0x010F
+
+
+def test_compute_blurhash():
+    image = Image.new("RGB", (32, 16), (255, 0, 0))
+    blurhash = compute_blurhash(image, x_components=4, y_components=3)
+    assert len(blurhash) == 4 + 2 * 4 * 3, "Should have 4 characters plus 2 per AC component!"
+    assert blurhash[0] == "L", "Should encode 4 x 3 components!"
+    # A plain red image is only its average color
+    assert compute_blurhash(image, x_components=1, y_components=1) == "00TI:j"
+    assert blurhash[2:6] == "TI:j"
+
+
+def test_process_image_should_strip_exif(tmp_path):
+    path = tmp_path / "rotated.jpg"
+    image = Image.new("RGB", (40, 20), (0, 128, 255))
+    exif = image.getexif()
+    # Rotated 90° clockwise
+    exif[EXIF_ORIENTATION_TAG] = 6
+    exif[EXIF_MAKE_TAG] = "Camera"
+    image.save(path, exif=exif)
+
+    metadata = process_image(str(path))
+    assert metadata["mime_type"] == "image/jpeg"
+    assert (metadata["width"], metadata["height"]) == (20, 40), "Should be the size of the rotated image!"
+    assert metadata["byte_size"] == path.stat().st_size
+    assert metadata["blurhash"] is not None
+    with Image.open(path) as saved_image:
+        assert not saved_image.getexif(), "Should not have EXIF data anymore!"
+        assert saved_image.size == (20, 40)
+
+
+def test_process_image_should_accept_other_files(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("not an image")
+
+    metadata = process_image(str(path))
+    assert metadata == {"width": None, "height": None, "mime_type": "text/plain", "byte_size": 12, "blurhash": None}
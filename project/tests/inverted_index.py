@@ -0,0 +1,147 @@
+import datetime as _datetime
+import uuid
+
+import pytest
+
+import project.src.app.services.inverted_index as _inverted_index_service
+from project.src.app.routes.posts import posts_router
+from project.src.app.routes.shared_constants_and_methods import REQUEST_IS_OK_STATUS_CODE
+from project.src.app.services.inverted_index import IntBitMap, InvertedIndex
+
+
+def build_index() -> InvertedIndex:
+    index = InvertedIndex()
+    # As after a build over an empty database
+    index.is_ready = True
+    return index
+
+
+def test_int_bitmap():
+    bitmap = IntBitMap([3, 17, 1024, 8])
+    assert list(bitmap) == [3, 8, 17, 1024]
+    assert len(bitmap) == 4
+
+    bitmap.add(5)
+    bitmap.discard(17)
+    assert list(bitmap & IntBitMap([5, 8, 9])) == [5, 8]
+    assert list(bitmap | IntBitMap([0])) == [0, 3, 5, 8, 1024]
+    assert list(IntBitMap()) == []
+
+
+def test_inverted_index_should_intersect_the_posting_lists():
+    index = build_index()
+    sunset, beach = uuid.uuid4(), uuid.uuid4()
+    created_on = _datetime.datetime(2023, 1, 1)
+    posts_ids = [uuid.uuid4() for _ in range(6)]
+    for position, post_id in enumerate(posts_ids):
+        tags_ids = [sunset] + ([beach] if position % 2 == 0 else [])
+        index.index_post(post_id=post_id, owner_id=position % 3,
+                         created_on=created_on + _datetime.timedelta(hours=position), tags_ids=tags_ids)
+
+    assert index.page(tags_ids=[sunset, beach], owners_ids=None, skip=0, limit=10, latest=False) == posts_ids[::2]
+    assert index.page(tags_ids=[sunset, beach], owners_ids=None, skip=1, limit=1, latest=True) == [posts_ids[2]]
+    assert index.page(tags_ids=[sunset], owners_ids=[0], skip=0, limit=10, latest=True) == [posts_ids[3], posts_ids[0]]
+    assert index.page(tags_ids=[sunset, uuid.uuid4()], owners_ids=None, skip=0, limit=10, latest=False) == []
+
+
+def test_inverted_index_should_follow_the_updates_and_the_deletions():
+    index = build_index()
+    sunset, beach = uuid.uuid4(), uuid.uuid4()
+    post_id, other_post_id = uuid.uuid4(), uuid.uuid4()
+    created_on = _datetime.datetime(2023, 1, 1)
+    index.index_post(post_id=post_id, owner_id=1, created_on=created_on, tags_ids=[sunset])
+    index.index_post(post_id=other_post_id, owner_id=1, created_on=created_on, tags_ids=[sunset, beach])
+
+    index.index_post(post_id=post_id, owner_id=1, created_on=created_on, tags_ids=[beach])
+    assert index.page(tags_ids=[sunset], owners_ids=None, skip=0, limit=10, latest=False) == [other_post_id]
+    assert index.page(tags_ids=[beach], owners_ids=None, skip=0, limit=10, latest=False) == [post_id, other_post_id]
+
+    index.remove_post(post_id=other_post_id)
+    assert index.page(tags_ids=[beach], owners_ids=[1], skip=0, limit=10, latest=False) == [post_id]
+
+    index.remove_tag(tag_id=beach)
+    assert index.page(tags_ids=[beach], owners_ids=None, skip=0, limit=10, latest=False) == []
+    assert index.stats()["posts"] == 1
+
+
+@pytest.fixture
+def indexed_client(client, db, monkeypatch):
+    """
+    Gives a client of the app with the inverted index enabled - built over the test's database
+    """
+    index = InvertedIndex()
+    index.build(db=db)
+    monkeypatch.setattr(_inverted_index_service, "inverted_index", index)
+    return client
+
+
+def create_post(client, caption: str, owner_id: int = 1) -> str:
+    response = client.post(f"{posts_router.prefix}/new", params={"owner_id": owner_id, "caption": caption},
+                           files={"file": open("project/tests/test_img/black.png", "rb")})
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    return response.json()["id"]
+
+
+def get_tagged_posts_ids(client, monkeypatch, query: str, latest: bool = True) -> list[str]:
+    """
+    Gets the ids of the posts of some tags - checks that the index and the database give the same page
+    """
+    url = f"{posts_router.prefix}/?sort=latest&{query}" if latest else f"{posts_router.prefix}/?{query}"
+    response = client.get(url)
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    posts_ids = [post["id"] for post in response.json()]
+
+    with monkeypatch.context() as context:
+        context.setattr(_inverted_index_service.inverted_index, "is_ready", False)
+        response = client.get(url)
+    assert [post["id"] for post in response.json()] == posts_ids, f"Should be the same page as the index for '{query}'!"
+    return posts_ids
+
+
+def test_fetch_posts_by_tags_with_the_inverted_index_should_succeed(indexed_client, monkeypatch):
+    client = indexed_client
+    first_post_id = create_post(client, caption="Index test #IndexSunset #IndexBeach")
+    second_post_id = create_post(client, caption="Index test #IndexSunset")
+    third_post_id = create_post(client, caption="Index test #IndexSunset #IndexBeach")
+
+    assert get_tagged_posts_ids(client, monkeypatch, "tags=indexsunset&tags=indexbeach") == [third_post_id,
+                                                                                               first_post_id]
+    assert get_tagged_posts_ids(client, monkeypatch, "tags=indexsunset&skip=1&limit=1") == [second_post_id]
+    assert get_tagged_posts_ids(client, monkeypatch, "tags=indexsunset&skip=2&limit=5") == [first_post_id]
+
+    # The caption's hashtags are the post's new tags
+    response = client.put(f"{posts_router.prefix}/update/{second_post_id}?user_id=1",
+                          json={"caption": "Index test #IndexBeach", "tags": []})
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert get_tagged_posts_ids(client, monkeypatch, "tags=indexsunset") == [third_post_id, first_post_id]
+    assert get_tagged_posts_ids(client, monkeypatch, "tags=indexbeach") == [third_post_id, second_post_id,
+                                                                              first_post_id]
+
+    response = client.delete(f"{posts_router.prefix}/delete/{third_post_id}?user_id=1")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert get_tagged_posts_ids(client, monkeypatch, "tags=indexsunset&tags=indexbeach") == [first_post_id]
+    assert get_tagged_posts_ids(client, monkeypatch, "tags=unknown") == []
+
+
+def test_fetch_posts_by_owners_and_tags_should_succeed(indexed_client, monkeypatch):
+    client = indexed_client
+    owner_1_posts_ids = [create_post(client, caption=f"Owners test {index} #OwnersSunset") for index in range(3)]
+    owner_2_post_id = create_post(client, caption="Owners test #OwnersSunset", owner_id=2)
+
+    for latest in (True, False):
+        expected = owner_1_posts_ids[::-1] if latest else owner_1_posts_ids
+        assert get_tagged_posts_ids(client, monkeypatch, "owners=1&tags=ownerssunset&skip=1&limit=1",
+                                    latest=latest) == expected[1:2]
+        assert get_tagged_posts_ids(client, monkeypatch, "owners=1&tags=ownerssunset&skip=2&limit=5",
+                                    latest=latest) == expected[2:]
+    assert get_tagged_posts_ids(client, monkeypatch, "owners=1&owners=2&tags=ownerssunset&skip=3&limit=5",
+                                latest=False) == [owner_2_post_id]
+
+    # Without tags, the pages of the owners are read from the database
+    for latest in (True, False):
+        expected = owner_1_posts_ids[::-1] if latest else owner_1_posts_ids
+        response = client.get(f"{posts_router.prefix}/?owners=1&skip=1&limit=1" + ("&sort=latest" if latest else ""))
+        assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+        assert [post["id"] for post in response.json()] == expected[1:2]
+    response = client.get(f"{posts_router.prefix}/?owners=1&owners=2&skip=2&limit=5")
+    assert [post["id"] for post in response.json()] == [owner_1_posts_ids[2], owner_2_post_id]
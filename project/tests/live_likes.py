@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import uuid
+
+import sqlalchemy.orm as _orm
+
+import project.src.app.services.live_likes as _live_likes
+from project.src.app.app_enums.changeActionEnum import ChangeActionEnum
+from project.src.app.app_enums.changeObjectTypeEnum import ChangeObjectTypeEnum
+from project.src.app.services.changes import record_change
+from project.src.app.services.live_likes import LikesBroker, relay_change_log_likes, stream_likes
+
+def test_subscriber_should_coalesce_the_likes():
+    async def run():
+        broker = LikesBroker()
+        post_id, other_post_id = uuid.uuid4(), uuid.uuid4()
+        subscriber = broker.subscribe(posts_ids={post_id})
+        for likes in (1, 2, 3):
+            broker.publish(post_id=post_id, likes=likes)
+        broker.publish(post_id=other_post_id, likes=7)
+        assert await subscriber.pop(timeout=1) == {post_id: 3}, "Should only send the latest count!"
+
+        broker.publish(post_id=post_id, likes=3)
+        assert await subscriber.pop(timeout=1) == {}, "Should not send an unchanged count!"
+        assert await subscriber.pop(timeout=0.01) == {}
+
+        broker.unsubscribe(subscriber)
+        assert broker.to_dict()["subscribers"] == 0
+        assert broker.to_dict()["subscribed_posts"] == 0
+
+    asyncio.run(run())
+
+
+def test_relayed_broker_should_only_publish_the_relayed_likes():
+    async def run():
+        broker = LikesBroker(relayed=True)
+        post_id = uuid.uuid4()
+        subscriber = broker.subscribe(posts_ids={post_id})
+        broker.publish_handled(post_id=post_id, likes=2)
+        assert await subscriber.pop(timeout=0.01) == {}, "Should leave the worker's likes to the relay!"
+        broker.publish(post_id=post_id, likes=2)
+        assert await subscriber.pop(timeout=1) == {post_id: 2}
+
+    asyncio.run(run())
+
+
+def test_stream_likes_should_send_the_initial_then_the_new_counts():
+    async def run():
+        broker = LikesBroker()
+        post_id = uuid.uuid4()
+        events = stream_likes(posts_ids={post_id}, initial_likes={post_id: 4}, broker=broker, interval_seconds=0,
+                              heartbeat_seconds=0.01)
+        assert await anext(events) == f'event: likes\ndata: {{"id":"{post_id}","likes":4}}\n\n'.encode()
+        assert await anext(events) == b": heartbeat\n\n"
+
+        broker.publish(post_id=post_id, likes=5)
+        assert await anext(events) == f'event: likes\ndata: {{"id":"{post_id}","likes":5}}\n\n'.encode()
+
+        await events.aclose()
+        assert broker.subscribers_count == 0, "Should unsubscribe at the end of the stream!"
+
+    asyncio.run(run())
+
+
+def test_relay_change_log_likes_should_publish_the_new_likes(session_factory, monkeypatch):
+    relay_read = threading.Event()
+
+    class RelaySession(_orm.Session):
+        def close(self):
+            super().close()
+            relay_read.set()
+
+    # The relay reads the change log from another thread - on the test's connection: the likes are only written while
+    # it waits, a session closed meanwhile would roll them back with its savepoint
+    monkeypatch.setattr(_live_likes._database, "SessionLocal", _orm.sessionmaker(class_=RelaySession,
+                                                                                  **session_factory.kw))
+    monkeypatch.setattr(_live_likes, "LIKES_BROKER_POLL_INTERVAL_SECONDS", 0.2)
+    post_id = uuid.uuid4()
+
+    def like(likes: int):
+        with session_factory() as db:
+            record_change(db=db, object_type=ChangeObjectTypeEnum.POST, object_id=post_id,
+                          action=ChangeActionEnum.LIKED, payload={"likes": likes})
+            db.commit()
+
+    async def run():
+        broker = LikesBroker()
+        subscriber = broker.subscribe(posts_ids={post_id})
+        # Logged before the relay started - skipped
+        like(likes=1)
+        relay = asyncio.create_task(relay_change_log_likes(broker=broker))
+        assert await asyncio.to_thread(relay_read.wait, 5)
+        like(likes=2)
+        assert await subscriber.pop(timeout=1) == {post_id: 2}, "Should relay the likes of the other workers!"
+        relay.cancel()
+
+    asyncio.run(run())
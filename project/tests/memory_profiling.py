@@ -0,0 +1,142 @@
+import asyncio
+import datetime as _datetime
+import tracemalloc
+
+import pytest
+import sqlalchemy as _sql
+
+import project.src.app.services.export as _export_service
+import project.src.app.services.post as _post_service
+from project.src.app import models as _models
+from project.src.app import schemas as _schemas
+from project.src.app.middlewares.memory_profiling import memory_profiler
+from project.src.app.routes.posts import posts_router
+from project.src.app.routes.shared_constants_and_methods import (
+    REQUEST_IS_OK_STATUS_CODE, OBJECT_CANNOT_BE_FOUND_STATUS_CODE, get_memory_profiling_disabled_detail_message)
+from project.src.app.routes.tags import tags_router
+from project.src.config.db.database import post_tag_linker
+
+# The fixed dataset of the benchmarks - every post has every tag
+POSTS_NUMBER = 100
+TAGS_NUMBER = 5
+MEBIBYTE = 1024 * 1024
+# About twice the peaks measured - each tag of the list is sent with all its posts
+GET_TAGS_PEAK_BUDGET_BYTES = 6 * MEBIBYTE
+GET_POSTS_BY_TAGS_PEAK_BUDGET_BYTES = 2 * MEBIBYTE
+FETCH_POSTS_PEAK_BUDGET_BYTES = 2 * MEBIBYTE
+
+
+@pytest.fixture
+def dataset(db):
+    now_datetime = _datetime.datetime.now()
+    posts = [_models.Post(image=f"{index}.png", caption=f"Benchmark post {index}", owner_id=1, published=True,
+                          published_on=now_datetime, created_on=now_datetime, updated_on=now_datetime)
+             for index in range(POSTS_NUMBER)]
+    tags = [_models.Tag(slug=f"benchmark {index}", name=f"Benchmark {index}") for index in range(TAGS_NUMBER)]
+    db.add_all(posts + tags)
+    db.flush()
+    db.execute(_sql.insert(post_tag_linker), [{"post_id": post.id, "tag_id": tag.id} for post in posts for tag in tags])
+    db.commit()
+
+
+@pytest.fixture
+def traced_memory():
+    memory_profiler.start()
+    try:
+        yield memory_profiler
+    finally:
+        memory_profiler.stop()
+
+
+def get_peak_bytes(client, url: str, route: str) -> int:
+    """
+    Gets the peak allocation of a request - the second one, the first one fills the caches
+    """
+    for _ in range(2):
+        response = client.get(url)
+        assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+
+    response = client.get("/health/memory")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    route_memory = response.json()["routes"][route]
+    assert route_memory["requests"] == 2
+    return route_memory["last_peak_bytes"]
+
+
+@pytest.mark.usefixtures("dataset", "traced_memory")
+def test_get_tags_peak_memory_should_succeed(client):
+    peak_bytes = get_peak_bytes(client, f"{tags_router.prefix}/", f"GET {tags_router.prefix}/")
+    assert 0 < peak_bytes < GET_TAGS_PEAK_BUDGET_BYTES, f"Should allocate less than {GET_TAGS_PEAK_BUDGET_BYTES}!"
+
+
+@pytest.mark.usefixtures("dataset", "traced_memory")
+def test_get_posts_by_tags_peak_memory_should_succeed(client):
+    peak_bytes = get_peak_bytes(client, f"{posts_router.prefix}/?tags=benchmark 0&tags=benchmark 1",
+                                f"GET {posts_router.prefix}/")
+    assert 0 < peak_bytes < GET_POSTS_BY_TAGS_PEAK_BUDGET_BYTES, \
+        f"Should allocate less than {GET_POSTS_BY_TAGS_PEAK_BUDGET_BYTES}!"
+
+
+@pytest.mark.usefixtures("dataset", "traced_memory")
+def test_fetch_posts_peak_memory_should_succeed(client):
+    peak_bytes = get_peak_bytes(client, f"{posts_router.prefix}/", f"GET {posts_router.prefix}/")
+    assert 0 < peak_bytes < FETCH_POSTS_PEAK_BUDGET_BYTES, f"Should allocate less than {FETCH_POSTS_PEAK_BUDGET_BYTES}!"
+
+
+def get_posts_serialization_peak_bytes(db, stream: bool) -> int:
+    """
+    Gets the peak allocation of a page of posts, from the query to the last block of its JSON array
+    """
+    tracemalloc.reset_peak()
+    start_bytes, _ = tracemalloc.get_traced_memory()
+    get_page = _post_service.iter_posts if stream else _post_service.get_posts
+    posts = asyncio.run(get_page(db=db, owners_ids=None, tags_slug=None, limit=POSTS_NUMBER))
+    for _ in _export_service.iter_json_array((_schemas.Post.from_orm(post).dict() for post in posts), block_size=1):
+        pass
+    del posts
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    db.expunge_all()
+    return peak_bytes - start_bytes
+
+
+@pytest.mark.usefixtures("dataset", "traced_memory")
+def test_stream_posts_peak_memory_should_succeed(db, monkeypatch):
+    monkeypatch.setattr(_export_service, "LIST_STREAM_CHUNK_SIZE", 1)
+    # The statements are compiled and cached by the first pages
+    for stream in (False, True):
+        get_posts_serialization_peak_bytes(db=db, stream=stream)
+
+    list_peak_bytes = get_posts_serialization_peak_bytes(db=db, stream=False)
+    stream_peak_bytes = get_posts_serialization_peak_bytes(db=db, stream=True)
+    assert 0 < stream_peak_bytes < list_peak_bytes / 2, "Should hold a single post at a time!"
+
+
+@pytest.mark.usefixtures("traced_memory")
+def test_get_memory_profile_should_succeed(client):
+    response = client.get("/health/memory?limit=3&group_by=filename")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    data = response.json()
+    assert data["tracing"] is True
+    assert 0 < len(data["top_allocations"]) <= 3
+    sizes = [allocation["size_bytes"] for allocation in data["top_allocations"]]
+    assert sizes == sorted(sizes, reverse=True), "Should be sorted by size (desc)!"
+
+
+def test_memory_profiler_should_keep_a_tracing_it_did_not_start():
+    tracemalloc.start()
+    try:
+        memory_profiler.start()
+        memory_profiler.stop()
+        assert tracemalloc.is_tracing(), "Should not stop a tracing begun elsewhere!"
+    finally:
+        tracemalloc.stop()
+
+    memory_profiler.start()
+    memory_profiler.stop()
+    assert not tracemalloc.is_tracing()
+
+
+def test_get_memory_profile_should_fail(client):
+    response = client.get("/health/memory")
+    assert response.status_code == OBJECT_CANNOT_BE_FOUND_STATUS_CODE, response.text
+    assert response.json() == {"detail": get_memory_profiling_disabled_detail_message()}
@@ -0,0 +1,63 @@
+import datetime as _datetime
+
+import project.src.config.db.partitioning as _partitioning
+from project.src.config.db.partitioning import get_month_start, get_partition_name, get_partition_ddl
+
+
+class FakeQuery:
+    """
+    Records the filters of a query and returns the rows created after the last one
+    """
+
+    def __init__(self, rows: list[_datetime.datetime]):
+        self.rows = rows
+        self.since = None
+        self.filtered = None
+
+    def filter(self, condition):
+        query = FakeQuery(self.rows)
+        query.since = condition.right.value
+        self.filtered = query
+        return query
+
+    def offset(self, skip):
+        self.skip = skip
+        return self
+
+    def limit(self, limit):
+        self.limit_value = limit
+        return self
+
+    def all(self):
+        rows = [row for row in self.rows if self.since is None or row >= self.since]
+        return rows[self.skip:self.skip + self.limit_value]
+
+
+def test_get_month_start():
+    assert get_month_start(_datetime.datetime(2023, 3, 15, 10, 30)) == _datetime.datetime(2023, 3, 1)
+    assert get_month_start(_datetime.datetime(2023, 1, 31), -1) == _datetime.datetime(2022, 12, 1)
+    assert get_month_start(_datetime.datetime(2023, 11, 2), 2) == _datetime.datetime(2024, 1, 1)
+
+
+def test_get_partition_ddl():
+    month_start = _datetime.datetime(2023, 12, 1)
+    assert get_partition_name(month_start) == "posts_2023_12"
+    assert get_partition_ddl(month_start) == "CREATE TABLE IF NOT EXISTS posts_2023_12 PARTITION OF posts " \
+                                             "FOR VALUES FROM ('2023-12-01') TO ('2024-01-01')"
+
+
+def test_fetch_latest_first_should_read_the_recent_partitions_first(monkeypatch):
+    from project.src.app.models import Post
+
+    monkeypatch.setattr(_partitioning, "POSTS_PARTITIONED", True)
+    now = _datetime.datetime.now()
+    recent_rows = [now - _datetime.timedelta(minutes=minutes) for minutes in range(5)]
+    old_rows = [now - _datetime.timedelta(days=400 + days) for days in range(5)]
+
+    query = FakeQuery(recent_rows + old_rows)
+    assert _partitioning.fetch_latest_first(query, Post.created_on, skip=0, limit=3) == recent_rows[:3]
+    assert query.filtered.since == get_month_start(now, -_partitioning.POSTS_LATEST_WINDOW_MONTHS)
+
+    # The recent partitions are not enough - all of them are read
+    query = FakeQuery(recent_rows + old_rows)
+    assert _partitioning.fetch_latest_first(query, Post.created_on, skip=3, limit=4) == recent_rows[3:] + old_rows[:2]
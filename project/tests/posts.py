@@ -1,80 +1,99 @@
-import os
+import asyncio
+import hashlib
+import json
+import time
 import uuid
 
+import httpx
 import pytest
 import sqlalchemy as _sql
-import sqlalchemy.orm as _orm
-from dotenv import load_dotenv
 from fastapi.testclient import TestClient
 
-import project.src.config.db.database as _database
+import project.src.app.services.changes as _changes_service
+import project.src.app.services.popularity as _popularity_service
+import project.src.app.services.upload as _upload_service
 from project.src.app.app_enums.likePostActionEnum import LikePostActionEnum
 from project.src.app.main import app
-from project.src.app.routes.posts import get_db, posts_router
+from project.src.app.models import Post
+from project.src.app.routes.health import health_router
+from project.src.app.routes.posts import posts_router
 from project.src.app.routes.shared_constants_and_methods import (
     SUCCESSFUL_DELETION_MESSAGE_KEY, SUCCESSFUL_DELETION_MESSAGE_VALUE_FOR_POST, REQUEST_IS_OK_STATUS_CODE,
     POST_ENTITY_BAD_TYPING_ERROR_STATUS_CODE, FORBIDDEN_REQUEST_STATUS_CODE, get_forbidden_request_detail_message,
     OBJECT_CANNOT_BE_FOUND_STATUS_CODE, get_object_cannot_be_found_detail_message, ObjectType,
-    VALUE_LENGTH_ERROR_STATUS_CODE)
+    VALUE_LENGTH_ERROR_STATUS_CODE, TOTAL_COUNT_HEADER_NAME, TOTAL_COUNT_ESTIMATED_HEADER_NAME,
+    SERVICE_UNAVAILABLE_STATUS_CODE, ETAG_HEADER_NAME, IF_NONE_MATCH_HEADER_NAME, NOT_MODIFIED_STATUS_CODE,
+    get_too_many_posts_detail_message, IDEMPOTENCY_KEY_HEADER_NAME, IDEMPOTENCY_REPLAYED_HEADER_NAME,
+    UPLOAD_OFFSET_HEADER_NAME, CONFLICT_STATUS_CODE)
+from project.src.app.services.idempotency import idempotency_store
+from project.src.app.services.live_likes import LIKES_STREAM_MAX_POSTS
+from project.src.app.services.warmup import startup_timings
 
-load_dotenv()
-
-TEST_DATABASE_URL = os.getenv("DATABASE_TEST_URL")
+test_post_image = "post test image"
+test_post_caption = "Post test"
+test_post_tags = []
+test_post_published = True
+test_post_owner_id = 1
+test_post_comment_id = 1
 
-engine = _sql.create_engine(TEST_DATABASE_URL)
 
-TestingSessionLocal = _orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def create_post(client: TestClient, owner_id: int = test_post_owner_id, caption: str = test_post_caption) -> dict:
+    # The caption's hashtags would be cut off as the url's fragment
+    response = client.post(
+        f"{posts_router.prefix}/new?tags={test_post_tags}&published={test_post_published}",
+        params={"owner_id": owner_id, "caption": caption},
+        files={"file": open("project/tests/test_img/black.png", "rb")}
+    )
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    return response.json()
 
-_database.Base.metadata.create_all(bind=engine)
 
+@pytest.fixture
+def post(client):
+    return create_post(client)
 
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
+def test_health_should_succeed(client, monkeypatch):
+    monkeypatch.setattr(startup_timings, "ready_on", None)
+    response = client.get(f"{health_router.prefix}/live")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
 
-app.dependency_overrides[get_db] = override_get_db
-posts_client = TestClient(app)
+    # The test client does not run the startup - nor the warmup
+    response = client.get(f"{health_router.prefix}/ready")
+    assert response.status_code == SERVICE_UNAVAILABLE_STATUS_CODE, response.text
+    assert response.json()["status"] == "warming_up"
 
-test_post_id = ""
-test_post_image = "post test image"
-test_post_caption = "Post test"
-test_post_tags = []
-test_post_published = True
-test_post_owner_id = 1
-test_post_comment_id = 1
-
-test_post2_id = ""
+    startup_timings.ready_on = time.monotonic()
+    response = client.get(f"{health_router.prefix}/ready")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert response.json()["status"] == "ready"
 
 
-def test_fetch_posts_should_succeed():
-    response = posts_client.get(f"{posts_router.prefix}/")
+def test_fetch_posts_should_succeed(client):
+    response = client.get(f"{posts_router.prefix}/")
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
     data = response.json()
     assert data == [], f"Should be [] because there is no posts yet!"
 
-    response = posts_client.get(f"{posts_router.prefix}/?owners=1&owners=3&skip=2")
+    response = client.get(f"{posts_router.prefix}/?owners=1&owners=3&skip=2")
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
     data = response.json()
     assert data == [], f"Should be [] because there is no posts yet!"
 
 
-def test_fetch_posts_should_fail():
-    response = posts_client.get(f"{posts_router.prefix}/?owners=mike")
+def test_fetch_posts_should_fail(client):
+    response = client.get(f"{posts_router.prefix}/?owners=mike")
     assert response.status_code == POST_ENTITY_BAD_TYPING_ERROR_STATUS_CODE, response.text
 
 
-def test_fetch_latest_posts():
-    response = posts_client.get(f"{posts_router.prefix}/latest/")
+def test_fetch_latest_posts(client):
+    response = client.get(f"{posts_router.prefix}/latest/")
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
     data = response.json()
     assert data == [], f"Should be [] because there is no posts yet!"
 
 
-def test_create_post_negative_owner_should_fail():
+def test_create_post_negative_owner_should_fail(client):
     # files = {"file": open("./test_img/wlpp.jpg", "rb")}  # Use this on local
     files = {"file": open("project/tests/test_img/wlpp.jpg", "rb")}
     owner_id = -5
@@ -83,7 +102,7 @@ def test_create_post_negative_owner_should_fail():
 
     # TypeError: Object of type set is not JSON serializable
     with pytest.raises(TypeError) as exc_info:
-        response = posts_client.post(
+        response = client.post(
             f"{posts_router.prefix}/new?owner_id={owner_id}&caption={caption}&tags={tags}"
             f"&published={test_post_published}",
             files=files
@@ -92,13 +111,11 @@ def test_create_post_negative_owner_should_fail():
     assert exc_info.value.args[0] == "Object of type set is not JSON serializable"
 
 
-def test_create_post_should_succeed():
-    global test_post_id
+def test_create_post_should_succeed(client):
     # files = {"file": open("./test_img/wlpp.jpg", "rb")}  # Use this on local
     files = {"file": open("project/tests/test_img/black.png", "rb")}
-    os.environ["IMAGES_DIRECTORY_NAME"] = "."
 
-    response = posts_client.post(
+    response = client.post(
         f"{posts_router.prefix}/new?owner_id={test_post_owner_id}&caption={test_post_caption}&tags={test_post_tags}"
         f"&published={test_post_published}",
         files=files
@@ -115,17 +132,179 @@ def test_create_post_should_succeed():
     assert "likes" in data
     assert "created_on" in data
     assert "updated_on" in data
-    test_post_id = data["id"]
+    assert data["mime_type"] == "image/png", "Should be 'image/png'!"
+    assert data["width"] > 0 and data["height"] > 0
+    assert data["blurhash"] is not None
+
+
+def test_create_post_with_hashtags_should_succeed(client):
+    files = {"file": open("project/tests/test_img/black.png", "rb")}
+    caption = "Post test #PicShareSunset #picsharesunset #ab"
+
+    response = client.post(
+        f"{posts_router.prefix}/new",
+        params={"owner_id": test_post_owner_id, "caption": caption},
+        files=files
+    )
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    data = response.json()
+    assert [tag["name"] for tag in data["tags"]] == ["PicShareSunset"], "Should be ['PicShareSunset']!"
+
+    response = client.get(f"{posts_router.prefix}/?tags=picsharesunset")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert data["id"] in [post["id"] for post in response.json()], f"Should contain '{data['id']}'!"
+
+    response = client.delete(f"{posts_router.prefix}/delete/{data['id']}?user_id={test_post_owner_id}")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+
 
+def test_create_post_with_a_reserved_tag_should_fail(client):
+    response = client.post(
+        f"{posts_router.prefix}/new",
+        params={"owner_id": test_post_owner_id},
+        data={"tags": ["trending"]},
+        files={"file": open("project/tests/test_img/black.png", "rb")}
+    )
+    assert response.status_code == POST_ENTITY_BAD_TYPING_ERROR_STATUS_CODE, response.text
+    assert response.json()["detail"][0]["msg"] == "'trending' is reserved"
+
+
+def test_update_post_with_a_reserved_tag_should_fail(client, post):
+    response = client.put(f"{posts_router.prefix}/update/{post['id']}?user_id={test_post_owner_id}",
+                          json={"caption": None, "tags": [{"name": "Export"}]})
+    assert response.status_code == POST_ENTITY_BAD_TYPING_ERROR_STATUS_CODE, response.text
+    assert response.json()["detail"][0]["msg"] == "'export' is reserved"
+
+
+def test_create_post_with_idempotency_key_should_succeed(client):
+    idempotency_key = str(uuid.uuid4())
+    responses = [
+        client.post(
+            f"{posts_router.prefix}/new",
+            params={"owner_id": test_post_owner_id, "caption": "Post test idempotency"},
+            files={"file": open("project/tests/test_img/black.png", "rb")},
+            headers={IDEMPOTENCY_KEY_HEADER_NAME: idempotency_key}
+        ) for _ in range(2)
+    ]
+    for response in responses:
+        assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert responses[1].json()["id"] == responses[0].json()["id"], "Should not create the post twice!"
+    assert IDEMPOTENCY_REPLAYED_HEADER_NAME not in responses[0].headers
+    assert responses[1].headers[IDEMPOTENCY_REPLAYED_HEADER_NAME] == "true"
+
+    response = client.delete(
+        f"{posts_router.prefix}/delete/{responses[0].json()['id']}?user_id={test_post_owner_id}"
+    )
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+
+
+@pytest.mark.usefixtures("inline_threads")
+def test_create_post_with_idempotency_key_during_a_slow_upload_should_succeed(client, db, monkeypatch):
+    caption = f"Post test slow upload {uuid.uuid4()}"
+    idempotency_key = str(uuid.uuid4())
+    # Without its renewal, the first request's key would be taken over by the retry - while its upload is read
+    monkeypatch.setattr(idempotency_store, "lock_timeout_seconds", 0.3)
+    upload_request = httpx.Request(
+        "POST", f"http://testserver{posts_router.prefix}/new",
+        params={"owner_id": test_post_owner_id, "caption": caption},
+        files={"file": open("project/tests/test_img/black.png", "rb")}
+    )
+    body = upload_request.read()
+
+    async def slow_body():
+        chunk_size = -(-len(body) // 10)
+        for start in range(0, len(body), chunk_size):
+            await asyncio.sleep(0.1)
+            yield body[start:start + chunk_size]
+
+    async def scenario():
+        async with httpx.AsyncClient(app=app, base_url="http://testserver") as async_client:
+            headers = {IDEMPOTENCY_KEY_HEADER_NAME: idempotency_key}
+            first = asyncio.create_task(async_client.post(
+                str(upload_request.url), content=slow_body(),
+                headers={**headers, "Content-Type": upload_request.headers["Content-Type"]}
+            ))
+            await asyncio.sleep(0.5)
+            retry = await async_client.post(
+                str(upload_request.url), files={"file": open("project/tests/test_img/black.png", "rb")},
+                headers=headers
+            )
+            return await first, retry
+
+    first, retry = asyncio.run(scenario())
+    assert first.status_code == REQUEST_IS_OK_STATUS_CODE, first.text
+    assert retry.status_code == REQUEST_IS_OK_STATUS_CODE, retry.text
+    assert retry.json()["id"] == first.json()["id"], "Should not create the post twice!"
+    assert retry.headers[IDEMPOTENCY_REPLAYED_HEADER_NAME] == "true"
+    assert db.query(Post).filter(Post.caption == caption).count() == 1
+
+
+def test_create_post_with_resumable_upload_should_succeed(client, db, monkeypatch):
+    data = open("project/tests/test_img/black.png", "rb").read()
+    response = client.post("/api/v1/uploads/", json={
+        "owner_id": test_post_owner_id, "filename": "black.png", "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest()
+    })
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    upload_id = response.json()["id"]
+
+    middle = len(data) // 2
+    for offset, chunk in ((0, data[:middle]), (middle, data[middle:])):
+        response = client.patch(f"/api/v1/uploads/{upload_id}", content=chunk,
+                                      headers={UPLOAD_OFFSET_HEADER_NAME: str(offset)})
+        assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert response.headers[UPLOAD_OFFSET_HEADER_NAME] == str(len(data))
 
-def test_create_post_should_fail():
+    response = client.post(f"/api/v1/uploads/{upload_id}/finalize")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+
+    # An image which cannot be placed creates no post - the upload can be used again
+    move_upload_file = _upload_service.move_upload_file
+
+    def failing_move_upload_file(db_upload, destination):
+        move_upload_file(db_upload=db_upload, destination=destination)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(_upload_service, "move_upload_file", failing_move_upload_file)
+    with pytest.raises(OSError):
+        client.post(f"{posts_router.prefix}/new", params={"owner_id": test_post_owner_id, "upload_id": upload_id})
+    assert db.query(Post).filter(Post.image == "").count() == 0, "Should not keep a post without its image!"
+    monkeypatch.setattr(_upload_service, "move_upload_file", move_upload_file)
+
+    response = client.post(f"{posts_router.prefix}/new",
+                                 params={"owner_id": test_post_owner_id, "upload_id": upload_id})
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    data = response.json()
+    assert data["mime_type"] == "image/png", "Should be 'image/png'!"
+
+    response = client.post(f"{posts_router.prefix}/new",
+                                 params={"owner_id": test_post_owner_id, "upload_id": upload_id})
+    assert response.status_code == CONFLICT_STATUS_CODE, response.text
+
+    response = client.delete(f"{posts_router.prefix}/delete/{data['id']}?user_id={test_post_owner_id}")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+
+
+def test_create_post_failing_to_commit_should_leave_no_image(client, db, images_directory, monkeypatch):
+    async def failing_refresh_hot_score(**kwargs):
+        raise _sql.exc.OperationalError("UPDATE posts", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(_popularity_service, "refresh_hot_score", failing_refresh_hot_score)
+    with pytest.raises(_sql.exc.OperationalError):
+        client.post(f"{posts_router.prefix}/new", params={"owner_id": test_post_owner_id, "caption": "Post test fail"},
+                    files={"file": open("project/tests/test_img/black.png", "rb")})
+    assert db.query(Post).filter(Post.caption == "Post test fail").count() == 0
+    assert list(images_directory.iterdir()) == [], "Should remove the image of the post not created!"
+
+
+def test_create_post_should_fail(client):
     # files = {"file": open("./test_img/wlpp.jpg", "rb")}  # Use this on local
     files = {"file": open("project/tests/test_img/wlpp.jpg", "rb")}
     owner_name = "jeremy"
     caption = 45
     tags = "lemon"
 
-    response = posts_client.post(
+    response = client.post(
         f"{posts_router.prefix}/new?owner_id={owner_name}&caption={caption}&tags={tags}"
         f"&published={test_post_published}",
         files=files
@@ -134,8 +313,9 @@ def test_create_post_should_fail():
     assert response.status_code == POST_ENTITY_BAD_TYPING_ERROR_STATUS_CODE, response.text
 
 
-def test_get_post_should_succeed():
-    response = posts_client.get(f"{posts_router.prefix}/{test_post_id}")
+def test_get_post_should_succeed(client, post):
+    test_post_id = post["id"]
+    response = client.get(f"{posts_router.prefix}/{test_post_id}")
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
     data = response.json()
     assert data["caption"] == test_post_caption, f"Should be '{test_post_caption}'!"
@@ -143,74 +323,237 @@ def test_get_post_should_succeed():
     assert data["id"] == test_post_id, f"Should be '{test_post_id}'!"
 
 
-def test_get_post_should_fail():
+def test_get_post_should_fail(client, post):
+    test_post_id = post["id"]
     # lolita4
     post_id = uuid.uuid4()
     while post_id == test_post_id:
         post_id = uuid.uuid4()
     assert post_id != test_post_id
-    response = posts_client.get(f"{posts_router.prefix}/{post_id}")
+    response = client.get(f"{posts_router.prefix}/{post_id}")
     assert response.status_code == 404, response.text
     assert response.json() == {"detail": f"The post with id: {post_id} cannot be found!"}
 
 
-def test_get_post_image_should_succeed():
-    response = posts_client.get(f"{posts_router.prefix}/{test_post_id}/get-image")
+def test_search_posts_should_succeed(client, post):
+    test_post_id = post["id"]
+    response = client.get(f"{posts_router.prefix}/search?q={test_post_caption.split()[0]}")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    data = response.json()
+    assert test_post_id in [post["id"] for post in data], f"Should contain '{test_post_id}'!"
+
+    response = client.get(f"{posts_router.prefix}/search?q={test_post_caption}&owners={test_post_owner_id + 1}")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert response.json() == [], "Should be [] because the post belongs to another owner!"
+
+
+def test_search_posts_should_fail(client):
+    response = client.get(f"{posts_router.prefix}/search")
+    assert response.status_code == VALUE_LENGTH_ERROR_STATUS_CODE, response.text
+
+
+def test_get_post_image_should_succeed(client, post):
+    test_post_id = post["id"]
+    response = client.get(f"{posts_router.prefix}/{test_post_id}/get-image")
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
 
 
-def test_get_post_image_should_fail():
+def test_get_post_image_should_fail(client, post):
+    test_post_id = post["id"]
     post_id = "445-ea"
-    response = posts_client.get(f"{posts_router.prefix}/{post_id}/get-image")
+    response = client.get(f"{posts_router.prefix}/{post_id}/get-image")
     assert response.status_code == VALUE_LENGTH_ERROR_STATUS_CODE, response.text
 
     post_id = uuid.uuid4()
     while post_id == test_post_id:
         post_id = uuid.uuid4()
     assert post_id != test_post_id
-    response = posts_client.get(f"{posts_router.prefix}/{post_id}/get-image")
+    response = client.get(f"{posts_router.prefix}/{post_id}/get-image")
     assert response.status_code == OBJECT_CANNOT_BE_FOUND_STATUS_CODE, response.text
     assert response.json() == {"detail": get_object_cannot_be_found_detail_message(post_id, ObjectType.POST)}
 
 
-def test_like_unlike_post_should_succeed():
+def test_like_unlike_post_should_succeed(client, post):
+    test_post_id = post["id"]
     like_number = 9
     unlike_number = 2
 
     for like in range(like_number):
-        response = posts_client.put(f"{posts_router.prefix}/{test_post_id}?like_action={LikePostActionEnum.LIKE}")
+        response = client.put(f"{posts_router.prefix}/{test_post_id}?like_action={LikePostActionEnum.LIKE.value}")
         assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
 
-    response = posts_client.get(f"{posts_router.prefix}/{test_post_id}")
+    response = client.get(f"{posts_router.prefix}/{test_post_id}")
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
     data = response.json()
     assert data["likes"] == like_number, f"Should be '{like_number}'!"
 
     for like in range(unlike_number):
-        response = posts_client.put(f"{posts_router.prefix}/{test_post_id}?like_action={LikePostActionEnum.UNLIKE}")
+        response = client.put(f"{posts_router.prefix}/{test_post_id}?like_action={LikePostActionEnum.UNLIKE.value}")
         assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
 
-    response = posts_client.get(f"{posts_router.prefix}/{test_post_id}")
+    response = client.get(f"{posts_router.prefix}/{test_post_id}")
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
     data = response.json()
     assert data["likes"] == (like_number - unlike_number), f"Should be '{(like_number - unlike_number)}'!"
 
 
-def test_like_unlike_post_should_fail():
+def test_get_post_not_modified_should_succeed(client, post):
+    test_post_id = post["id"]
+    response = client.get(f"{posts_router.prefix}/{test_post_id}")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    etag = response.headers[ETAG_HEADER_NAME]
+
+    response = client.get(f"{posts_router.prefix}/{test_post_id}", headers={IF_NONE_MATCH_HEADER_NAME: etag})
+    assert response.status_code == NOT_MODIFIED_STATUS_CODE, response.text
+    assert response.content == b""
+
+    response = client.get(f"{posts_router.prefix}/", headers={IF_NONE_MATCH_HEADER_NAME: etag})
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, "Should not match - another response!"
+
+
+def test_fetch_popular_posts_should_succeed(client, post):
+    test_post_id = post["id"]
+    create_post(client)
+    for like in range(10):
+        response = client.put(f"{posts_router.prefix}/{test_post_id}?like_action={LikePostActionEnum.LIKE.value}")
+        assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+
+    response = client.get(f"{posts_router.prefix}/?sort=popular&owners={test_post_owner_id}")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    data = response.json()
+    assert data[0]["id"] == test_post_id, f"Should be '{test_post_id}' - the most liked post!"
+
+
+def test_fetch_popular_posts_of_a_retagged_post_should_succeed(client, post):
+    test_post_id = post["id"]
+    other_post = create_post(client, caption="Post test #PicShareRetagged")
+    for like in range(10):
+        response = client.put(f"{posts_router.prefix}/{test_post_id}?like_action={LikePostActionEnum.LIKE.value}")
+        assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+
+    response = client.put(f"{posts_router.prefix}/update/{test_post_id}?user_id={test_post_owner_id}",
+                          json={"caption": None, "tags": [{"name": "PicShareRetagged"}]})
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+
+    response = client.get(f"{posts_router.prefix}/?sort=popular&tags=picshareretagged")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert [data["id"] for data in response.json()] == [test_post_id, other_post["id"]], \
+        f"Should be '{test_post_id}' - the most liked post - first!"
+
+
+def test_fetch_popular_posts_should_fail(client):
+    response = client.get(f"{posts_router.prefix}/?sort=likes")
+    assert response.status_code == VALUE_LENGTH_ERROR_STATUS_CODE, response.text
+
+
+@pytest.mark.usefixtures("post")
+def test_fetch_posts_with_total_should_succeed(client):
+    owner_posts = client.get(f"{posts_router.prefix}/?owners={test_post_owner_id}").json()
+
+    response = client.get(f"{posts_router.prefix}/?owners={test_post_owner_id}&limit=1&include_total=true")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert len(response.json()) <= 1
+    assert int(response.headers[TOTAL_COUNT_HEADER_NAME]) == len(owner_posts), \
+        "Should count all the owner's posts, not the page!"
+    assert TOTAL_COUNT_ESTIMATED_HEADER_NAME not in response.headers
+
+    response = client.get(f"{posts_router.prefix}/")
+    assert TOTAL_COUNT_HEADER_NAME not in response.headers, "Should only be counted when asked!"
+
+
+def test_fetch_streamed_posts_should_succeed(client, post):
+    create_post(client, caption="Post test #PicShareStream")
+    response = client.put(f"{posts_router.prefix}/{post['id']}?like_action={LikePostActionEnum.LIKE.value}")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+
+    for url in (f"{posts_router.prefix}/?limit=10", f"{posts_router.prefix}/?sort=popular",
+                f"{posts_router.prefix}/?sort=latest&skip=1", f"{posts_router.prefix}/latest/?fields=id,tags",
+                f"{posts_router.prefix}/?tags=picsharestream", f"{posts_router.prefix}/?owners={test_post_owner_id}",
+                f"{posts_router.prefix}/?fields=id,likes&include_total=true"):
+        expected_response = client.get(url)
+        response = client.get(f"{url}&stream=true")
+        assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == expected_response.json(), f"Should send the same posts as '{url}'!"
+        assert ETAG_HEADER_NAME not in response.headers
+        assert response.headers.get(TOTAL_COUNT_HEADER_NAME) == expected_response.headers.get(TOTAL_COUNT_HEADER_NAME)
+
+    response = client.get(f"{posts_router.prefix}/?tags=unknown&stream=true")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert response.json() == []
+
+
+@pytest.mark.usefixtures("post")
+def test_fetch_posts_with_fields_should_succeed(client):
+    response = client.get(f"{posts_router.prefix}/?owners={test_post_owner_id}&fields=id,image,likes")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert len(response.json()) > 0
+    for post in response.json():
+        assert list(post.keys()) == ["id", "image", "likes"], "Should only send the asked fields!"
+
+    response = client.get(f"{posts_router.prefix}/latest/?fields=id,tags")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert all(set(post.keys()) == {"id", "tags"} for post in response.json())
+
+    response = client.get(f"{posts_router.prefix}/?fields=id,password")
+    assert response.status_code == VALUE_LENGTH_ERROR_STATUS_CODE, response.text
+
+
+def test_export_posts_should_succeed(client, post):
+    test_post_id = post["id"]
+    response = client.get(f"{posts_router.prefix}/export")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert response.headers["content-type"] == "application/x-ndjson"
+    posts = [json.loads(line) for line in response.text.splitlines()]
+    assert str(test_post_id) in [post["id"] for post in posts], "Should export the test post!"
+    assert all("tags" in post for post in posts)
+
+    response = client.get(f"{posts_router.prefix}/export?updated_since=2999-01-01T00:00:00")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert response.text == "", "Should export no post!"
+
+
+def test_fetch_changes_should_succeed(client, post, monkeypatch):
+    test_post_id = post["id"]
+    # The post was just created
+    monkeypatch.setattr(_changes_service, "CHANGES_VISIBILITY_DELAY_SECONDS", 0)
+    response = client.get("/api/v1/changes/?after=0&limit=1000")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    data = response.json()
+    assert {"object_type": "post", "object_id": str(test_post_id), "action": "created"} in [
+        {key: change[key] for key in ("object_type", "object_id", "action")} for change in data["changes"]
+    ], "Should log the creation of the test post!"
+    assert data["next_after"] == data["changes"][-1]["seq"]
+
+    response = client.get(f"/api/v1/changes/?after={data['next_after']}")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert response.json() == {"changes": [], "next_after": data["next_after"]}
+
+
+def test_stream_posts_likes_should_fail(client):
+    posts_ids = "&".join(f"ids={uuid.uuid4()}" for _ in range(LIKES_STREAM_MAX_POSTS + 1))
+    response = client.get(f"{posts_router.prefix}/likes/stream?{posts_ids}")
+    assert response.status_code == VALUE_LENGTH_ERROR_STATUS_CODE, response.text
+    assert response.json() == {"detail": get_too_many_posts_detail_message(LIKES_STREAM_MAX_POSTS)}
+
+
+def test_like_unlike_post_should_fail(client, post):
+    test_post_id = post["id"]
     post_id = uuid.uuid4()
     while post_id == test_post_id:
         post_id = uuid.uuid4()
     assert post_id != test_post_id
-    response = posts_client.put(f"{posts_router.prefix}/{post_id}?like_action={LikePostActionEnum.LIKE}")
+    response = client.put(f"{posts_router.prefix}/{post_id}?like_action={LikePostActionEnum.LIKE.value}")
     assert response.status_code == OBJECT_CANNOT_BE_FOUND_STATUS_CODE, response.text
     assert response.json() == {"detail": get_object_cannot_be_found_detail_message(post_id, ObjectType.POST)}
 
     like_action = "445-ea"
-    response = posts_client.put(f"{posts_router.prefix}/{test_post_id}?like_action={like_action}")
+    response = client.put(f"{posts_router.prefix}/{test_post_id}?like_action={like_action}")
     assert response.status_code == VALUE_LENGTH_ERROR_STATUS_CODE, response.text
 
 
-def test_update_post_should_fail():
+def test_update_post_should_fail(client, post):
+    test_post_id = post["id"]
     update_caption = "caption"
     post_update = {
         "caption": update_caption,
@@ -223,14 +566,14 @@ def test_update_post_should_fail():
         post_id = uuid.uuid4()
 
     # Update the post
-    response = posts_client.put(
+    response = client.put(
         f"{posts_router.prefix}/update/{post_id}?user_id={test_post_owner_id}",
         json=post_update
     )
     assert response.status_code == OBJECT_CANNOT_BE_FOUND_STATUS_CODE, response.text
     assert response.json() == {"detail": get_object_cannot_be_found_detail_message(post_id, ObjectType.POST)}
 
-    response = posts_client.put(
+    response = client.put(
         f"{posts_router.prefix}/update/{test_post_id}?user_id={user_id}",
         json=post_update
     )
@@ -238,7 +581,8 @@ def test_update_post_should_fail():
     assert response.json() == {"detail": get_forbidden_request_detail_message()}
 
 
-def test_update_post_should_succeed():
+def test_update_post_should_succeed(client, post):
+    test_post_id = post["id"]
     update_caption = "caption"
     post_update = {
         "caption": update_caption,
@@ -246,35 +590,37 @@ def test_update_post_should_succeed():
         "published": False
     }
     # Update the post
-    response = posts_client.put(
+    response = client.put(
         f"{posts_router.prefix}/update/{test_post_id}?user_id={test_post_owner_id}",
         json=post_update
     )
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
 
     # Verify that getting the deleted post doesn't work
-    response = posts_client.get(f"{posts_router.prefix}/{test_post_id}")
+    response = client.get(f"{posts_router.prefix}/{test_post_id}")
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
     data = response.json()
     assert data["caption"] == update_caption, f"Should be '{update_caption}'!"
 
 
-def test_delete_post_should_fail():
+def test_delete_post_should_fail(client, post):
+    test_post_id = post["id"]
     user_id = 52
     # Delete the post
-    response = posts_client.delete(f"{posts_router.prefix}/delete/{test_post_id}?user_id={user_id}")
+    response = client.delete(f"{posts_router.prefix}/delete/{test_post_id}?user_id={user_id}")
     assert response.status_code == FORBIDDEN_REQUEST_STATUS_CODE, response.text
     assert response.json() == {"detail": get_forbidden_request_detail_message()}
 
 
-def test_delete_post_should_succeed():
+def test_delete_post_should_succeed(client, post):
+    test_post_id = post["id"]
     # Delete the post
-    response = posts_client.delete(f"{posts_router.prefix}/delete/{test_post_id}?user_id={test_post_owner_id}")
+    response = client.delete(f"{posts_router.prefix}/delete/{test_post_id}?user_id={test_post_owner_id}")
     data = response.json()
     assert f"{SUCCESSFUL_DELETION_MESSAGE_KEY}" in data
     assert data[f"{SUCCESSFUL_DELETION_MESSAGE_KEY}"] == f"{SUCCESSFUL_DELETION_MESSAGE_VALUE_FOR_POST}", \
         f"Should be '{SUCCESSFUL_DELETION_MESSAGE_VALUE_FOR_POST}'"
 
     # Verify that getting the deleted post doesn't work
-    response = posts_client.get(f"{posts_router.prefix}/{test_post_id}")
+    response = client.get(f"{posts_router.prefix}/{test_post_id}")
     assert response.status_code == 404, response.text
@@ -0,0 +1,100 @@
+import pytest
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from fastapi import Request
+
+import project.src.app.routes.shared_constants_and_methods as _shared
+from project.src.app.middlewares.read_your_writes import (
+    must_read_from_primary, READ_YOUR_WRITES_COOKIE_NAME, READ_YOUR_WRITES_HEADER_NAME)
+from project.src.config.db.replicas import ReplicaPool
+
+
+def get_sqlite_replicas_urls(tmp_path, count: int = 2):
+    return [f"sqlite:///{tmp_path}/replica_{index}.db" for index in range(count)]
+
+
+def get_session_url(session):
+    return str(session.get_bind().url)
+
+
+def build_request(headers: list[tuple[bytes, bytes]]):
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_replica_pool_without_replicas_should_use_the_primary():
+    pool = ReplicaPool([])
+    assert pool.session() is None, "Should be None because there is no replica!"
+
+
+def test_replica_pool_should_round_robin(tmp_path):
+    urls = get_sqlite_replicas_urls(tmp_path)
+    pool = ReplicaPool(urls)
+
+    used_urls = []
+    for _ in range(4):
+        session = pool.session()
+        used_urls.append(get_session_url(session))
+        session.close()
+
+    assert used_urls == urls + urls, f"Should be '{urls + urls}'!"
+
+
+def test_replica_pool_should_skip_lagging_replicas(tmp_path, monkeypatch):
+    urls = get_sqlite_replicas_urls(tmp_path)
+    pool = ReplicaPool(urls, max_lag_seconds=1, health_check_interval_seconds=3600)
+    # The first replica replays the primary's writes 5 seconds late, the second one half a second late
+    lags_seconds = {urls[0]: 5.0, urls[1]: 0.5}
+    monkeypatch.setattr(pool, "measure_lag", lambda connection: lags_seconds[str(connection.engine.url)])
+
+    assert [pool.check(replica) for replica in pool.replicas] == [False, True]
+    assert pool.replicas[0].lag_seconds == 5.0
+
+    for _ in range(3):
+        session = pool.session()
+        assert get_session_url(session) == urls[1], f"Should be '{urls[1]}'!"
+        session.close()
+
+
+def test_replica_pool_should_skip_unreachable_replicas(tmp_path):
+    urls = [f"sqlite:///{tmp_path}/missing/replica.db", get_sqlite_replicas_urls(tmp_path, 1)[0]]
+    pool = ReplicaPool(urls)
+
+    session = pool.session()
+    assert get_session_url(session) == urls[1], f"Should be '{urls[1]}'!"
+    session.close()
+    assert pool.replicas[0].healthy is False
+
+    # The replica answers again once the next health check passes
+    (tmp_path / "missing").mkdir()
+    with _sql.create_engine(urls[0]).connect():
+        pass
+    assert pool.check(pool.replicas[0]) is True
+
+
+def test_get_read_db_should_only_open_the_primary_on_fallback(tmp_path, monkeypatch):
+    urls = get_sqlite_replicas_urls(tmp_path, 1)
+    monkeypatch.setattr(_shared, "replica_pool", ReplicaPool(urls))
+
+    def open_primary_session():
+        pytest.fail("Should not open a session on the primary!")
+
+    dependency = _shared.get_read_db(request=build_request([]), session_factory=open_primary_session)
+    assert get_session_url(next(dependency)) == urls[0], f"Should be '{urls[0]}'!"
+    dependency.close()
+
+    primary_session = _orm.Session()
+    monkeypatch.setattr(_shared, "replica_pool", ReplicaPool([]))
+    dependency = _shared.get_read_db(request=build_request([]), session_factory=lambda: primary_session)
+    assert next(dependency) is primary_session, "Should fall back to the primary!"
+    dependency.close()
+
+
+def test_must_read_from_primary():
+    assert must_read_from_primary(build_request([])) is False
+    assert must_read_from_primary(build_request([(READ_YOUR_WRITES_HEADER_NAME.lower().encode(), b"true")])) is True
+
+    cookie = f"{READ_YOUR_WRITES_COOKIE_NAME}=9999999999".encode()
+    assert must_read_from_primary(build_request([(b"cookie", cookie)])) is True
+
+    cookie = f"{READ_YOUR_WRITES_COOKIE_NAME}=0".encode()
+    assert must_read_from_primary(build_request([(b"cookie", cookie)])) is False
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from project.src.app.services.single_flight import SingleFlight
+
+
+def test_single_flight_should_share_the_concurrent_calls():
+    calls = []
+    calls_lock = threading.Lock()
+
+    def read(key: str) -> str:
+        with calls_lock:
+            calls.append(key)
+        time.sleep(0.05)
+        return f"{key} result"
+
+    async def scenario():
+        single_flight = SingleFlight()
+        results = await asyncio.gather(
+            *(single_flight.do(("read", "a"), read, "a") for _ in range(10)),
+            single_flight.do(("read", "b"), read, "b")
+        )
+        assert results == ["a result"] * 10 + ["b result"]
+        assert single_flight.in_flight() == 0
+
+        # The next calls run the function again
+        assert await single_flight.do(("read", "a"), read, "a") == "a result"
+
+    asyncio.run(scenario())
+    assert sorted(calls) == ["a", "a", "b"]
+
+
+def test_single_flight_should_share_the_errors():
+    def fail():
+        time.sleep(0.02)
+        raise ValueError("Database error")
+
+    async def scenario():
+        single_flight = SingleFlight()
+        results = await asyncio.gather(*(single_flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_single_flight_should_not_cancel_the_others_calls():
+    async def scenario():
+        single_flight = SingleFlight()
+        first_call = asyncio.create_task(single_flight.do("key", time.sleep, 0.05))
+        await asyncio.sleep(0)
+        second_call = asyncio.create_task(single_flight.do("key", time.sleep, 0.05))
+        await asyncio.sleep(0)
+        first_call.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await first_call
+        assert await second_call is None
+
+    asyncio.run(scenario())
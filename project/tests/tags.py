@@ -1,63 +1,74 @@
-import os
+import datetime
+import json
+import uuid
 
-import fastapi.testclient as _fastapi_testclient
-import sqlalchemy as _sql
-import sqlalchemy.orm as _orm
-from dotenv import load_dotenv
+import pytest
 
-import project.src.config.db.database as _database
-from project.src.app.main import app
+import project.src.app.services.trending as _trending_service
+from project.src.app import models as _models
 from project.src.app.routes.shared_constants_and_methods import (
     SUCCESSFUL_DELETION_MESSAGE_KEY, SUCCESSFUL_DELETION_MESSAGE_VALUE_FOR_TAG,
     get_object_cannot_be_found_detail_message, ObjectType, get_tag_already_exists_detail_message,
     get_search_characters_length_must_be_greater_than_three, VALUE_LENGTH_ERROR_STATUS_CODE,
-    TAG_ALREADY_EXISTS_STATUS_CODE, OBJECT_CANNOT_BE_FOUND_STATUS_CODE, REQUEST_IS_OK_STATUS_CODE)
-from project.src.app.routes.tags import get_db, tags_router, SEARCH_CHARACTERS_MIN_LENGTH
+    TAG_ALREADY_EXISTS_STATUS_CODE, OBJECT_CANNOT_BE_FOUND_STATUS_CODE, REQUEST_IS_OK_STATUS_CODE,
+    TOTAL_COUNT_HEADER_NAME, ETAG_HEADER_NAME, IF_NONE_MATCH_HEADER_NAME, NOT_MODIFIED_STATUS_CODE)
+from project.src.app.routes.tags import tags_router, SEARCH_CHARACTERS_MIN_LENGTH
+from project.src.app.services.tag import extract_hashtags
 
-load_dotenv()
-
-TEST_DATABASE_URL = os.getenv("DATABASE_TEST_URL")
-
-engine = _sql.create_engine(TEST_DATABASE_URL)
-
-TestingSessionLocal = _orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-_database.Base.metadata.create_all(bind=engine)
-
-
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-app.dependency_overrides[get_db] = override_get_db
-tags_client = _fastapi_testclient.TestClient(app)
-
-test_tag_id = ""
 test_tag_slug = "teddy bear"
 test_tag_name = "Teddy Bear"
 
 
-def test_fetch_tags():
-    response = tags_client.get(f"{tags_router.prefix}/")
+@pytest.fixture
+def tag(client):
+    response = client.post(f"{tags_router.prefix}/new", json={"name": test_tag_name})
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    return response.json()
+
+
+def test_fetch_tags(client):
+    response = client.get(f"{tags_router.prefix}/")
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
 
 
-def test_search_tags_should_fail():
+def test_search_tags_should_fail(client):
     characters = "hp"
-    response = tags_client.get(f"{tags_router.prefix}/search/{characters}/")
+    response = client.get(f"{tags_router.prefix}/search/{characters}/")
     assert response.status_code == VALUE_LENGTH_ERROR_STATUS_CODE, response.text
     data = response.json()
     assert data["detail"] == get_search_characters_length_must_be_greater_than_three(
         length=SEARCH_CHARACTERS_MIN_LENGTH)
 
 
-def test_create_tag_should_succeed():
-    global test_tag_id
-    response = tags_client.post(
+def test_fetch_trending_tags_should_succeed(client, db, monkeypatch):
+    monkeypatch.setattr(_trending_service, "TRENDING_HALF_LIFE_HOURS", 6)
+    _trending_service.clear_trending_tags_cache()
+    current_bucket_start = _trending_service.get_bucket_start(datetime.datetime.now())
+    # (name, [(hours ago, usages)]) - the old usages weigh half as much every 6 hours
+    usages = [("Steady", [(0, 3)]), ("Faded", [(12, 8)]), ("Rising", [(0, 2), (1, 2)]), ("Expired", [(50, 100)])]
+    for name, tag_usages in usages:
+        response = client.post(f"{tags_router.prefix}/new", json={"name": name})
+        assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+        db.add_all(_models.TagUsage(tag_id=uuid.UUID(response.json()["id"]), count=count,
+                                    bucket_start=current_bucket_start - datetime.timedelta(hours=hours_ago))
+                   for hours_ago, count in tag_usages)
+    db.commit()
+
+    response = client.get(f"{tags_router.prefix}/trending?window_hours=48&limit=3")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    # Rising: 2 + 2 * 0.5 ** (1 / 6), Steady: 3, Faded: 8 * 0.5 ** 2 - Expired is out of the window
+    assert [(tag["slug"], tag["score"]) for tag in response.json()] == [
+        ("rising", round(2 + 2 * 0.5 ** (1 / 6), 4)), ("steady", 3.0), ("faded", 2.0)]
+    _trending_service.clear_trending_tags_cache()
+
+
+def test_fetch_trending_tags_should_fail(client):
+    response = client.get(f"{tags_router.prefix}/trending?window_hours=0")
+    assert response.status_code == VALUE_LENGTH_ERROR_STATUS_CODE, response.text
+
+
+def test_create_tag_should_succeed(client):
+    response = client.post(
         f"{tags_router.prefix}/new",
         json={"name": test_tag_name},
     )
@@ -68,12 +79,22 @@ def test_create_tag_should_succeed():
     assert "id" in data
     assert "slug" in data
     assert data["slug"] == test_tag_slug
-    test_tag_id = data["id"]
 
 
-def test_create_tag_should_fail():
+def test_create_reserved_tag_should_fail(client):
+    response = client.post(f"{tags_router.prefix}/new", json={"name": "Trending"})
+    assert response.status_code == VALUE_LENGTH_ERROR_STATUS_CODE, response.text
+    assert response.json()["detail"][0]["msg"] == "'trending' is reserved"
+
+    # The route is not shadowed by a tag
+    response = client.get(f"{tags_router.prefix}/trending")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert isinstance(response.json(), list)
+
+
+def test_create_tag_should_fail(client):
     tag_name = "hp"
-    response = tags_client.post(
+    response = client.post(
         f"{tags_router.prefix}/new",
         json={"name": tag_name},
     )
@@ -84,8 +105,9 @@ def test_create_tag_should_fail():
     assert detail == "ensure this value has at least 3 characters"
 
 
-def test_create_existing_tag_should_fail():
-    response = tags_client.post(
+@pytest.mark.usefixtures("tag")
+def test_create_existing_tag_should_fail(client):
+    response = client.post(
         f"{tags_router.prefix}/new",
         json={"name": test_tag_name},
     )
@@ -94,41 +116,105 @@ def test_create_existing_tag_should_fail():
     assert response.json() == {"detail": get_tag_already_exists_detail_message(test_tag_name, ObjectType.TAG)}
 
 
-def test_search_tags_should_succeed():
+@pytest.mark.usefixtures("tag")
+def test_search_tags_should_succeed(client):
     characters = test_tag_slug[:3]
-    response = tags_client.get(f"{tags_router.prefix}/search/{characters}/")
+    response = client.get(f"{tags_router.prefix}/search/{characters}/")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+
+
+@pytest.mark.usefixtures("tag")
+def test_search_tags_with_total_should_succeed(client):
+    response = client.get(f"{tags_router.prefix}/search/{test_tag_slug}/?include_total=true")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert int(response.headers[TOTAL_COUNT_HEADER_NAME]) == len(response.json())
+
+
+@pytest.mark.usefixtures("tag")
+def test_search_tags_with_fields_should_succeed(client):
+    response = client.get(f"{tags_router.prefix}/search/{test_tag_slug}/?fields=slug,name")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert response.json() == [{"slug": test_tag_slug, "name": test_tag_name}], "Should only send the asked fields!"
+
+    response = client.get(f"{tags_router.prefix}/?fields=posts,owner_id")
+    assert response.status_code == VALUE_LENGTH_ERROR_STATUS_CODE, response.text
+
+
+@pytest.mark.usefixtures("tag")
+def test_fetch_streamed_tags_should_succeed(client):
+    response = client.post("/api/v1/posts/new", params={"owner_id": 1, "caption": "Tag test #TeddyStream"},
+                           files={"file": open("project/tests/test_img/black.png", "rb")})
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+
+    for url in (f"{tags_router.prefix}/?limit=10", f"{tags_router.prefix}/?skip=1",
+                f"{tags_router.prefix}/?fields=slug,posts&include_total=true"):
+        expected_response = client.get(url)
+        response = client.get(f"{url}&stream=true")
+        assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+        assert response.json() == expected_response.json(), f"Should send the same tags as '{url}'!"
+        assert ETAG_HEADER_NAME not in response.headers
+        assert response.headers.get(TOTAL_COUNT_HEADER_NAME) == expected_response.headers.get(TOTAL_COUNT_HEADER_NAME)
+
+
+@pytest.mark.usefixtures("tag")
+def test_export_tags_should_succeed(client):
+    response = client.get(f"{tags_router.prefix}/export")
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    assert response.headers["content-type"] == "application/x-ndjson"
+    tags = [json.loads(line) for line in response.text.splitlines()]
+    assert test_tag_slug in [tag["slug"] for tag in tags], "Should export the test tag!"
 
 
-def test_get_tag_should_succeed():
-    response = tags_client.get(f"{tags_router.prefix}/{test_tag_slug}")
+def test_get_tag_should_succeed(client, tag):
+    test_tag_id = tag["id"]
+    response = client.get(f"{tags_router.prefix}/{test_tag_slug}")
     assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
     data = response.json()
     assert data["slug"] == test_tag_slug, f"Should be '{test_tag_slug}'!"
     assert data["id"] == test_tag_id, f"Should be '{test_tag_id}'!"
 
 
-def test_get_tag_should_fail():
+def test_get_tag_should_fail(client):
     tag_slug = "lolita"
-    response = tags_client.get(f"{tags_router.prefix}/{tag_slug}")
+    response = client.get(f"{tags_router.prefix}/{tag_slug}")
     assert response.status_code == OBJECT_CANNOT_BE_FOUND_STATUS_CODE, response.text
     assert response.json() == {"detail": get_object_cannot_be_found_detail_message(tag_slug, ObjectType.TAG)}
 
 
-def test_delete_tag_should_succeed():
+@pytest.mark.usefixtures("tag")
+def test_get_tag_not_modified_should_succeed(client):
+    response = client.get(f"{tags_router.prefix}/{test_tag_slug}")
+    assert response.status_code == REQUEST_IS_OK_STATUS_CODE, response.text
+    etag = response.headers[ETAG_HEADER_NAME]
+
+    response = client.get(f"{tags_router.prefix}/{test_tag_slug}", headers={IF_NONE_MATCH_HEADER_NAME: etag})
+    assert response.status_code == NOT_MODIFIED_STATUS_CODE, response.text
+
+
+@pytest.mark.usefixtures("tag")
+def test_delete_tag_should_succeed(client):
     # Delete the tag
-    response = tags_client.delete(f"{tags_router.prefix}/delete/{test_tag_slug}")
+    response = client.delete(f"{tags_router.prefix}/delete/{test_tag_slug}")
     data = response.json()
     print(data)
     assert data[f"{SUCCESSFUL_DELETION_MESSAGE_KEY}"] == f"{SUCCESSFUL_DELETION_MESSAGE_VALUE_FOR_TAG}", \
         f"Should be '{SUCCESSFUL_DELETION_MESSAGE_VALUE_FOR_TAG}'"
 
     # Verify that getting the deleted tag doesn't work
-    response = tags_client.get(f"{tags_router.prefix}/{test_tag_slug}")
+    response = client.get(f"{tags_router.prefix}/{test_tag_slug}")
     assert response.status_code == OBJECT_CANNOT_BE_FOUND_STATUS_CODE, response.text
 
 
-def test_delete_tag_should_fail():
+def test_delete_tag_should_fail(client):
     tag_slug = "lolita"
-    response = tags_client.delete(f"{tags_router.prefix}/delete/{tag_slug}")
+    response = client.delete(f"{tags_router.prefix}/delete/{tag_slug}")
     assert response.status_code == OBJECT_CANNOT_BE_FOUND_STATUS_CODE, response.text
+
+
+def test_extract_hashtags():
+    assert extract_hashtags(None) == []
+    assert extract_hashtags("No hashtag here") == []
+    assert extract_hashtags("#Sunset over the #sea, #SUNSET again") == ["Sunset", "sea"]
+    assert extract_hashtags("Too short #ab, not a tag mail#sunset or ##sunset") == []
+    assert extract_hashtags("#été_2023") == ["été_2023"]
+    assert extract_hashtags("#Trending #export") == [], "Should ignore the reserved slugs!"
@@ -0,0 +1,66 @@
+import datetime
+import uuid
+
+from project.src.app.services.timeline import TimelineEngine
+
+now = datetime.datetime(2023, 5, 1, 12, 0, 0)
+
+
+def build_entries(minutes: list[int]):
+    return [(now + datetime.timedelta(minutes=minute), uuid.uuid4()) for minute in minutes]
+
+
+def test_timeline_page_should_merge_the_rings():
+    engine = TimelineEngine(ring_size=10)
+    owner_1_entries = build_entries([1, 4, 5])
+    owner_2_entries = build_entries([2, 3, 6])
+    engine.set_ring(owner_id=1, entries=owner_1_entries, complete=True)
+    engine.set_ring(owner_id=2, entries=owner_2_entries, complete=True)
+
+    expected = [entry[1] for entry in sorted(owner_1_entries + owner_2_entries, reverse=True)]
+    assert engine.page(owners_ids={1, 2}, skip=0, limit=10) == expected
+    assert engine.page(owners_ids={1, 2}, skip=2, limit=2) == expected[2:4]
+    assert engine.page(owners_ids={1, 2}, skip=10, limit=2) == []
+
+
+def test_timeline_page_should_not_go_deeper_than_partial_rings():
+    engine = TimelineEngine(ring_size=2)
+    owner_1_entries = build_entries([1, 2, 3, 4])
+    owner_2_entries = build_entries([5])
+    engine.set_ring(owner_id=1, entries=owner_1_entries, complete=True)
+    engine.set_ring(owner_id=2, entries=owner_2_entries, complete=True)
+
+    # Owner 1's ring only keeps its posts of minutes 3 & 4
+    assert engine.page(owners_ids={1, 2}, skip=0, limit=3) == [owner_2_entries[0][1], owner_1_entries[3][1],
+                                                              owner_1_entries[2][1]]
+    assert engine.page(owners_ids={1, 2}, skip=0, limit=4) is None
+    assert engine.page(owners_ids={1, 3}, skip=0, limit=1) is None, "Should be None because owner 3 is not loaded!"
+
+
+def test_timeline_should_follow_created_and_deleted_posts():
+    engine = TimelineEngine(ring_size=2)
+    owner_entries = build_entries([1])
+    engine.set_ring(owner_id=1, entries=owner_entries, complete=True)
+
+    new_post_id = uuid.uuid4()
+    engine.on_post_created(owner_id=1, post_id=new_post_id, created_on=now + datetime.timedelta(minutes=2))
+    assert engine.page(owners_ids={1}, skip=0, limit=2) == [new_post_id, owner_entries[0][1]]
+
+    engine.on_post_created(owner_id=1, post_id=uuid.uuid4(), created_on=now + datetime.timedelta(minutes=3))
+    engine.on_post_deleted(owner_id=1, post_id=new_post_id)
+    assert engine.page(owners_ids={1}, skip=0, limit=2) is None, "Should be None because the ring lost posts!"
+
+
+def test_timeline_should_drop_the_least_recently_used_and_the_expired_rings():
+    engine = TimelineEngine(ring_size=2, max_rings=2)
+    for owner_id in (1, 2):
+        engine.set_ring(owner_id=owner_id, entries=build_entries([owner_id]), complete=True)
+    # Owner 1's ring is used - owner 2's one goes first
+    assert engine.page(owners_ids={1}, skip=0, limit=1) is not None
+    engine.set_ring(owner_id=3, entries=build_entries([3]), complete=True)
+    assert engine.rings_count == 2
+    assert engine.get_cold_owners({1, 2, 3}) == {2}
+
+    engine.ttl_seconds = 0
+    assert engine.get_cold_owners({1, 3}) == {1, 3}
+    assert engine.rings_count == 0, "Should drop the expired rings!"
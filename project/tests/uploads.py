@@ -0,0 +1,53 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from project.src.app import schemas as _schemas
+from project.src.app.app_enums.uploadStatusEnum import UploadStatusEnum
+from project.src.app.services.upload import (
+    append_chunk, consume_upload, create_upload, finalize_upload, get_staging_path)
+
+# The staging files go to each test's images directory
+pytestmark = pytest.mark.usefixtures("images_directory")
+
+DATA = b"resumable upload " * 64
+
+
+async def as_chunk(data: bytes):
+    for start in range(0, len(data), 100):
+        yield data[start:start + 100]
+
+
+def test_upload_should_resume_then_finalize(db):
+    upload = _schemas.UploadCreate(owner_id=1, filename="image.png", size=len(DATA),
+                                   sha256=hashlib.sha256(DATA).hexdigest())
+    db_upload = asyncio.run(create_upload(db=db, upload=upload))
+
+    assert asyncio.run(append_chunk(db=db, db_upload=db_upload, offset=0, chunk=as_chunk(DATA[:500])))
+    # A stale retry of the same chunk does not move the offset - nor does it overwrite the accepted bytes
+    assert not asyncio.run(append_chunk(db=db, db_upload=db_upload, offset=0, chunk=as_chunk(b"!" * 500)))
+    assert db_upload.offset == 500
+    assert get_staging_path(db_upload.id).read_bytes()[:500] == DATA[:500]
+    assert list(get_staging_path(db_upload.id).parent.iterdir()) == [get_staging_path(db_upload.id)]
+    with pytest.raises(ValueError):
+        asyncio.run(append_chunk(db=db, db_upload=db_upload, offset=500, chunk=as_chunk(DATA[500:] + b"!")))
+
+    assert asyncio.run(append_chunk(db=db, db_upload=db_upload, offset=500, chunk=as_chunk(DATA[500:])))
+    assert asyncio.run(finalize_upload(db=db, db_upload=db_upload))
+    assert db_upload.status == UploadStatusEnum.FINALIZED.value
+    assert get_staging_path(db_upload.id).read_bytes() == DATA
+
+    assert consume_upload(db=db, db_upload=db_upload)
+    assert not consume_upload(db=db, db_upload=db_upload), "Should be used by a single post!"
+
+
+def test_upload_with_a_wrong_checksum_should_restart(db):
+    upload = _schemas.UploadCreate(owner_id=1, filename="image.png", size=len(DATA), sha256="0" * 64)
+    db_upload = asyncio.run(create_upload(db=db, upload=upload))
+    assert asyncio.run(append_chunk(db=db, db_upload=db_upload, offset=0, chunk=as_chunk(DATA)))
+
+    assert not asyncio.run(finalize_upload(db=db, db_upload=db_upload))
+    assert db_upload.offset == 0
+    assert db_upload.status == UploadStatusEnum.IN_PROGRESS.value
+    assert get_staging_path(db_upload.id).read_bytes() == b""